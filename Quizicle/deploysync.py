@@ -0,0 +1,288 @@
+"""
+Delta uploads for `fab deploy`.
+
+The deployable tree is the committed HEAD of this directory (what `git archive` used to
+ship) minus DEPLOY_EXCLUDE. On the target every file is stored once, named after its git
+blob id, in <root>/objects. A release is a tree of hard links to those objects in
+<root>/releases/<id>, and <root>/current is a symlink switched to a new release with a
+single rename. Only objects the target does not have yet are uploaded, as parallel tar
+batches, so an unchanged deploy transfers nothing.
+
+Targets only need a POSIX shell with GNU tar/find/mv, so the same code deploys over SSH
+(RemoteTarget) and into a local directory (LocalTarget), e.g. to test it:
+
+    fab sync-local --path=/tmp/quizicle-deploy
+"""
+
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+# Data and machine-local files never shipped with the code
+DEPLOY_EXCLUDE = [
+    '*.sqlite3', '*.sqlite3-journal', '*.sqlite3-wal', '*.sqlite3-shm',
+    'media/*', 'db_data/*', 'staticfiles/*', 'cache/*', 'backups/*',
+    '.env', '.env.*',
+]
+# Data that lives next to the releases and is linked into each one
+SHARED_DIRS = ['media', 'db_data', 'staticfiles']
+SHARED_FILES = ['.env']
+SYMLINK_MODE = '120000'
+MANIFEST_NAME = '.deploy-manifest'
+KEEP_RELEASES = 5
+UPLOAD_JOBS = 4
+
+
+def is_excluded(path, patterns=DEPLOY_EXCLUDE):
+    return any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+
+def build_manifest(ref='HEAD', cwd=None, exclude=DEPLOY_EXCLUDE):
+    """[(path, mode, blob id)] of committed files under the current directory."""
+    output = subprocess.run(
+        ['git', 'ls-tree', '-r', '-z', ref], cwd=cwd, capture_output=True, check=True
+    ).stdout
+    manifest = []
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        meta, path = entry.split(b'\t', 1)
+        mode, kind, blob = meta.decode().split()
+        path = path.decode()
+        if kind != 'blob' or is_excluded(path, exclude):
+            continue
+        manifest.append((path, mode, blob))
+    return sorted(manifest)
+
+
+def manifest_text(manifest):
+    return ''.join(f'{mode} {blob} {json.dumps(path)}\n' for path, mode, blob in manifest)
+
+
+def object_key(mode, blob):
+    # Hard links share permissions, so executable files are stored separately
+    return f"{blob}.x" if mode == '100755' else blob
+
+
+def object_path(key):
+    return f'objects/{key[:2]}/{key}'
+
+
+def read_blobs(blobs, cwd=None):
+    """Yield (blob id, content) for each requested blob using one `git cat-file --batch`."""
+    process = subprocess.Popen(
+        ['git', 'cat-file', '--batch'], cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    try:
+        for blob in blobs:
+            process.stdin.write(f'{blob}\n'.encode())
+            process.stdin.flush()
+            header = process.stdout.readline().split()
+            size = int(header[2])
+            content = process.stdout.read(size)
+            process.stdout.read(1)  # trailing newline
+            yield blob, content
+    finally:
+        process.stdin.close()
+        process.wait()
+
+
+class LocalTarget:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def run(self, command):
+        result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        if result.returncode:
+            raise RuntimeError(f'{command!r} failed: {result.stderr.strip()}')
+        return result.stdout
+
+    def put(self, local_path, remote_path):
+        shutil.copyfile(local_path, remote_path)
+
+    def clone(self):
+        return self
+
+
+class RemoteTarget:
+    def __init__(self, conn, root):
+        self.conn = conn
+        self.root = root
+
+    def run(self, command):
+        return self.conn.run(command, hide=True).stdout
+
+    def put(self, local_path, remote_path):
+        self.conn.put(local_path, remote_path)
+
+    def clone(self):
+        # Fabric connections are not thread-safe; each upload worker gets its own
+        from fabric import Connection
+        return RemoteTarget(
+            Connection(self.conn.host, user=self.conn.user, port=self.conn.port,
+                       connect_kwargs=self.conn.connect_kwargs),
+            self.root,
+        )
+
+
+def _batches(items, jobs):
+    """Split (key, mode, blob, size) items into `jobs` batches of similar total size."""
+    batches = [[] for _ in range(jobs)]
+    sizes = [0] * jobs
+    for item in sorted(items, key=lambda item: -item[3]):
+        smallest = sizes.index(min(sizes))
+        batches[smallest].append(item)
+        sizes[smallest] += item[3]
+    return [batch for batch in batches if batch]
+
+
+def _write_batch(path, batch, cwd):
+    keys = {}
+    for key, mode, blob, _ in batch:
+        keys.setdefault(blob, []).append(key)
+    with tarfile.open(path, 'w:gz', compresslevel=6) as tar:
+        for blob, content in read_blobs(list(keys), cwd):
+            for key in keys[blob]:
+                info = tarfile.TarInfo(object_path(key))
+                info.size = len(content)
+                info.mode = 0o755 if key.endswith('.x') else 0o644
+                info.mtime = 0
+                tar.addfile(info, io.BytesIO(content))
+
+
+def _upload_batch(target, local_path, remote_path):
+    target.put(local_path, remote_path)
+    target.run(f'tar -xzf {shlex.quote(remote_path)} -C {shlex.quote(target.root)} && rm -f {shlex.quote(remote_path)}')
+
+
+def _release_archive(path, release, manifest, text, cwd):
+    """Tar of hard links (and shared symlinks) that materialises the release when extracted in root."""
+    prefix = f'releases/{release}'
+    symlinks = [blob for _, mode, blob in manifest if mode == SYMLINK_MODE]
+    targets = {blob: content.decode() for blob, content in read_blobs(symlinks, cwd)}
+    with tarfile.open(path, 'w') as tar:
+        for relative, mode, blob in manifest:
+            info = tarfile.TarInfo(f'{prefix}/{relative}')
+            if mode == SYMLINK_MODE:
+                info.type = tarfile.SYMTYPE
+                info.linkname = targets[blob]
+            else:
+                info.type = tarfile.LNKTYPE
+                info.linkname = object_path(object_key(mode, blob))
+            tar.addfile(info)
+        for shared in SHARED_DIRS + SHARED_FILES:
+            info = tarfile.TarInfo(f'{prefix}/{shared}')
+            info.type = tarfile.SYMTYPE
+            info.linkname = '../../' + shared
+            tar.addfile(info)
+        data = text.encode()
+        info = tarfile.TarInfo(f'{prefix}/{MANIFEST_NAME}')
+        info.size = len(data)
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(data))
+
+
+def sync(target, ref='HEAD', cwd=None, jobs=UPLOAD_JOBS, keep=KEEP_RELEASES, force=False):
+    """
+    Upload the committed tree to target and switch `current` to it.
+    Returns a summary dict; 'changed' is False when the target already runs this tree.
+    """
+    root = shlex.quote(target.root)
+    manifest = build_manifest(ref, cwd)
+    text = manifest_text(manifest)
+    digest = hashlib.sha256(text.encode()).hexdigest()
+
+    target.run(
+        f'mkdir -p {root}/objects {root}/releases {root}/.incoming '
+        + ' '.join(f'{root}/{shared}' for shared in SHARED_DIRS)
+        + ''.join(f' && touch {root}/{shared}' for shared in SHARED_FILES)
+    )
+
+    current = target.run(f'cat {root}/current/{MANIFEST_NAME} 2>/dev/null || true')
+    if not force and current and hashlib.sha256(current.encode()).hexdigest() == digest:
+        return {'changed': False, 'release': None, 'files': len(manifest), 'uploaded': 0, 'bytes': 0}
+
+    existing = set(target.run(f"find {root}/objects -type f -printf '%f\\n'").split())
+    sizes = {}
+    if manifest:
+        output = subprocess.run(
+            ['git', 'cat-file', '--batch-check'], cwd=cwd, capture_output=True, check=True,
+            input='\n'.join(blob for _, _, blob in manifest).encode(),
+        ).stdout.decode()
+        sizes = {line.split()[0]: int(line.split()[2]) for line in output.splitlines()}
+    missing = {}
+    for path, mode, blob in manifest:
+        key = object_key(mode, blob)
+        if mode != SYMLINK_MODE and key not in existing:
+            missing[key] = (key, mode, blob, sizes.get(blob, 0))
+
+    release = datetime.now().strftime('%Y%m%d_%H%M%S_%f_') + digest[:8]
+    uploaded_bytes = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        batches = _batches(list(missing.values()), jobs)
+        local_paths = []
+        for index, batch in enumerate(batches):
+            local_path = os.path.join(tmp, f'batch-{index}.tar.gz')
+            _write_batch(local_path, batch, cwd)
+            local_paths.append(local_path)
+            uploaded_bytes += os.path.getsize(local_path)
+        if local_paths:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    pool.submit(_upload_batch, target.clone() if index else target, local_path,
+                                f'{target.root}/.incoming/{release}-{index}.tar.gz')
+                    for index, local_path in enumerate(local_paths)
+                ]
+                for future in futures:
+                    future.result()
+
+        archive = os.path.join(tmp, 'release.tar')
+        _release_archive(archive, release, manifest, text, cwd)
+        remote_archive = f'{target.root}/.incoming/{release}.tar'
+        target.put(archive, remote_archive)
+        target.run(f'tar -xf {shlex.quote(remote_archive)} -C {root} && rm -f {shlex.quote(remote_archive)}')
+
+    # Atomic switch: rename a new symlink over the old one
+    target.run(
+        f'ln -sfn releases/{release} {root}/current.new && mv -Tf {root}/current.new {root}/current'
+    )
+    prune(target, keep)
+    return {
+        'changed': True, 'release': release, 'files': len(manifest),
+        'uploaded': len(missing), 'bytes': uploaded_bytes,
+    }
+
+
+def prune(target, keep=KEEP_RELEASES):
+    """Delete all but the newest `keep` releases (never the active one), then unused objects."""
+    root = shlex.quote(target.root)
+    target.run(
+        f'active=$(basename "$(readlink {root}/current)") && cd {root}/releases && '
+        f'ls -1 | sort | head -n -{int(keep)} | {{ grep -vxF "$active" || true; }} | xargs -r rm -rf && '
+        # An object whose only link is the store itself is unused
+        f'find {root}/objects -type f -links 1 -delete'
+    )
+
+
+def rollback(target):
+    """Point `current` back at the previous release; returns its name or None."""
+    root = shlex.quote(target.root)
+    releases = target.run(f'ls -1 {root}/releases | sort').split()
+    active = os.path.basename(target.run(f'readlink {root}/current || true').strip())
+    if active not in releases or releases.index(active) == 0:
+        return None
+    previous = releases[releases.index(active) - 1]
+    target.run(
+        f'ln -sfn releases/{previous} {root}/current.new && mv -Tf {root}/current.new {root}/current'
+    )
+    return previous
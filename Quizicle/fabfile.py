@@ -8,18 +8,29 @@ Usage:
 """
 
 import os
-import tempfile
-import subprocess
+import json
+import time
 from datetime import datetime
 
 from fabric import Connection, task
 
+import deploysync
+
 
 # Configuration
 PROJECT_NAME = "quizicle"
 REMOTE_PROJECT_DIR = f"/var/www/{PROJECT_NAME}"
-BACKUP_DIR = f"/var/www/{PROJECT_NAME}/backups"
-ARCHIVE_NAME = f"{PROJECT_NAME}-{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar.gz"
+# Symlink to the active release (see deploysync.py); docker compose runs from here
+APP_DIR = f"{REMOTE_PROJECT_DIR}/current"
+BACKUP_DIR = f"/var/www/{PROJECT_NAME}/db_data/backups"
+# The same locations inside the web container (db_data is a volume)
+CONTAINER_DB = "/app/db_data/db.sqlite3"
+CONTAINER_BACKUP_DIR = "/app/db_data/backups"
+BACKUP_KEEP_CHAINS = 3
+BACKUP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'projectname', 'backups.py')
+
+WARMUP_STATUS_FILE = "/tmp/quizicle-warmup.json"
+WARMUP_TIMEOUT = 180
 
 # Default connection settings
 DEFAULT_HOST = "doha.trialine.lv"
@@ -34,34 +45,6 @@ def get_connection(ctx):
     return Connection(host, user=user), host, user
 
 
-def create_archive():
-    """Create a tar.gz archive of the project using git archive."""
-    print("📦 Creating project archive using git...")
-
-    temp_dir = tempfile.mkdtemp()
-    archive_path = os.path.join(temp_dir, ARCHIVE_NAME)
-
-    try:
-        # Use git archive to create the archive
-        subprocess.run([
-            'git', 'archive',
-            '--format=tar.gz',
-            f'--output={archive_path}',
-            'HEAD'
-        ], capture_output=True, text=True, check=True)
-
-        print(f"✅ Archive created using git: {archive_path}")
-        return archive_path
-
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Failed to create git archive: {e.stderr}")
-        print("💡 Make sure you're in a git repository and have committed your changes")
-        raise
-    except FileNotFoundError:
-        print("❌ Git not found. Please install git or ensure it's in your PATH")
-        raise
-
-
 @task
 def deploy(ctx, backup=False, quick=False):
     """
@@ -76,32 +59,27 @@ def deploy(ctx, backup=False, quick=False):
     print(f"🚀 Starting deployment to {user}@{host}")
 
     try:
-        # Step 1: Create project archive
-        if not quick:
-            archive_path = create_archive()
-
-        # Step 2: Prepare remote server
+        # Step 1: Prepare remote server
         setup_remote_environment(conn)
 
-        # Step 3: Backup existing data (only if requested)
+        # Step 2: Backup existing data (only if requested)
         if backup:
             backup_database(conn)
 
-        # Step 4: Upload and extract new code
+        # Step 3: Upload changed files and switch to the new release
+        changed = True
         if not quick:
-            upload_and_extract(conn, archive_path)
+            changed = upload_release(conn)['changed']
 
-        # Step 5: Deploy application
-        deploy_application(conn, quick=quick)
+        # Step 4: Deploy application
+        if changed:
+            deploy_application(conn, quick=quick)
+        else:
+            print("ℹ️  Server already runs this commit, skipping rebuild")
 
-        # Step 6: Verify deployment
+        # Step 5: Verify deployment
         verify_deployment(conn)
 
-        # Cleanup local archive
-        if not quick and os.path.exists(archive_path):
-            os.remove(archive_path)
-            print("🧹 Cleaned up local archive")
-
         print("🎉 Deployment completed successfully!")
 
     except Exception as e:
@@ -135,49 +113,78 @@ def setup_remote_environment(conn):
     print("✅ Remote environment ready")
 
 
-def backup_database(conn):
-    """Create backup of existing database."""
-    print("💾 Creating database backup...")
-
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_name = f"db_backup_{timestamp}.sqlite3"
-
-    # Check if database exists
-    result = conn.run(f'test -f {REMOTE_PROJECT_DIR}/db.sqlite3', warn=True)
-    if result.ok:
-        conn.run(f'cp {REMOTE_PROJECT_DIR}/db.sqlite3 {BACKUP_DIR}/{backup_name}')
-        print(f"✅ Database backed up as: {backup_name}")
-
-        # Keep only last 10 backups
-        conn.run(f'cd {BACKUP_DIR} && ls -t db_backup_*.sqlite3 | tail -n +11 | xargs -r rm')
-    else:
-        print("ℹ️  No existing database found, skipping backup")
+def uses_postgres(conn):
+    """True when the server's .env switches the app to PostgreSQL (DB_ENGINE=postgres)."""
+    return conn.run(f"grep -qs '^DB_ENGINE=postgres' {REMOTE_PROJECT_DIR}/.env", warn=True, hide=True).ok
 
 
-def upload_and_extract(conn, archive_path):
-    """Upload archive to server and extract it."""
-    print("📤 Uploading archive to server...")
+def backup_database(conn, incremental=False, compress='gzip'):
+    """
+    Create an online backup of the database while the application keeps running.
 
-    remote_archive_path = f"/tmp/{ARCHIVE_NAME}"
+    projectname/backups.py is piped into the running container, so the backup works
+    with whatever release is deployed there. Incremental backups only store pages
+    changed since the previous backup.
+    """
+    print("💾 Creating database backup...")
 
-    # Upload archive
-    conn.put(archive_path, remote_archive_path)
-    print("✅ Archive uploaded")
+    if uses_postgres(conn):
+        print("ℹ️  PostgreSQL database: back it up with pg_dump (see DEPLOYMENT.md), skipping")
+        return None
 
-    # Extract archive
-    print("📂 Extracting archive...")
-    conn.run(f'cd {REMOTE_PROJECT_DIR} && tar -xzf {remote_archive_path}')
+    # Check if database exists
+    result = conn.run(f'test -f {REMOTE_PROJECT_DIR}/db_data/db.sqlite3', warn=True)
+    if result.failed:
+        print("ℹ️  No existing database found, skipping backup")
+        return None
 
-    # Cleanup remote archive
-    conn.run(f'rm {remote_archive_path}')
-    print("✅ Archive extracted and cleaned up")
+    remote_script = f"/tmp/{PROJECT_NAME}-backups.py"
+    conn.put(BACKUP_SCRIPT, remote_script)
+    mode = ' --incremental' if incremental else ''
+    try:
+        with conn.cd(APP_DIR):
+            result = conn.run(
+                f'docker compose exec -T quizicle_web python - backup --db {CONTAINER_DB} '
+                f'--dir {CONTAINER_BACKUP_DIR} --compress {compress}{mode} < {remote_script}',
+                hide='stdout'
+            )
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"✅ {report['kind'].capitalize()} backup {report['name']}: "
+                  f"{report['pages_written']}/{report['page_count']} pages, "
+                  f"{report['bytes'] / 1024 / 1024:.1f} MB, sha256 {report['sha256'][:12]}")
+
+            # Keep the newest full backups together with their incrementals
+            conn.run(
+                f'docker compose exec -T quizicle_web python - prune --dir {CONTAINER_BACKUP_DIR} '
+                f'--keep {BACKUP_KEEP_CHAINS} < {remote_script}',
+                hide='stdout'
+            )
+    finally:
+        conn.run(f'rm -f {remote_script}')
+    return report
+
+
+def upload_release(conn):
+    """Upload files changed since the last deploy and atomically switch `current` to them."""
+    print("📤 Uploading changed files...")
+
+    started = time.monotonic()
+    result = deploysync.sync(deploysync.RemoteTarget(conn, REMOTE_PROJECT_DIR))
+    elapsed = time.monotonic() - started
+
+    if result['changed']:
+        print(f"✅ Release {result['release']}: {result['uploaded']} of {result['files']} files uploaded "
+              f"({result['bytes'] / 1024:.0f} KB) in {elapsed:.1f}s")
+    else:
+        print(f"✅ No changes to upload ({result['files']} files checked in {elapsed:.1f}s)")
+    return result
 
 
 def deploy_application(conn, quick=False):
     """Build and run Docker containers."""
     print("🐳 Deploying Docker application...")
 
-    with conn.cd(REMOTE_PROJECT_DIR):
+    with conn.cd(APP_DIR):
         # Stop existing containers
         print("🛑 Stopping existing containers...")
         conn.run('docker compose down', warn=True)
@@ -187,13 +194,26 @@ def deploy_application(conn, quick=False):
             print("🔨 Building Docker images...")
             conn.run('docker compose build --no-cache')
 
+        # The compose file falls back to a development password that must not reach a server
+        if uses_postgres(conn) and not conn.run(
+                f"grep -qs '^DB_PASSWORD=.' {REMOTE_PROJECT_DIR}/.env", warn=True, hide=True).ok:
+            print("⚠️  DB_ENGINE=postgres is set but .env has no DB_PASSWORD.")
+            raise Exception("DB_PASSWORD not set for PostgreSQL")
+
         # Start containers
         print("▶️  Starting containers...")
-        conn.run('docker compose up -d')
+        # --wait: migrations below need the postgres service to pass its health check
+        conn.run('docker compose up -d --wait')
 
         # Run migrations
         print("🗃️  Running database migrations...")
         conn.run('docker compose exec -T quizicle_web python manage.py migrate')
+        # With PostgreSQL sessions stay in the main database; there is no sessions file
+        if not uses_postgres(conn):
+            conn.run('docker compose exec -T quizicle_web python manage.py migrate --database=sessions')
+
+            # Sessions left in the main database by older releases (no-op once moved)
+            conn.run('docker compose exec -T quizicle_web python manage.py move_sessions --delete')
 
         # Collect static files
         print("📁 Collecting static files...")
@@ -202,16 +222,40 @@ def deploy_application(conn, quick=False):
     print("✅ Application deployed")
 
 
+def wait_for_warmup(conn, timeout=WARMUP_TIMEOUT):
+    """Wait until the application has finished its start-up warm-up."""
+    print("🔥 Waiting for warm-up to finish...")
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = conn.run(
+            f'docker compose exec -T quizicle_web cat {WARMUP_STATUS_FILE}',
+            warn=True, hide=True
+        )
+        if result.ok and result.stdout.strip():
+            report = json.loads(result.stdout)
+            phases = ', '.join(f"{name} {ms:.0f} ms" for name, ms in report['phases'].items())
+            print(f"✅ Warm-up finished in {report['total_ms']:.0f} ms ({phases})")
+            return report
+        time.sleep(2)
+
+    print(f"⚠️  Warm-up did not finish within {timeout} seconds")
+    return None
+
+
 def verify_deployment(conn):
     """Verify that the deployment was successful."""
     print("🔍 Verifying deployment...")
 
-    with conn.cd(REMOTE_PROJECT_DIR):
+    with conn.cd(APP_DIR):
         # Check container status
         result = conn.run('docker compose ps')
         print("Container status:")
         print(result.stdout)
 
+        # Workers only accept traffic once the warm-up is done
+        wait_for_warmup(conn)
+
         # Test application response
         print("🌐 Testing application response...")
         result = conn.run('curl -s -o /dev/null -w "%{http_code}" http://localhost', warn=True)
@@ -223,11 +267,17 @@ def verify_deployment(conn):
 
 
 @task
-def backup(ctx):
-    """Create a backup of the production database."""
+def backup(ctx, incremental=False, compress='gzip'):
+    """
+    Create a backup of the production database.
+
+    Args:
+        incremental: Only store pages changed since the previous backup (default: False)
+        compress: gzip or zstd (zstd needs the zstandard package in the image)
+    """
     conn, host, user = get_connection(ctx)
     print(f"💾 Creating backup on {user}@{host}")
-    backup_database(conn)
+    backup_database(conn, incremental=incremental, compress=compress)
 
 
 @task
@@ -236,7 +286,7 @@ def logs(ctx, service='quizicle_web', lines=100):
     conn, host, user = get_connection(ctx)
     print(f"📋 Viewing logs from {user}@{host}")
 
-    with conn.cd(REMOTE_PROJECT_DIR):
+    with conn.cd(APP_DIR):
         conn.run(f'docker compose logs --tail={lines} -f {service}')
 
 
@@ -246,7 +296,7 @@ def status(ctx):
     conn, host, user = get_connection(ctx)
     print(f"📊 Checking status on {user}@{host}")
 
-    with conn.cd(REMOTE_PROJECT_DIR):
+    with conn.cd(APP_DIR):
         print("📊 Container Status:")
         conn.run('docker compose ps')
 
@@ -263,7 +313,7 @@ def restart(ctx, service=None):
     conn, host, user = get_connection(ctx)
     print(f"🔄 Restarting services on {user}@{host}")
 
-    with conn.cd(REMOTE_PROJECT_DIR):
+    with conn.cd(APP_DIR):
         if service:
             print(f"🔄 Restarting {service} service...")
             conn.run(f'docker compose restart {service}')
@@ -278,7 +328,7 @@ def shell(ctx):
     conn, host, user = get_connection(ctx)
     print(f"🐚 Opening Django shell on {user}@{host}")
 
-    with conn.cd(REMOTE_PROJECT_DIR):
+    with conn.cd(APP_DIR):
         conn.run('docker compose exec web python manage.py shell')
 
 
@@ -308,6 +358,29 @@ def deploy_with_backup(ctx):
     deploy(ctx, backup=True, quick=False)
 
 
+@task
+def rollback(ctx):
+    """Switch back to the previous release and rebuild it."""
+    conn, host, user = get_connection(ctx)
+    print(f"⏪ Rolling back on {user}@{host}")
+
+    previous = deploysync.rollback(deploysync.RemoteTarget(conn, REMOTE_PROJECT_DIR))
+    if previous is None:
+        print("❌ No earlier release to roll back to")
+        return
+    print(f"✅ Switched to release {previous}")
+    deploy_application(conn)
+    verify_deployment(conn)
+
+
+@task
+def sync_local(ctx, path='/tmp/quizicle-deploy'):
+    """Run the deploy upload step against a local directory instead of the server."""
+    print(f"📤 Syncing committed files to {path}...")
+    result = deploysync.sync(deploysync.LocalTarget(path))
+    print(json.dumps(result, indent=2))
+
+
 # Helper function for local development
 @task
 def local_test(ctx):
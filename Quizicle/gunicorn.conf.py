@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration.
+
+preload_app imports the application in the master, where projectname.wsgi runs the
+warm-up before any worker is forked, so workers never serve traffic cold.
+"""
+
+import os
+import time
+
+bind = '0.0.0.0:8000'
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+timeout = 120
+preload_app = True
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    server.log.info('Startup took %.1f ms (including warm-up)', (time.perf_counter() - _started) * 1000)
@@ -0,0 +1,214 @@
+"""
+Item analysis for quiz creators: difficulty, discrimination and distractor rates per question.
+
+Attempts are read like the CSV export: graded selections plus the snapshot they were graded
+against, and the QuizResultAnswer rows of older attempts without one. The rows are packed
+into NumPy arrays (the stored selections take one pass to unpack) and every statistic is
+computed with bincount-style aggregation, never a Python loop over rows. Editing a quiz recreates its answers, so items only found in older
+snapshots stay in the report, marked as retired.
+"""
+
+from itertools import chain
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connections
+
+from .caching import quiz_key
+from .models import Answer, QuizResultAnswer, QuizSnapshot, Results
+
+
+CACHE_TIMEOUT = 60 * 60
+FETCH_CHUNK = 50000
+ITERATOR_CHUNK = 2000
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+
+
+def item_analysis(quiz):
+    """Cached analysis keyed by quiz version and number of attempts."""
+    key = quiz_key(quiz, f'item-analysis:{quiz.results.count()}')
+    report = cache.get(key)
+    if report is None:
+        report = compute_item_analysis(quiz)
+        cache.set(key, report, CACHE_TIMEOUT)
+    return report
+
+
+def load_items(quiz):
+    """
+    ({question_id: (description, points, current)}, {answer_id: (question_id, text, correct, current)})
+    for the quiz's current questions and answers plus those only found in its older snapshots.
+    """
+    questions = {
+        question_id: (text, points, True)
+        for question_id, text, points in quiz.questions.values_list('id', 'description', 'points_for_question')
+    }
+    answers = {
+        answer_id: (question_id, text, correct, True)
+        for answer_id, question_id, text, correct in Answer.objects.filter(question__quiz=quiz).values_list(
+            'id', 'question_id', 'answer', 'correct'
+        )
+    }
+    snapshots = QuizSnapshot.objects.filter(quiz=quiz).order_by('-id').values_list('data', flat=True)
+    for data in snapshots.iterator(ITERATOR_CHUNK):
+        for question in data['questions']:
+            questions.setdefault(question['id'], (question['description'], question['points'], False))
+            for answer in question['answers']:
+                answers.setdefault(answer['id'], (question['id'], answer['answer'], answer['correct'], False))
+    return questions, answers
+
+
+def _load_legacy_rows(quiz):
+    """(result_id, question_id, answer_id) rows of attempts graded before snapshots existed."""
+    query = QuizResultAnswer.objects.filter(quiz_result__quiz=quiz, quiz_result__snapshot__isnull=True).values_list(
+        'quiz_result_id', 'question_id', 'answer_id'
+    )
+    # The connection the router picks for this read (the read-only one for quiz_analytics)
+    alias = query.db
+    sql, params = query.query.get_compiler(using=alias).as_sql()
+    # Fetch raw tuples in chunks straight into arrays, skipping per-row model/iterator overhead
+    chunks = []
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK)
+            if not rows:
+                break
+            chunks.append(np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * 3))
+    return chunks
+
+
+def load_answer_matrix(quiz):
+    """Return (result_ids, question_ids, answer_ids) arrays for every answer picked on the quiz."""
+    chunks = _load_legacy_rows(quiz)
+    graded = Results.objects.filter(quiz=quiz, snapshot__isnull=False).values_list('id', 'selections')
+    rows = []
+    for result_id, selections in graded.iterator(ITERATOR_CHUNK):
+        rows.extend((result_id, int(question_id), answer_id) for question_id, answer_id in selections.items())
+        if len(rows) >= FETCH_CHUNK:
+            chunks.append(np.array(rows, dtype=np.int64).ravel())
+            rows = []
+    if rows:
+        chunks.append(np.array(rows, dtype=np.int64).ravel())
+    matrix = np.concatenate(chunks).reshape(-1, 3) if chunks else np.zeros((0, 3), dtype=np.int64)
+    return matrix[:, 0], matrix[:, 1], matrix[:, 2]
+
+
+def _positions(sorted_ids, values):
+    """Index of each value in sorted_ids, plus a mask of the values that were found."""
+    if not len(sorted_ids):
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return pos, sorted_ids[pos] == values
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def _clean(value, digits=3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def compute_item_analysis(quiz):
+    items, options_by_id = load_items(quiz)
+    questions = [(question_id, *items[question_id]) for question_id in sorted(items)]
+    answers = [(answer_id, *options_by_id[answer_id]) for answer_id in sorted(options_by_id)]
+    question_ids = np.array([q[0] for q in questions], dtype=np.int64)
+    points = np.array([q[2] for q in questions], dtype=np.float64)
+    answer_ids = np.array([a[0] for a in answers], dtype=np.int64)
+
+    answer_correct = np.array([a[3] for a in answers], dtype=bool)
+    answer_question_ids = np.array([a[1] for a in answers], dtype=np.int64)
+
+    result_ids, row_questions, row_answers = load_answer_matrix(quiz)
+
+    # Drop rows pointing at questions/answers the quiz never had
+    q_pos, q_found = _positions(question_ids, row_questions)
+    a_pos, a_found = _positions(answer_ids, row_answers)
+    valid = q_found & a_found
+    q_pos, a_pos, result_ids = q_pos[valid], a_pos[valid], result_ids[valid]
+    correct = answer_correct[a_pos]
+
+    attempts, result_pos = np.unique(result_ids, return_inverse=True)
+    n_questions = len(question_ids)
+    earned = correct * points[q_pos]
+    totals = np.bincount(result_pos, weights=earned, minlength=len(attempts))
+
+    answered = np.bincount(q_pos, minlength=n_questions).astype(np.float64)
+    right = np.bincount(q_pos, weights=correct, minlength=n_questions)
+    difficulty = _ratio(right, answered)
+
+    # Point-biserial correlation between getting the item right and the rest-of-test score
+    rest = totals[result_pos] - earned
+    rest_sum = np.bincount(q_pos, weights=rest, minlength=n_questions)
+    rest_sq_sum = np.bincount(q_pos, weights=rest * rest, minlength=n_questions)
+    rest_right_sum = np.bincount(q_pos, weights=rest * correct, minlength=n_questions)
+    mean_right = _ratio(rest_right_sum, right)
+    mean_wrong = _ratio(rest_sum - rest_right_sum, answered - right)
+    variance = _ratio(rest_sq_sum, answered) - _ratio(rest_sum, answered) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discrimination = np.where(
+            variance > 1e-12,
+            (mean_right - mean_wrong) / np.sqrt(np.maximum(variance, 1e-12)) * np.sqrt(difficulty * (1 - difficulty)),
+            np.nan,
+        )
+
+    selections = np.bincount(a_pos, minlength=len(answer_ids)).astype(np.float64)
+    answer_questions = np.searchsorted(question_ids, answer_question_ids)
+    selection_rate = _ratio(selections, answered[answer_questions])
+
+    options = {}
+    for index, (answer_id, _, text, is_correct, current) in enumerate(answers):
+        options.setdefault(int(answer_questions[index]), []).append({
+            'id': answer_id,
+            'answer': text,
+            'correct': is_correct,
+            'retired': not current,
+            'selected': int(selections[index]),
+            'rate': _clean(selection_rate[index]),
+        })
+
+    report_questions = []
+    for index, (question_id, text, question_points, current) in enumerate(questions):
+        p = _clean(difficulty[index])
+        r = _clean(discrimination[index])
+        distractors = [o for o in options.get(index, []) if not o['correct']]
+        top_distractor = max(distractors, key=lambda o: o['selected'], default=None)
+        right_count = int(right[index])
+        flags = []
+        if p is not None and p >= TOO_EASY:
+            flags.append('too easy')
+        if p is not None and p <= TOO_HARD:
+            flags.append('too hard')
+        if (r is not None and r < 0) or (top_distractor and top_distractor['selected'] > right_count):
+            flags.append('misleading')
+        report_questions.append({
+            'id': question_id,
+            'description': text,
+            'points': question_points,
+            'retired': not current,
+            'answered': int(answered[index]),
+            'difficulty': p,
+            'discrimination': r,
+            'options': options.get(index, []),
+            'flags': flags,
+        })
+
+    # Current questions first; retired ones only count towards the attempts' totals
+    report_questions.sort(key=lambda question: question['retired'])
+    max_points = int(sum(question_points for _, _, question_points, current in questions if current))
+    distribution = np.bincount(
+        np.clip(np.rint(totals), 0, max_points).astype(np.int64), minlength=max_points + 1
+    ) if len(totals) else np.zeros(max_points + 1, dtype=np.int64)
+
+    return {
+        'attempts': int(len(attempts)),
+        'max_points': max_points,
+        'mean_score': _clean(totals.mean()) if len(totals) else None,
+        'median_score': _clean(np.median(totals)) if len(totals) else None,
+        'score_distribution': [int(count) for count in distribution],
+        'questions': report_questions,
+    }
@@ -0,0 +1,218 @@
+"""
+Recording graded quiz attempts.
+
+Shared by the HTML take flow and the JSON API, so every attempt is graded against a
+snapshot and updates results, answer counters and the leaderboard the same way.
+
+Large quizzes are taken a page at a time: a QuizAttempt row pins the snapshot and
+collects the answers of each submitted page, and the attempt is graded from that row
+when the last page is finished.
+
+Answers picked but not yet submitted are autosaved. Autosaves are coalesced: they merge
+into a pending {question_id: answer_id} entry in the cache (last write wins) and reach
+the QuizAttempt row at most once per AUTOSAVE_FLUSH_INTERVAL seconds per attempt, and
+in at most AUTOSAVE_MAX_FLUSHES_PER_SECOND writes per second overall; saving a page or
+submitting flushes them immediately. Readers always combine the row with the pending
+entry, so an unflushed autosave is still restored. The cache may drop entries, so the
+last autosave of a page that is being left (sent with final=1) is always written, and
+resuming an attempt writes whatever is still pending.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, transaction
+
+from . import history, leaderboard, metrics
+from .caching import bump_attempt_version, bump_user_version
+from .counters import record_selections
+from .models import Answer, QuizAttempt, QuizResultAnswer, Results
+from .retries import write_transaction
+from .snapshots import grade
+
+
+PENDING_TIMEOUT = 24 * 60 * 60
+
+
+def _existing_selections(selections):
+    """
+    The (question_id, answer_id) pairs of graded selections whose rows still exist.
+    Editing a quiz recreates its answers, so an attempt graded against an older snapshot
+    may refer to rows that are gone; Results.selections keeps every pick regardless.
+    """
+    pairs = [(int(question_id), answer_id) for question_id, answer_id in selections.items()]
+    existing = set(Answer.objects.filter(id__in=[answer_id for _, answer_id in pairs]).values_list(
+        'question_id', 'id'
+    ))
+    return [pair for pair in pairs if pair in existing]
+
+
+def submit_attempt(quiz, user, snapshot, chosen):
+    """Grade {question_id: answer_id} against snapshot, store the attempt and return the Results row."""
+    score, selections = grade(snapshot, chosen)
+
+    def store():
+        result = Results.objects.create(
+            quiz=quiz, user=user.username, result=score,
+            snapshot=snapshot, selections=selections,
+        )
+        selected = _existing_selections(selections)
+        QuizResultAnswer.objects.bulk_create([
+            QuizResultAnswer(quiz_result=result, question_id=question_id, answer_id=answer_id)
+            for question_id, answer_id in selected
+        ])
+        record_selections(selected)
+        leaderboard.record_score(quiz, user, score, result.created_at)
+        history.record_attempt(quiz, user, result)
+        return result
+
+    result = write_transaction(store, 'submit_attempt')
+    # finish_attempt() calls this inside its own transaction
+    transaction.on_commit(lambda: bump_user_version(user.id))
+    return result
+
+
+def open_attempt(quiz, user, snapshot_id):
+    """The user's attempt in progress on the quiz, started against snapshot_id if there is none."""
+    attempt = QuizAttempt.objects.filter(quiz=quiz, user=user).first()
+    if attempt is not None:
+        return attempt
+    try:
+        with transaction.atomic():
+            return QuizAttempt.objects.create(quiz=quiz, user=user, snapshot_id=snapshot_id)
+    except IntegrityError:
+        # Started by a concurrent request
+        return QuizAttempt.objects.get(quiz=quiz, user=user)
+
+
+def _pending_key(quiz_id, user_id):
+    return f'attempt:{quiz_id}:{user_id}:pending'
+
+
+def pending_answers(quiz_id, user_id):
+    return cache.get(_pending_key(quiz_id, user_id)) or {}
+
+
+def saved_answers(quiz_id, user):
+    """Everything autosaved or submitted page by page for the user's attempt in progress."""
+    stored = QuizAttempt.objects.filter(quiz_id=quiz_id, user=user).values_list('answers', flat=True).first()
+    return {**(stored or {}), **pending_answers(quiz_id, user.id)}
+
+
+def _flush_slot(key):
+    """'flushed' when this autosave may write to the database now, else 'cached' or 'deferred'."""
+    interval = getattr(settings, 'AUTOSAVE_FLUSH_INTERVAL', 5)
+    if not cache.add(f'{key}:flushed', 1, interval):
+        return 'cached'
+    budget = getattr(settings, 'AUTOSAVE_MAX_FLUSHES_PER_SECOND', 50)
+    second = f'autosave:flushes:{int(time.time())}'
+    cache.add(second, 0, 2)
+    try:
+        flushes = cache.incr(second)
+    except ValueError:
+        flushes = 1
+    if flushes > budget:
+        # Over the global budget: retry on this attempt's next autosave
+        cache.delete(f'{key}:flushed')
+        return 'deferred'
+    return 'flushed'
+
+
+def _store_pending(quiz, user, snapshot_id, pending):
+    def store():
+        attempt = open_attempt(quiz, user, snapshot_id)
+        attempt.answers.update(pending)
+        attempt.save(update_fields=['answers', 'updated_at'])
+
+    write_transaction(store, 'autosave')
+
+
+def autosave(quiz, user, snapshot_id, chosen, final=False):
+    """
+    Record {question_id: answer_id} picked so far; returns 'flushed', 'cached' or 'deferred'.
+    A final autosave, sent when the page is left, is written whatever the limits.
+    """
+    key = _pending_key(quiz.id, user.id)
+    pending = cache.get(key) or {}
+    pending.update({str(question_id): answer_id for question_id, answer_id in chosen.items()})
+    outcome = 'flushed' if final else _flush_slot(key)
+    if outcome == 'flushed':
+        try:
+            _store_pending(quiz, user, snapshot_id, pending)
+        except OperationalError:
+            outcome = 'deferred'
+    if outcome == 'flushed':
+        cache.delete(key)
+    else:
+        cache.set(key, pending, PENDING_TIMEOUT)
+    bump_attempt_version(quiz.id, user.id)
+    metrics.record_autosave(outcome)
+    return outcome
+
+
+def flush_pending(quiz, user, snapshot_id):
+    """
+    Write pending autosaves to the attempt, e.g. when it is resumed, and return them.
+    They stay pending when the database is locked out.
+    """
+    key = _pending_key(quiz.id, user.id)
+    pending = cache.get(key) or {}
+    if not pending:
+        return pending
+    try:
+        _store_pending(quiz, user, snapshot_id, pending)
+    except OperationalError:
+        return pending
+    if cache.get(key) == pending:
+        # Kept when an autosave added answers meanwhile
+        cache.delete(key)
+    return pending
+
+
+def save_page(attempt, page, chosen):
+    """Merge pending autosaves and one page's {question_id: answer_id} into the attempt."""
+    pending = pending_answers(attempt.quiz_id, attempt.user_id)
+
+    def store():
+        attempt.answers.update(pending)
+        attempt.answers.update({str(question_id): answer_id for question_id, answer_id in chosen.items()})
+        attempt.page = max(attempt.page, page)
+        attempt.save(update_fields=['answers', 'page', 'updated_at'])
+
+    write_transaction(store, 'save_page')
+    cache.delete(_pending_key(attempt.quiz_id, attempt.user_id))
+    bump_attempt_version(attempt.quiz_id, attempt.user_id)
+
+
+def keep_answers(quiz_id, user_id, chosen):
+    """Hold answers that could not be submitted as pending autosaves, so the form restores them."""
+    key = _pending_key(quiz_id, user_id)
+    pending = cache.get(key) or {}
+    pending.update({str(question_id): answer_id for question_id, answer_id in chosen.items()})
+    cache.set(key, pending, PENDING_TIMEOUT)
+    bump_attempt_version(quiz_id, user_id)
+
+
+def discard_attempt(quiz_id, user):
+    """Forget the user's attempt in progress, e.g. once the single-page form was submitted."""
+    QuizAttempt.objects.filter(quiz_id=quiz_id, user=user).delete()
+    cache.delete(_pending_key(quiz_id, user.id))
+    bump_attempt_version(quiz_id, user.id)
+
+
+def finish_attempt(attempt):
+    """Grade the accumulated answers against the attempt's snapshot; returns the Results row."""
+    answers = {**attempt.answers, **pending_answers(attempt.quiz_id, attempt.user_id)}
+    chosen = {int(question_id): answer_id for question_id, answer_id in answers.items()}
+
+    def store():
+        result = submit_attempt(attempt.quiz, attempt.user, attempt.snapshot, chosen)
+        # Not attempt.delete(): it clears attempt.pk, which a retry would still need
+        QuizAttempt.objects.filter(pk=attempt.pk).delete()
+        return result
+
+    result = write_transaction(store, 'finish_attempt')
+    cache.delete(_pending_key(attempt.quiz_id, attempt.user_id))
+    bump_attempt_version(attempt.quiz_id, attempt.user_id)
+    return result
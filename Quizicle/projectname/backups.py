@@ -0,0 +1,357 @@
+"""
+Online SQLite backups.
+
+Standard library only, so fabfile.backup_database can pipe this file into the running
+container (`python - backup ...`) whatever version of the app is deployed there.
+
+A backup first copies the live database with SQLite's backup API. In WAL mode readers
+never block writers, so the copy runs in one step. In the default rollback-journal mode
+writers cannot commit while the copy holds its read lock, so it runs STEP_PAGES pages at
+a time and releases the lock between steps: a writer waits for one step at most, not for
+the whole copy. A commit from another connection restarts a stepped copy; after
+MAX_RESTARTS restarts the rest is copied in one step, so a busy database is still backed
+up, at the cost of one longer pause (switch the database to WAL to avoid it). The
+snapshot's pages are then streamed through gzip (or zstd when the `zstandard` package
+is installed) while hashing the output.
+A full backup stores every page; an incremental one stores only the pages whose digest
+differs from the previous backup, so its size and compression time follow the amount
+of changed data rather than the size of the database.
+
+Files per backup <name> in the backup directory:
+    <name>.bak.gz / <name>.bak.zst   header + (page number, page) records
+    <name>.sha256                    checksum of the compressed file (sha256sum -c format)
+    <name>.pages                     16-byte digest of every page, the base for the next incremental
+
+Usage:
+    python projectname/backups.py backup --db db.sqlite3 --dir backups [--incremental] [--compress zstd]
+    python projectname/backups.py restore --dir backups --to restored.sqlite3 [--name NAME]
+    python projectname/backups.py prune --dir backups --keep 3
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import sys
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+FORMAT = 1
+DIGEST_SIZE = 16
+MAX_CHAIN = 30  # incrementals before the next backup is forced to be full
+STEP_PAGES = 256  # pages copied per backup step (1 MiB with 4 KiB pages)
+STEP_SLEEP = 0.005  # seconds between steps, during which writers can commit
+MAX_RESTARTS = 5
+EXTENSIONS = {'gzip': '.bak.gz', 'zstd': '.bak.zst'}
+_record = struct.Struct('>I')
+_header_length = struct.Struct('>I')
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class _HashingWriter:
+    """File wrapper that hashes everything written through it."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.fh.write(data)
+
+    def flush(self):
+        self.fh.flush()
+
+
+def _compressor(fileobj, compress, level):
+    if compress == 'zstd':
+        if zstandard is None:
+            raise BackupError('zstd compression needs the zstandard package')
+        return zstandard.ZstdCompressor(level=level or 3).stream_writer(fileobj, closefd=False)
+    return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level or 6, mtime=0)
+
+
+def _decompressor(path):
+    fh = open(path, 'rb')
+    if path.endswith(EXTENSIONS['zstd']):
+        if zstandard is None:
+            raise BackupError('Reading zstd backups needs the zstandard package')
+        return zstandard.ZstdDecompressor().stream_reader(fh, closefd=True)
+    return gzip.GzipFile(fileobj=fh, mode='rb')
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _read_header(stream):
+    raw = _read_exactly(stream, _header_length.size)
+    if len(raw) != _header_length.size:
+        raise BackupError('Backup file is truncated')
+    return json.loads(_read_exactly(stream, _header_length.unpack(raw)[0]))
+
+
+def snapshot(db_path, target_path, pages=STEP_PAGES, sleep=STEP_SLEEP):
+    """Consistent copy of a live database through the SQLite backup API, in steps of `pages`."""
+    source = sqlite3.connect(db_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    restarts = 0
+    left = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, left
+        if left is not None and remaining > left:
+            # Another connection wrote to the database, so the copy started over
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _TooManyRestarts
+        left = remaining
+
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+            source.backup(target)
+        else:
+            try:
+                source.backup(target, pages=pages, progress=progress, sleep=sleep)
+            except _TooManyRestarts:
+                source.backup(target)
+        page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        # The copy keeps the source's journal mode; restored files should open standalone
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+    return page_size
+
+
+def list_backups(directory):
+    """Backup names in creation order."""
+    if not os.path.isdir(directory):
+        return []
+    names = set()
+    for filename in os.listdir(directory):
+        for extension in EXTENSIONS.values():
+            if filename.endswith(extension):
+                names.add(filename[:-len(extension)])
+    return sorted(names)
+
+
+def _data_path(directory, name):
+    for extension in EXTENSIONS.values():
+        path = os.path.join(directory, name + extension)
+        if os.path.exists(path):
+            return path
+    raise BackupError(f'No backup named {name} in {directory}')
+
+
+def read_header(directory, name):
+    with _decompressor(_data_path(directory, name)) as stream:
+        return _read_header(stream)
+
+
+def _chain(directory, name):
+    """Headers from the full backup up to `name`."""
+    chain = []
+    while name:
+        header = read_header(directory, name)
+        chain.append(header)
+        name = header['base']
+    return list(reversed(chain))
+
+
+def backup(db_path, directory, incremental=False, compress='gzip', level=None):
+    """Write a new backup of db_path into directory and return its header."""
+    os.makedirs(directory, exist_ok=True)
+    name = 'db-' + datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S_%f')
+    snapshot_path = os.path.join(directory, f'.{name}.snapshot')
+    data_path = os.path.join(directory, name + EXTENSIONS[compress])
+
+    base = None
+    previous = []
+    existing = list_backups(directory)
+    if incremental and existing:
+        latest = existing[-1]
+        pages_path = os.path.join(directory, latest + '.pages')
+        if os.path.exists(pages_path) and len(_chain(directory, latest)) < MAX_CHAIN:
+            base = latest
+            with open(pages_path, 'rb') as fh:
+                raw = fh.read()
+            previous = [raw[i:i + DIGEST_SIZE] for i in range(0, len(raw), DIGEST_SIZE)]
+
+    try:
+        page_size = snapshot(db_path, snapshot_path)
+        if base and read_header(directory, base)['page_size'] != page_size:
+            base, previous = None, []
+
+        page_count = os.path.getsize(snapshot_path) // page_size
+        digests = []
+        db_hash = hashlib.sha256()
+        written = 0
+        with open(snapshot_path, 'rb') as source, open(data_path + '.tmp', 'wb') as raw_out:
+            out = _HashingWriter(raw_out)
+            header = json.dumps({
+                'format': FORMAT, 'name': name, 'kind': 'incremental' if base else 'full', 'base': base,
+                'page_size': page_size, 'page_count': page_count,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+            }).encode()
+            with _compressor(out, compress, level) as stream:
+                stream.write(_header_length.pack(len(header)) + header)
+                for number in range(page_count):
+                    page = source.read(page_size)
+                    db_hash.update(page)
+                    digest = hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+                    digests.append(digest)
+                    if base and number < len(previous) and previous[number] == digest:
+                        continue
+                    stream.write(_record.pack(number) + page)
+                    written += 1
+                # Trailer: the checksum of the whole database, checked after a restore
+                stream.write(_record.pack(0xFFFFFFFF) + db_hash.digest())
+            raw_out.flush()
+            os.fsync(raw_out.fileno())
+
+        os.replace(data_path + '.tmp', data_path)
+        with open(os.path.join(directory, name + '.pages'), 'wb') as fh:
+            fh.write(b''.join(digests))
+        with open(os.path.join(directory, name + '.sha256'), 'w') as fh:
+            fh.write(f'{out.sha256.hexdigest()}  {os.path.basename(data_path)}\n')
+    finally:
+        for path in (snapshot_path, data_path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return {
+        'name': name, 'kind': 'incremental' if base else 'full', 'base': base, 'file': data_path,
+        'page_size': page_size, 'page_count': page_count, 'pages_written': written,
+        'bytes': os.path.getsize(data_path), 'sha256': out.sha256.hexdigest(),
+        'db_sha256': db_hash.hexdigest(),
+    }
+
+
+def verify(directory, name):
+    """Compare a backup file with its .sha256; raises BackupError on mismatch."""
+    path = _data_path(directory, name)
+    with open(os.path.join(directory, name + '.sha256')) as fh:
+        expected = fh.read().split()[0]
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    if sha256.hexdigest() != expected:
+        raise BackupError(f'Checksum mismatch for {os.path.basename(path)}')
+
+
+def restore(directory, target_path, name=None):
+    """Rebuild the database as of backup `name` (default: the newest) into target_path."""
+    backups = list_backups(directory)
+    if not backups:
+        raise BackupError(f'No backups in {directory}')
+    chain = _chain(directory, name or backups[-1])
+    for header in chain:
+        verify(directory, header['name'])
+
+    tmp_path = target_path + '.restoring'
+    with open(tmp_path, 'wb') as target:
+        for header in chain:
+            page_size = header['page_size']
+            with _decompressor(_data_path(directory, header['name'])) as stream:
+                _read_header(stream)
+                while True:
+                    (number,) = _record.unpack(_read_exactly(stream, _record.size))
+                    if number == 0xFFFFFFFF:
+                        db_sha256 = _read_exactly(stream, 32)
+                        break
+                    page = _read_exactly(stream, page_size)
+                    if len(page) != page_size:
+                        raise BackupError(f"{header['name']} is truncated")
+                    target.seek(number * page_size)
+                    target.write(page)
+            target.truncate(header['page_count'] * page_size)
+
+    sha256 = hashlib.sha256()
+    with open(tmp_path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    if sha256.digest() != db_sha256:
+        os.remove(tmp_path)
+        raise BackupError('Restored database does not match the checksum taken at backup time')
+    os.replace(tmp_path, target_path)
+    return chain[-1]
+
+
+def prune(directory, keep):
+    """Delete whole backup chains (a full backup and its incrementals) except the newest `keep`."""
+    chains = []
+    for name in list_backups(directory):
+        if read_header(directory, name)['kind'] == 'full' or not chains:
+            chains.append([])
+        chains[-1].append(name)
+    removed = []
+    for chain in chains[:-keep] if keep else chains:
+        for name in chain:
+            for filename in os.listdir(directory):
+                if filename.startswith(name + '.'):
+                    os.remove(os.path.join(directory, filename))
+            removed.append(name)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Online SQLite backups')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = commands.add_parser('backup')
+    backup_parser.add_argument('--db', required=True)
+    backup_parser.add_argument('--dir', required=True)
+    backup_parser.add_argument('--incremental', action='store_true')
+    backup_parser.add_argument('--compress', choices=sorted(EXTENSIONS), default='gzip')
+    backup_parser.add_argument('--level', type=int)
+
+    restore_parser = commands.add_parser('restore')
+    restore_parser.add_argument('--dir', required=True)
+    restore_parser.add_argument('--to', required=True)
+    restore_parser.add_argument('--name')
+
+    prune_parser = commands.add_parser('prune')
+    prune_parser.add_argument('--dir', required=True)
+    prune_parser.add_argument('--keep', type=int, default=3)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'backup':
+            result = backup(args.db, args.dir, args.incremental, args.compress, args.level)
+        elif args.command == 'restore':
+            result = restore(args.dir, args.to, args.name)
+        else:
+            result = {'removed': prune(args.dir, args.keep)}
+    except BackupError as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 1
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
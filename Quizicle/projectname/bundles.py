@@ -0,0 +1,233 @@
+"""
+Quiz bundles: a zip holding `bundle.jsonl` plus the referenced images under `media/`.
+
+Every line of bundle.jsonl is one record, written parents first:
+    {"type": "quiz", "id": 1, "quiz_name": "...", "description": "..."}
+    {"type": "question", "id": 7, "quiz": 1, "description": "...", "points": 2, "image": "question_images/a.jpg"}
+    {"type": "answer", "question": 7, "answer": "...", "correct": true}
+    {"type": "description", "question": 7, "text": "...", "image": null}
+Ids only link records inside the bundle; imports always create new rows.
+"""
+
+import io
+import json
+import os
+import zipfile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .caching import bump_catalog_version
+from .models import Quiz, Question, Answer, Description
+
+
+BUNDLE_ENTRY = 'bundle.jsonl'
+MEDIA_PREFIX = 'media/'
+BATCH_SIZE = 1000
+ITERATOR_CHUNK = 2000
+
+
+class BundleError(Exception):
+    pass
+
+
+class _StreamBuffer:
+    """Write-only file object that hands zip output back to the generator as it is produced."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Return the pending output as a list of zero or one chunks."""
+        if not self._chunks:
+            return []
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return [data]
+
+
+def iter_records(quizzes):
+    """Yield bundle records for a Quiz queryset, one query per record type."""
+    quiz_ids = quizzes.values('id')
+    for quiz in quizzes.order_by('id').only('id', 'quiz_name', 'description').iterator(ITERATOR_CHUNK):
+        yield {'type': 'quiz', 'id': quiz.id, 'quiz_name': quiz.quiz_name, 'description': quiz.description}
+
+    questions = Question.objects.filter(quiz_id__in=quiz_ids).order_by('id')
+    for pk, quiz_id, text, points, image in questions.values_list(
+            'id', 'quiz_id', 'description', 'points_for_question', 'image').iterator(ITERATOR_CHUNK):
+        yield {'type': 'question', 'id': pk, 'quiz': quiz_id, 'description': text,
+               'points': points, 'image': image or None}
+
+    answers = Answer.objects.filter(question__quiz_id__in=quiz_ids).order_by('id')
+    for question_id, text, correct in answers.values_list('question_id', 'answer', 'correct').iterator(ITERATOR_CHUNK):
+        yield {'type': 'answer', 'question': question_id, 'answer': text, 'correct': correct}
+
+    descriptions = Description.objects.filter(question__quiz_id__in=quiz_ids).order_by('id')
+    for question_id, text, image in descriptions.values_list('question_id', 'text', 'image').iterator(ITERATOR_CHUNK):
+        yield {'type': 'description', 'question': question_id, 'text': text, 'image': image or None}
+
+
+def stream_bundle(quizzes):
+    """Yield the bytes of a bundle zip for the given Quiz queryset without buffering it."""
+    buffer = _StreamBuffer()
+    images = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(BUNDLE_ENTRY, 'w', force_zip64=True) as entry:
+            for record in iter_records(quizzes):
+                if record.get('image'):
+                    images.append(record['image'])
+                entry.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                yield from buffer.drain()
+
+        for name in images:
+            if not default_storage.exists(name):
+                continue
+            # Images are already compressed, so store them as-is
+            with default_storage.open(name, 'rb') as source, \
+                    archive.open(zipfile.ZipInfo(MEDIA_PREFIX + name), 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(64 * 1024), b''):
+                    target.write(chunk)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()
+
+
+def write_bundle(quizzes, fileobj):
+    for chunk in stream_bundle(quizzes):
+        fileobj.write(chunk)
+
+
+class BundleImporter:
+    """Reads bundle.jsonl line by line and inserts rows with bulk_create in batches."""
+
+    def __init__(self, archive, creator, batch_size=BATCH_SIZE):
+        self.archive = archive
+        self.creator = creator
+        self.batch_size = batch_size
+        self.quiz_ids = {}
+        self.question_ids = {}
+        self.totals = {}
+        self.pending = {'quiz': [], 'question': [], 'answer': [], 'description': []}
+        self.counts = {'quiz': 0, 'question': 0, 'answer': 0, 'description': 0}
+
+    def run(self):
+        try:
+            entry = self.archive.open(BUNDLE_ENTRY)
+        except KeyError:
+            raise BundleError(f'Bundle has no {BUNDLE_ENTRY}')
+        with transaction.atomic():
+            for number, line in enumerate(io.TextIOWrapper(entry, encoding='utf-8'), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise BundleError(f'Line {number} is not valid JSON')
+                try:
+                    self.add(record, number)
+                except (KeyError, TypeError, ValueError) as e:
+                    raise BundleError(f'Line {number} is malformed: {e!r}')
+            # Parents first, so the last quizzes and questions are written even without children
+            for kind in ('quiz', 'question', 'answer', 'description'):
+                self.flush(kind)
+            for quiz_id, (count, points) in self.totals.items():
+                Quiz.objects.filter(id=quiz_id).update(
+                    question_count=count, quiz_maximum_points=points,
+                    version=F('version') + 1, updated_at=timezone.now(),
+                )
+            transaction.on_commit(bump_catalog_version)
+        return self.counts
+
+    def add(self, record, number):
+        kind = record.get('type')
+        if kind not in self.pending:
+            raise BundleError(f'Line {number} has unknown record type {kind!r}')
+        if kind == 'quiz':
+            self.pending['quiz'].append((record['id'], Quiz(
+                quiz_name=record['quiz_name'],
+                description=record.get('description') or '',
+                creator=self.creator,
+            )))
+        elif kind == 'question':
+            self.require('quiz', record['quiz'], self.quiz_ids, number)
+            self.pending['question'].append((record['id'], Question(
+                quiz_id=self.quiz_ids[record['quiz']],
+                description=record['description'],
+                points_for_question=int(record['points']),
+                image=self.extract_image(record.get('image')),
+            )))
+        elif kind == 'answer':
+            self.require('question', record['question'], self.question_ids, number)
+            self.pending['answer'].append((None, Answer(
+                question_id=self.question_ids[record['question']],
+                answer=record['answer'],
+                correct=bool(record.get('correct')),
+            )))
+        else:
+            self.require('question', record['question'], self.question_ids, number)
+            self.pending['description'].append((None, Description(
+                question_id=self.question_ids[record['question']],
+                text=record.get('text') or '',
+                image=self.extract_image(record.get('image')),
+            )))
+        if len(self.pending[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def require(self, parent, old_id, id_map, number):
+        if old_id not in id_map:
+            self.flush('quiz')
+            if parent == 'question':
+                self.flush('question')
+        if old_id not in id_map:
+            raise BundleError(f'Line {number} refers to unknown {parent} {old_id}')
+
+    def flush(self, kind):
+        batch = self.pending[kind]
+        if not batch:
+            return
+        self.pending[kind] = []
+        model = batch[0][1].__class__
+        created = model.objects.bulk_create([obj for _, obj in batch])
+        self.counts[kind] += len(created)
+        if kind == 'quiz':
+            self.quiz_ids.update((old_id, obj.pk) for (old_id, _), obj in zip(batch, created))
+        elif kind == 'question':
+            self.question_ids.update((old_id, obj.pk) for (old_id, _), obj in zip(batch, created))
+            for obj in created:
+                count, points = self.totals.get(obj.quiz_id, (0, 0))
+                self.totals[obj.quiz_id] = (count + 1, points + obj.points_for_question)
+
+    def extract_image(self, name):
+        if not name:
+            return None
+        try:
+            member = self.archive.open(MEDIA_PREFIX + name)
+        except KeyError:
+            return None
+        with member:
+            return default_storage.save(name, File(member, name=os.path.basename(name)))
+
+
+def import_bundle(fileobj, creator, batch_size=BATCH_SIZE):
+    """Import a bundle zip (path or file object) for `creator`; returns created row counts."""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise BundleError('Not a zip file')
+    with archive:
+        return BundleImporter(archive, creator, batch_size).run()
@@ -0,0 +1,165 @@
+"""
+Shared cache helpers on top of the `default` cache backend.
+
+Keys are versioned: catalog-wide pages use a catalog version that is bumped whenever a
+quiz is created, changed or deleted, per-quiz data embeds Quiz.version, and per-user data
+embeds a user version bumped on every new attempt. Quiz.touch() also bumps a per-quiz page
+version kept in the cache, for lookups that must not hit the database (see pagecache.py).
+Nothing is deleted on change; old keys simply stop being read and expire.
+
+get_or_compute() lets a single worker rebuild an expired entry while the others keep
+serving the stale copy (or wait briefly when there is none), so a popular page expiring
+does not make every worker run the same queries at once. The rebuild lock is a cache.add(),
+which Redis and Memcached perform atomically; FileBasedCache reads and then writes the
+file, so with it the lock is an flock() on one of LOCK_STRIPES files next to the cache
+instead (released by the kernel if the worker dies).
+"""
+
+import hashlib
+import os
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: cache.add() only
+    fcntl = None
+
+from . import metrics
+
+
+DEFAULT_TIMEOUT = 300
+STALE_GRACE = 60  # how long an expired entry may still be served while it is rebuilt
+LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+WAIT_LIMIT = 2.0
+LOCK_STRIPES = 1024
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, None)
+        return cache.get(key, 2)
+
+
+def catalog_version():
+    return _version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return _bump(CATALOG_VERSION_KEY)
+
+
+def user_version(user_id):
+    return _version(f'user:{user_id}:version')
+
+
+def bump_user_version(user_id):
+    return _bump(f'user:{user_id}:version')
+
+
+def quiz_page_version(quiz_id):
+    return _version(f'quiz:{quiz_id}:page-version')
+
+
+def bump_quiz_page_version(quiz_id):
+    return _bump(f'quiz:{quiz_id}:page-version')
+
+
+def attempt_version(quiz_id, user_id):
+    return _version(f'attempt:{quiz_id}:{user_id}:version')
+
+
+def bump_attempt_version(quiz_id, user_id):
+    return _bump(f'attempt:{quiz_id}:{user_id}:version')
+
+
+def catalog_key(name):
+    return f'catalog:v{catalog_version()}:{name}'
+
+
+def quiz_key(quiz, name):
+    return f'quiz:{quiz.id}:v{quiz.version}:{name}'
+
+
+def user_key(user_id, name):
+    return f'user:{user_id}:v{user_version(user_id)}:{name}'
+
+
+def _file_lock(lock_key, directory):
+    os.makedirs(directory, exist_ok=True)
+    stripe = int(hashlib.md5(lock_key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    fd = os.open(os.path.join(directory, f'{stripe}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+    def release():
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    return release
+
+
+def _try_lock(lock_key):
+    """A function releasing the rebuild lock for `lock_key` if it was free, else None."""
+    backend = caches['default']  # `cache` is a proxy, so isinstance() needs the backend itself
+    if fcntl is not None and isinstance(backend, FileBasedCache):
+        return _file_lock(lock_key, os.path.join(backend._dir, 'locks'))
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        return lambda: cache.delete(lock_key)
+    return None
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, name='default'):
+    """
+    Return the cached value for `key`, calling `compute()` to build it when missing or expired.
+    Only one caller at a time rebuilds a given key.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            metrics.record_cache_lookup(name, True)
+            return value
+        # Expired: one caller refreshes, everyone else keeps serving the stale value
+        release = _try_lock(f'{key}:lock')
+        if release is None:
+            metrics.record_cache_lookup(name, True)
+            return value
+    else:
+        release = _try_lock(f'{key}:lock')
+        if release is None:
+            # Someone else is building it; wait for their result instead of duplicating the work
+            deadline = time.monotonic() + WAIT_LIMIT
+            while time.monotonic() < deadline:
+                time.sleep(WAIT_INTERVAL)
+                entry = cache.get(key)
+                if entry is not None:
+                    metrics.record_cache_lookup(name, True)
+                    return entry[0]
+            metrics.record_cache_lookup(name, False)
+            return compute()
+
+    metrics.record_cache_lookup(name, False)
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout + STALE_GRACE)
+        return value
+    finally:
+        release()
@@ -0,0 +1,100 @@
+"""
+ETag / Last-Modified callables for django.views.decorators.http.condition.
+
+Values come from Quiz.version and Quiz.updated_at, so an unchanged page is answered
+with 304 Not Modified after one indexed lookup and without rendering any template.
+"""
+
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, Max
+
+from .caching import attempt_version
+from .models import Quiz, Results
+
+
+def _variant(request):
+    """
+    Part of the ETag that depends on who is asking: anonymous and logged-in pages differ,
+    and pages embed the CSRF token.
+    """
+    user_id = request.user.pk if request.user.is_authenticated else 'anon'
+    csrf = request.META.get('CSRF_COOKIE', '')
+    return f'{user_id}:{csrf}'
+
+
+def _has_messages(request):
+    # Pending flash messages are rendered into the page, so it must be sent in full
+    return bool(len(messages.get_messages(request)))
+
+
+def _etag(request, *parts):
+    if _has_messages(request):
+        return None
+    raw = ':'.join(str(part) for part in parts + (_variant(request),))
+    return 'W/"{}"'.format(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+
+def _quiz_marker(request, quiz_id):
+    markers = request.__dict__.setdefault('_quiz_markers', {})
+    if quiz_id not in markers:
+        markers[quiz_id] = Quiz.objects.filter(id=quiz_id).values_list('version', 'updated_at').first()
+    return markers[quiz_id]
+
+
+def _catalog_marker(request):
+    if not hasattr(request, '_catalog_marker'):
+        request._catalog_marker = Quiz.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return request._catalog_marker
+
+
+def quiz_etag(request, pk=None, quiz_id=None, *args, **kwargs):
+    marker = _quiz_marker(request, pk or quiz_id)
+    if marker is None:
+        return None
+    return _etag(request, 'quiz', pk or quiz_id, marker[0], marker[1].isoformat())
+
+
+def take_etag(request, quiz_id, *args, **kwargs):
+    # The take form is pre-filled with autosaved answers, which change without the quiz changing
+    marker = _quiz_marker(request, quiz_id)
+    if marker is None:
+        return None
+    saved = attempt_version(quiz_id, request.user.pk) if request.user.is_authenticated else 0
+    return _etag(request, 'take', quiz_id, marker[0], marker[1].isoformat(), saved)
+
+
+def quiz_last_modified(request, pk=None, quiz_id=None, *args, **kwargs):
+    marker = _quiz_marker(request, pk or quiz_id)
+    if marker is None or _has_messages(request):
+        return None
+    return marker[1]
+
+
+def catalog_etag(request, *args, **kwargs):
+    marker = _catalog_marker(request)
+    updated = marker['updated'].isoformat() if marker['updated'] else ''
+    return _etag(request, 'catalog', marker['count'], updated)
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    if _has_messages(request):
+        return None
+    return _catalog_marker(request)['updated']
+
+
+def popular_etag(request, *args, **kwargs):
+    # The ranking moves with every attempt; the newest result id is a primary-key lookup
+    marker = _catalog_marker(request)
+    latest_result = Results.objects.order_by('-id').values_list('id', flat=True).first()
+    updated = marker['updated'].isoformat() if marker['updated'] else ''
+    return _etag(request, 'popular', marker['count'], updated, latest_result)
+
+
+def snapshot_etag(request, quiz_id, *args, **kwargs):
+    # Snapshots are immutable, so the current snapshot id identifies the payload exactly
+    snapshot_id = Quiz.objects.filter(id=quiz_id).values_list('current_snapshot_id', flat=True).first()
+    if snapshot_id is None:
+        return None
+    return f'"quiz-{quiz_id}-{snapshot_id}"'
@@ -0,0 +1,74 @@
+"""
+Incrementally maintained "how many people picked each option" counters.
+
+Each answer has up to ANSWER_COUNTER_SHARDS counter rows. A graded attempt bumps one
+randomly chosen shard for every answer it selected, so concurrent submissions rarely
+touch the same row. Per-question totals are the sum over the question's answer rows.
+"""
+
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import AnswerSelectionCounter, QuizResultAnswer
+
+
+def shard_count():
+    return getattr(settings, 'ANSWER_COUNTER_SHARDS', 8)
+
+
+def record_selections(selected):
+    """
+    Count one selection for every (question_id, answer_id) pair of a graded attempt.
+    Call inside the grading transaction.
+    """
+    if not selected:
+        return
+    shard = random.randrange(shard_count())
+    AnswerSelectionCounter.objects.bulk_create(
+        [AnswerSelectionCounter(question_id=question_id, answer_id=answer_id, shard=shard)
+         for question_id, answer_id in selected],
+        ignore_conflicts=True,
+    )
+    AnswerSelectionCounter.objects.filter(
+        answer_id__in=[answer_id for _, answer_id in selected], shard=shard
+    ).update(selections=F('selections') + 1)
+
+
+def answer_distribution(question_ids):
+    """
+    Return {question_id: {'total': n, 'answers': {answer_id: selections}}} read from the
+    counter rows only, independent of how many attempts exist.
+    """
+    distribution = {question_id: {'total': 0, 'answers': {}} for question_id in question_ids}
+    rows = AnswerSelectionCounter.objects.filter(question_id__in=question_ids).values(
+        'question_id', 'answer_id'
+    ).annotate(selections=Sum('selections'))
+    for row in rows:
+        entry = distribution[row['question_id']]
+        entry['answers'][row['answer_id']] = row['selections']
+        entry['total'] += row['selections']
+    return distribution
+
+
+def reconcile_counters(batch_size=1000):
+    """Rebuild all counters from QuizResultAnswer history; returns the number of counter rows."""
+    with transaction.atomic():
+        AnswerSelectionCounter.objects.all().delete()
+        rows = QuizResultAnswer.objects.values('question_id', 'answer_id').annotate(
+            selections=Count('id')
+        ).order_by()
+        created = 0
+        batch = []
+        for row in rows.iterator():
+            batch.append(AnswerSelectionCounter(
+                question_id=row['question_id'], answer_id=row['answer_id'], shard=0,
+                selections=row['selections'],
+            ))
+            if len(batch) >= batch_size:
+                created += len(AnswerSelectionCounter.objects.bulk_create(batch))
+                batch = []
+        created += len(AnswerSelectionCounter.objects.bulk_create(batch))
+    return created
@@ -15,14 +15,6 @@ class QuizForm(forms.ModelForm):
             'description': forms.TextInput(attrs={'class': 'form-control'})
         }
 
-    def save(self, commit=True):
-        """Overrides save to update max points & question count after quiz creation"""
-        quiz = super().save(commit=False)
-        if commit:
-            quiz.save()
-            quiz.calculate_max_values()  
-        return quiz
-
 
 class QuestionForm(forms.ModelForm):
     class Meta:
@@ -39,14 +31,6 @@ class QuestionForm(forms.ModelForm):
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'})
         }
 
-    def save(self, commit=True):
-        """Updates quiz statistics after saving a question"""
-        question = super().save(commit=False)
-        if commit:
-            question.save()
-            question.quiz.calculate_max_values()  
-        return question
-
 class AnswerForm(forms.ModelForm):
     class Meta:
         model = Answer
@@ -0,0 +1,113 @@
+"""
+Per-user results history maintained on every graded attempt.
+
+ResultSummary folds a user's attempts on one quiz into a single row (attempts, total for
+the average, best, last score and when it was taken), updated in the grading transaction.
+The history page lists these rows newest first and the per-quiz page lists the attempts
+themselves; both use keyset pagination on an index (the summary's last result id, or the
+result id), so a page costs one LIMIT query however long the history is.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Greatest
+
+from .models import Results, ResultSummary
+
+
+BATCH_SIZE = 1000
+
+
+def record_attempt(quiz, user, result):
+    """Fold a graded attempt into the user's summary for the quiz; call inside the grading transaction."""
+    changes = {
+        'attempts': F('attempts') + 1,
+        'total_score': F('total_score') + result.result,
+        'best_score': Greatest('best_score', result.result),
+        'last_score': result.result,
+        'last_taken_at': result.created_at,
+        'last_result': result,
+    }
+    summary = ResultSummary.objects.filter(quiz=quiz, user=user)
+    if summary.update(**changes):
+        return
+    # First attempt: insert an empty row (a concurrent first attempt may win) and count into it
+    ResultSummary.objects.bulk_create([ResultSummary(
+        quiz=quiz, user=user, best_score=result.result, last_score=result.result,
+        last_taken_at=result.created_at, last_result=result,
+    )], ignore_conflicts=True)
+    summary.update(**changes)
+
+
+def _page(queryset, key, before, size):
+    """(rows, next `before` value or None) for rows ordered by `key` descending."""
+    if before is not None:
+        queryset = queryset.filter(**{f'{key}__lt': before})
+    rows = list(queryset.order_by(f'-{key}')[:size + 1])
+    if len(rows) > size:
+        return rows[:size], getattr(rows[size - 1], key)
+    return rows, None
+
+
+def summaries(user, before=None, size=20):
+    """
+    One page of the user's per-quiz summaries, most recently taken first: (rows, next_before).
+    Pass next_before back as `before` for the following page.
+    """
+    queryset = ResultSummary.objects.filter(user=user).select_related('quiz').only(
+        'quiz', 'attempts', 'total_score', 'best_score', 'last_score', 'last_taken_at', 'last_result_id',
+        'quiz__quiz_name', 'quiz__quiz_maximum_points',
+    )
+    return _page(queryset, 'last_result_id', before, size)
+
+
+def attempts(user, quiz, before=None, size=20):
+    """One page of the user's attempts on the quiz, newest first: (rows, next_before)."""
+    queryset = Results.objects.filter(user=user.username, quiz=quiz).only('id', 'result', 'created_at')
+    return _page(queryset, 'id', before, size)
+
+
+def rebuild(usernames=None):
+    """Recreate summaries from the Results history; returns the number of rows written."""
+    results = Results.objects.all()
+    users = User.objects.all()
+    existing = ResultSummary.objects.all()
+    if usernames:
+        results = results.filter(user__in=usernames)
+        users = users.filter(username__in=usernames)
+        existing = existing.filter(user__username__in=usernames)
+    user_ids = dict(users.values_list('username', 'id'))
+
+    written = 0
+    with transaction.atomic():
+        existing.delete()
+        totals = results.values('user', 'quiz_id').annotate(
+            attempts=Count('id'), total=Sum('result'), best=Max('result'), last_id=Max('id'),
+        ).order_by()
+        batch = []
+        for row in totals.iterator(chunk_size=BATCH_SIZE):
+            if row['user'] in user_ids:
+                batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                written += _write_summaries(batch, user_ids)
+                batch = []
+        written += _write_summaries(batch, user_ids)
+    return written
+
+
+def _write_summaries(rows, user_ids):
+    last = {
+        result_id: (score, created_at)
+        for result_id, score, created_at in Results.objects.filter(
+            id__in=[row['last_id'] for row in rows]
+        ).values_list('id', 'result', 'created_at')
+    }
+    return len(ResultSummary.objects.bulk_create([
+        ResultSummary(
+            user_id=user_ids[row['user']], quiz_id=row['quiz_id'], attempts=row['attempts'],
+            total_score=row['total'], best_score=row['best'], last_score=last[row['last_id']][0],
+            last_taken_at=last[row['last_id']][1], last_result_id=row['last_id'],
+        )
+        for row in rows
+    ], ignore_conflicts=True))  # rows a concurrent first attempt already created stay as they are
@@ -0,0 +1,96 @@
+"""
+Per-quiz leaderboards maintained on every graded attempt.
+
+LeaderboardEntry holds each player's best score, indexed by (quiz, -best_score, achieved_at),
+so the top N is a LIMIT N index range. LeaderboardScore counts players per distinct score,
+so a player's rank (1 + players with a strictly higher best score) sums at most one row per
+possible score, no matter how many players the quiz has.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from .models import LeaderboardEntry, LeaderboardScore, Results
+
+
+DEFAULT_SIZE = 10
+
+
+def record_score(quiz, user, score, achieved_at):
+    """Update the player's best score; call inside the grading transaction."""
+    # get_or_create() survives a concurrent first attempt of the same player (PostgreSQL lets
+    # both insert), and the row lock keeps two better scores from both moving the counts
+    entry, created = LeaderboardEntry.objects.select_for_update().only('id', 'best_score').get_or_create(
+        quiz=quiz, user=user, defaults={'best_score': score, 'achieved_at': achieved_at},
+    )
+    if created:
+        LeaderboardScore.adjust(quiz.id, score, 1)
+    elif score > entry.best_score:
+        LeaderboardEntry.objects.filter(id=entry.id).update(best_score=score, achieved_at=achieved_at)
+        LeaderboardScore.adjust(quiz.id, entry.best_score, -1)
+        LeaderboardScore.adjust(quiz.id, score, 1)
+
+
+def top(quiz, size=DEFAULT_SIZE):
+    return list(
+        LeaderboardEntry.objects.filter(quiz=quiz)
+        .order_by('-best_score', 'achieved_at')
+        .select_related('user')[:size]
+    )
+
+
+def rank(quiz, user):
+    """Return (rank, best_score, players) for the user, or None if they have not played."""
+    entry = LeaderboardEntry.objects.filter(quiz=quiz, user=user).only('best_score').first()
+    if entry is None:
+        return None
+    scores = LeaderboardScore.objects.filter(quiz=quiz)
+    ahead = scores.filter(score__gt=entry.best_score).aggregate(total=Sum('players'))['total'] or 0
+    players = scores.aggregate(total=Sum('players'))['total'] or 0
+    return ahead + 1, entry.best_score, players
+
+
+def rebuild(quiz_ids=None):
+    """Recreate leaderboards from Results history; returns the number of entries written."""
+    results = Results.objects.all()
+    if quiz_ids:
+        results = results.filter(quiz_id__in=quiz_ids)
+    user_ids = dict(User.objects.values_list('username', 'id'))
+
+    with transaction.atomic():
+        entries = LeaderboardEntry.objects.all()
+        scores = LeaderboardScore.objects.all()
+        if quiz_ids:
+            entries = entries.filter(quiz_id__in=quiz_ids)
+            scores = scores.filter(quiz_id__in=quiz_ids)
+        entries.delete()
+        scores.delete()
+
+        best = results.values('quiz_id', 'user').annotate(best=Max('result')).order_by()
+        first_reached = {
+            (row['quiz_id'], row['user'], row['result']): row['first']
+            for row in results.values('quiz_id', 'user', 'result').annotate(first=Min('created_at')).order_by()
+        }
+        # Attempts made before Results.created_at existed have no timestamp
+        now = timezone.now()
+        batch = []
+        counts = {}
+        for row in best.iterator():
+            user_id = user_ids.get(row['user'])
+            if user_id is None:
+                continue
+            achieved_at = first_reached.get((row['quiz_id'], row['user'], row['best']))
+            batch.append(LeaderboardEntry(
+                quiz_id=row['quiz_id'], user_id=user_id, best_score=row['best'],
+                achieved_at=achieved_at or now,
+            ))
+            counts[(row['quiz_id'], row['best'])] = counts.get((row['quiz_id'], row['best']), 0) + 1
+        LeaderboardEntry.objects.bulk_create(batch, batch_size=1000)
+        LeaderboardScore.objects.bulk_create(
+            [LeaderboardScore(quiz_id=quiz_id, score=score, players=players)
+             for (quiz_id, score), players in counts.items()],
+            batch_size=1000,
+        )
+    return len(batch)
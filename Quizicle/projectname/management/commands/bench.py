@@ -0,0 +1,321 @@
+"""
+Seeded performance benchmark for every view in projectname/urls.py.
+
+Usage:
+    python manage.py bench
+    python manage.py bench --quizzes 500 --results 20000 --iterations 50 --output bench.json
+"""
+
+import json
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from projectname.counters import reconcile_counters
+from projectname.history import rebuild as rebuild_history
+from projectname.leaderboard import rebuild as rebuild_leaderboards
+from projectname.models import (
+    Quiz, Question, Answer, Results, QuizResultAnswer, Report, Description, Comment, UserProfile,
+)
+
+
+BATCH_SIZE = 1000
+BENCH_USERNAME = 'bench_admin'
+
+
+def isolated_caches(directory):
+    """
+    CACHES for a benchmark run, so it neither serves nor wipes the running site's entries:
+    file-based caches move to `directory`, other backends (Redis) become local memory.
+    """
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'django.core.cache.backends.filebased.FileBasedCache':
+            caches[alias] = {**config, 'LOCATION': str(Path(directory) / alias)}
+        else:
+            caches[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'bench-{alias}'}
+    return caches
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[rank]
+
+
+def seed_dataset(users=50, quizzes=100, questions=10, answers=4, results=1000,
+                 comments=500, reports=50, seed=1):
+    """Bulk-insert a repeatable synthetic dataset and return the benchmark superuser."""
+    rng = random.Random(seed)
+    password = make_password('bench-password')
+
+    admin = User.objects.create_superuser(BENCH_USERNAME, password='bench-password')
+    User.objects.bulk_create(
+        [User(username=f'bench_user_{i}', password=password) for i in range(users)],
+        batch_size=BATCH_SIZE,
+    )
+    user_list = list(User.objects.exclude(pk=admin.pk).order_by('id'))
+    # bulk_create skips the post_save signal that normally creates profiles
+    UserProfile.objects.bulk_create(
+        [UserProfile(user=user) for user in user_list], batch_size=BATCH_SIZE
+    )
+    creators = [admin] + user_list
+
+    Quiz.objects.bulk_create([
+        Quiz(
+            quiz_name=f'Bench quiz {i}',
+            description=f'Synthetic quiz number {i}',
+            question_count=questions,
+            quiz_maximum_points=questions,
+            creator=admin if i == 0 else rng.choice(creators),
+        )
+        for i in range(quizzes)
+    ], batch_size=BATCH_SIZE)
+    quiz_list = list(Quiz.objects.order_by('id'))
+
+    Question.objects.bulk_create([
+        Question(quiz=quiz, description=f'Question {n} of {quiz.quiz_name}', points_for_question=1)
+        for quiz in quiz_list for n in range(questions)
+    ], batch_size=BATCH_SIZE)
+    question_list = list(Question.objects.order_by('id'))
+
+    Description.objects.bulk_create([
+        Description(question=question, text=f'Explanation for question {question.id}')
+        for question in question_list
+    ], batch_size=BATCH_SIZE)
+
+    Answer.objects.bulk_create([
+        Answer(question=question, answer=f'Option {n}', correct=(n == 0))
+        for question in question_list for n in range(answers)
+    ], batch_size=BATCH_SIZE)
+
+    answers_by_question = {}
+    for answer_id, question_id in Answer.objects.values_list('id', 'question_id').order_by('id'):
+        answers_by_question.setdefault(question_id, []).append(answer_id)
+    questions_by_quiz = {}
+    for question in question_list:
+        questions_by_quiz.setdefault(question.quiz_id, []).append(question.id)
+
+    # Every quiz gets at least one attempt by the benchmark user so result pages resolve
+    takers = [admin.username] * len(quiz_list) + [rng.choice(creators).username for _ in range(results)]
+    result_quizzes = quiz_list + [rng.choice(quiz_list) for _ in range(results)]
+    Results.objects.bulk_create([
+        Results(quiz=quiz, user=username, result=0)
+        for quiz, username in zip(result_quizzes, takers)
+    ], batch_size=BATCH_SIZE)
+
+    result_answers = []
+    for result_id, quiz_id in Results.objects.values_list('id', 'quiz_id').iterator():
+        for question_id in questions_by_quiz.get(quiz_id, []):
+            result_answers.append(QuizResultAnswer(
+                quiz_result_id=result_id,
+                question_id=question_id,
+                answer_id=rng.choice(answers_by_question[question_id]),
+            ))
+        if len(result_answers) >= BATCH_SIZE:
+            QuizResultAnswer.objects.bulk_create(result_answers)
+            result_answers = []
+    QuizResultAnswer.objects.bulk_create(result_answers)
+
+    Comment.objects.bulk_create([
+        Comment(quiz=rng.choice(quiz_list), user=rng.choice(creators), content=f'Comment {i}')
+        for i in range(comments)
+    ], batch_size=BATCH_SIZE)
+    Report.objects.bulk_create([
+        Report(quiz=rng.choice(quiz_list), user=rng.choice(creators), description=f'Report {i}')
+        for i in range(reports)
+    ], batch_size=BATCH_SIZE)
+
+    # The bulk inserts above bypass the per-attempt updates of these tables
+    reconcile_counters()
+    rebuild_leaderboards()
+    rebuild_history()
+    return admin
+
+
+def iter_patterns(patterns, prefix=''):
+    """Yield (route, name) for every named pattern, skipping included URLconfs such as admin."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            continue
+        if isinstance(pattern, URLPattern) and pattern.name:
+            yield prefix + str(pattern.pattern), pattern.name
+
+
+class SqlTimer:
+    """connection.execute_wrapper hook counting queries and SQL time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextmanager
+def timed_connections(timer):
+    """Install the timer on every connection, so session and read-only queries are counted too."""
+    with ExitStack() as stack:
+        # Test mirrors may share a connection object with their mirrored alias
+        for conn in {id(conn): conn for conn in connections.all()}.values():
+            stack.enter_context(conn.execute_wrapper(timer))
+        yield
+
+
+def fetch(client, path):
+    """GET path, generating the whole body of streaming responses (CSV export, bundles)."""
+    response = client.get(path)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and benchmark every view in projectname/urls.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--quizzes', type=int, default=100)
+        parser.add_argument('--questions', type=int, default=10, help='Questions per quiz')
+        parser.add_argument('--answers', type=int, default=4, help='Answers per question')
+        parser.add_argument('--results', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=500)
+        parser.add_argument('--reports', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per view')
+        parser.add_argument('--view', action='append', dest='views', help='Only run these URL names')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        # Cached pages from the real database would otherwise be served for the synthetic one
+        with tempfile.TemporaryDirectory() as tmp, override_settings(CACHES=isolated_caches(tmp)):
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+            try:
+                report = self.run_benchmark(options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Benchmark written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def run_benchmark(self, options):
+        seed_started = time.perf_counter()
+        admin = seed_dataset(
+            users=options['users'], quizzes=options['quizzes'], questions=options['questions'],
+            answers=options['answers'], results=options['results'], comments=options['comments'],
+            reports=options['reports'], seed=options['seed'],
+        )
+        seed_seconds = time.perf_counter() - seed_started
+
+        # Errors are reported through the status code instead of aborting the whole run
+        client = Client(raise_request_exception=False)
+        client.force_login(admin)
+        url_kwargs = self.url_kwargs(admin)
+
+        views = {}
+        for route, name in iter_patterns(get_resolver().url_patterns):
+            if options['views'] and name not in options['views']:
+                continue
+            path = self.build_path(route, url_kwargs)
+            if path is None:
+                continue
+            views[f'{name} {path}'] = self.measure(client, path, options['iterations'])
+
+        return {
+            'dataset': {key: options[key] for key in (
+                'users', 'quizzes', 'questions', 'answers', 'results', 'comments', 'reports', 'seed'
+            )},
+            'seed_seconds': round(seed_seconds, 4),
+            'iterations': options['iterations'],
+            'views': views,
+        }
+
+    def url_kwargs(self, admin):
+        quiz = Quiz.objects.filter(creator=admin).first() or Quiz.objects.first()
+        report = Report.objects.first()
+        comment = Comment.objects.first()
+        return {
+            'quiz_id': quiz.id if quiz else 1,
+            'pk': quiz.id if quiz else 1,
+            'score': 0,
+            'report_pk': report.id if report else 1,
+            'comment_pk': comment.id if comment else 1,
+        }
+
+    def build_path(self, route, url_kwargs):
+        """Turn a route like 'quiz/<int:pk>/' into a concrete path from the seeded data."""
+        path = route
+        if 'report/<int:pk>' in path:
+            path = path.replace('<int:pk>', str(url_kwargs['report_pk']))
+        if 'comment/delete/<int:pk>' in path:
+            path = path.replace('<int:pk>', str(url_kwargs['comment_pk']))
+        for key in ('pk', 'quiz_id', 'score'):
+            path = path.replace(f'<int:{key}>', str(url_kwargs[key]))
+        if '<' in path:
+            return None
+        return '/' + path
+
+    def measure(self, client, path, iterations):
+        timer = SqlTimer()
+
+        # Warm-up request doubles as the peak-memory probe so tracemalloc does not skew latency
+        tracemalloc.start()
+        with timed_connections(timer):
+            response = fetch(client, path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timer = SqlTimer()
+        latencies = []
+        with timed_connections(timer):
+            for _ in range(iterations):
+                started = time.perf_counter()
+                fetch(client, path)
+                latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        runs = max(iterations, 1)
+
+        return {
+            'status': response.status_code,
+            'queries': timer.queries / runs,
+            'sql_ms': round(timer.seconds * 1000 / runs, 3),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p90': round(percentile(latencies, 90), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(latencies[-1], 3) if latencies else 0.0,
+            },
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
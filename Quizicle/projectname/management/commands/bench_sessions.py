@@ -0,0 +1,178 @@
+"""
+Write-lock contention benchmark for session storage.
+
+Threads keep reading and updating sessions while others submit quiz results, once with
+sessions in the main database ("before") and once with the configured SESSION_ENGINE and
+SESSION_DB_ALIAS ("after"). Both runs use throwaway SQLite files so locking is real.
+
+Usage:
+    python manage.py bench_sessions
+    python manage.py bench_sessions --seconds 10 --session-threads 8 --submit-threads 4
+"""
+
+import json
+import logging
+import tempfile
+import threading
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from projectname.management.commands.bench import isolated_caches, percentile, seed_dataset
+from projectname.models import Quiz, Results
+from projectname.routers import session_alias
+
+
+class Command(BaseCommand):
+    help = 'Measure quiz-submission latency under session traffic, before and after moving sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--sessions', type=int, default=200, help='Sessions to create')
+        parser.add_argument('--session-threads', type=int, default=4)
+        parser.add_argument('--submit-threads', type=int, default=2)
+        parser.add_argument('--modify-every', type=int, default=5, help='Save every Nth session read')
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help='Milliseconds between session requests per thread, so both runs see the same load')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        aliases = {'default', session_alias()}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(CACHES=isolated_caches(tmp)):
+            # In-memory test databases would not show file locking
+            for alias in aliases:
+                connections[alias].settings_dict['TEST']['NAME'] = str(Path(tmp) / f'{alias}.sqlite3')
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False, aliases=aliases, serialized_aliases=set())
+            try:
+                report = self.run_benchmark(options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Benchmark written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def run_benchmark(self, options):
+        admin = seed_dataset(users=10, quizzes=10, questions=5, results=100, comments=10, reports=0)
+        quiz_ids = list(Quiz.objects.values_list('id', flat=True))
+        if 'default' != session_alias():
+            # The router keeps the sessions table out of the main database; "before" needs it there
+            with connection.schema_editor() as editor:
+                editor.create_model(Session)
+
+        report = {'options': {key: options[key] for key in (
+            'seconds', 'sessions', 'session_threads', 'submit_threads', 'modify_every', 'interval',
+        )}}
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SESSION_DB_ALIAS='default'):
+            report['before'] = self.run_scenario(options, admin, quiz_ids)
+        report['after'] = self.run_scenario(options, admin, quiz_ids)
+        return report
+
+    def run_scenario(self, options, admin, quiz_ids):
+        engine = import_module(settings.SESSION_ENGINE)
+        keys = []
+        for i in range(options['sessions']):
+            store = engine.SessionStore()
+            store['_auth_user_id'] = str(admin.pk)
+            store['visits'] = 0
+            store.save()
+            keys.append(store.session_key)
+
+        stop = threading.Event()
+        latencies = []
+        session_latencies = []
+        stats = {'session_reads': 0, 'session_writes': 0, 'session_errors': 0, 'submit_errors': 0}
+        lock = threading.Lock()
+
+        def sessions_worker(offset):
+            reads = writes = errors = 0
+            samples = []
+            i = offset
+            next_at = time.perf_counter()
+            while not stop.is_set():
+                started = time.perf_counter()
+                store = engine.SessionStore(keys[i % len(keys)])
+                try:
+                    visits = store.get('visits', 0)
+                    reads += 1
+                    if i % options['modify_every'] == 0:
+                        store['visits'] = visits + 1
+                        store.save()
+                        writes += 1
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+                i += 1
+                # Fixed schedule: a slow request does not lower the offered load
+                next_at += options['interval'] / 1000
+                stop.wait(max(0.0, next_at - time.perf_counter()))
+            connections.close_all()
+            with lock:
+                session_latencies.extend(samples)
+                stats['session_reads'] += reads
+                stats['session_writes'] += writes
+                stats['session_errors'] += errors
+
+        def submit_worker(offset):
+            samples = []
+            errors = 0
+            i = offset
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        Results.objects.create(
+                            quiz_id=quiz_ids[i % len(quiz_ids)], user=admin.username, result=i % 10,
+                        )
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+                i += 1
+            connections.close_all()
+            with lock:
+                latencies.extend(samples)
+                stats['submit_errors'] += errors
+
+        threads = [threading.Thread(target=sessions_worker, args=(n,)) for n in range(options['session_threads'])]
+        threads += [threading.Thread(target=submit_worker, args=(n,)) for n in range(options['submit_threads'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        session_latencies.sort()
+        return {
+            'session_engine': settings.SESSION_ENGINE,
+            'session_database': session_alias(),
+            'submissions': len(latencies),
+            'submissions_per_second': round(len(latencies) / options['seconds'], 1),
+            'submit_ms': {
+                'p50': round(percentile(latencies, 50) * 1000, 3),
+                'p90': round(percentile(latencies, 90) * 1000, 3),
+                'p99': round(percentile(latencies, 99) * 1000, 3),
+                'max': round((latencies[-1] if latencies else 0) * 1000, 3),
+            },
+            'session_ms': {
+                'p50': round(percentile(session_latencies, 50) * 1000, 3),
+                'p99': round(percentile(session_latencies, 99) * 1000, 3),
+            },
+            **stats,
+        }
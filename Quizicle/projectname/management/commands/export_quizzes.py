@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projectname.bundles import write_bundle
+from projectname.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Export quizzes with their questions, answers, descriptions and images as a bundle zip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Bundle zip to write')
+        parser.add_argument('--creator', help='Only export quizzes created by this username')
+        parser.add_argument('--quiz', type=int, action='append', dest='quiz_ids', help='Quiz id (repeatable)')
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options['creator']:
+            quizzes = quizzes.filter(creator__username=options['creator'])
+        if options['quiz_ids']:
+            quizzes = quizzes.filter(id__in=options['quiz_ids'])
+        if not quizzes.exists():
+            raise CommandError('No quizzes match the given filters')
+
+        with open(options['path'], 'wb') as fh:
+            write_bundle(quizzes, fh)
+        self.stdout.write(self.style.SUCCESS(f"Exported {quizzes.count()} quizzes to {options['path']}"))
@@ -0,0 +1,32 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from projectname.bundles import BATCH_SIZE, BundleError, import_bundle
+
+
+class Command(BaseCommand):
+    help = 'Import a quiz bundle zip created by export_quizzes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Bundle zip to read')
+        parser.add_argument('--creator', required=True, help='Username that will own the imported quizzes')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            creator = User.objects.get(username=options['creator'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['creator']!r} does not exist")
+
+        started = time.perf_counter()
+        try:
+            counts = import_bundle(options['path'], creator, batch_size=options['batch_size'])
+        except (BundleError, OSError) as e:
+            raise CommandError(f'Import failed: {e}')
+
+        summary = ', '.join(f'{kind}: {count}' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {summary} in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,159 @@
+"""
+Copy an existing SQLite database into PostgreSQL.
+
+Rows are streamed table by table with fetchmany() and written with executemany() in
+batches of --batch-size, so memory use does not grow with the size of the database. No
+models are instantiated: timestamps keep their values (auto_now fields are not touched)
+and no signals are sent. Everything is copied in one transaction; PostgreSQL checks the
+foreign keys, which Django creates DEFERRABLE INITIALLY DEFERRED, at the commit, so the
+table order and reference cycles (Quiz.current_snapshot) do not matter.
+
+The target must be migrated to the same migrations as the SQLite file. Its tables are
+emptied first (migrate fills content types and permissions), and the id sequences are
+reset to the copied rows afterwards.
+
+Usage:
+    DB_ENGINE=postgres python manage.py migrate
+    DB_ENGINE=postgres python manage.py migrate_to_postgres db_data/db.sqlite3 --sessions db_data/sessions.sqlite3
+"""
+
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+
+SOURCE_ALIAS = 'sqlite_source'
+SESSIONS_SOURCE_ALIAS = 'sqlite_sessions_source'
+
+
+def _add_sqlite_alias(alias, path):
+    # configure_settings() fills in the defaults but insists on a 'default' entry
+    connections.settings[alias] = connections.configure_settings({
+        DEFAULT_DB_ALIAS: {},
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'file:{path}?mode=ro'},
+    })[alias]
+
+
+def _remove_alias(alias):
+    if alias in connections.settings:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+class Command(BaseCommand):
+    help = 'Stream a SQLite database into the PostgreSQL database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='SQLite database file to copy')
+        parser.add_argument('--sessions', help='SQLite sessions file to copy the django_session table from')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='PostgreSQL database alias to fill')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask before emptying the target database')
+
+    def handle(self, *args, **options):
+        target = connections[options['database']]
+        if target.vendor != 'postgresql':
+            raise CommandError(f'The "{target.alias}" database is {target.vendor}; set DB_ENGINE=postgres')
+
+        _add_sqlite_alias(SOURCE_ALIAS, options['path'])
+        if options['sessions']:
+            _add_sqlite_alias(SESSIONS_SOURCE_ALIAS, options['sessions'])
+        try:
+            self.copy(target, options)
+        finally:
+            _remove_alias(SOURCE_ALIAS)
+            _remove_alias(SESSIONS_SOURCE_ALIAS)
+
+    def copy(self, target, options):
+        source = connections[SOURCE_ALIAS]
+        recorder = MigrationRecorder(target)
+        if set(MigrationRecorder(source).applied_migrations()) != set(recorder.applied_migrations()):
+            raise CommandError(
+                'The SQLite file and the target are not at the same migrations; '
+                'run migrate on both with this release first'
+            )
+
+        plan = self.plan(source, target, bool(options['sessions']))
+        if options['interactive']:
+            answer = input(
+                f'This replaces everything in the "{target.alias}" database '
+                f'({target.settings_dict["NAME"]}). Type "yes" to continue: '
+            )
+            if answer != 'yes':
+                raise CommandError('Cancelled')
+
+        started = time.perf_counter()
+        copied = {}
+        with transaction.atomic(using=target.alias):
+            tables = [model._meta.db_table for model, _ in plan]
+            with target.cursor() as cursor:
+                for sql in target.ops.sql_flush(no_style(), tables, allow_cascade=True):
+                    cursor.execute(sql)
+            for model, alias in plan:
+                copied[model._meta.db_table] = self.copy_table(model, connections[alias], target, options['batch_size'])
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), [model for model, _ in plan]):
+                    cursor.execute(sql)
+
+        elapsed = time.perf_counter() - started
+        for table, rows in copied.items():
+            self.stdout.write(f'{table}: {rows}')
+        total = sum(copied.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {total} rows from {len(copied)} tables in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
+
+    def plan(self, source, target, separate_sessions):
+        """[(model, source alias)] for every table that exists in both databases."""
+        source_tables = set(source.introspection.table_names())
+        target_tables = set(target.introspection.table_names())
+        plan = []
+        for model in apps.get_models(include_auto_created=True):
+            if not model._meta.managed or model._meta.proxy:
+                continue
+            table = model._meta.db_table
+            if table == MigrationRecorder.Migration._meta.db_table:
+                continue
+            alias = SOURCE_ALIAS
+            if separate_sessions and model._meta.label == 'sessions.Session':
+                alias = SESSIONS_SOURCE_ALIAS
+                if table not in connections[alias].introspection.table_names():
+                    raise CommandError(f'{table} not found in {connections[alias].settings_dict["NAME"]}')
+            elif table not in source_tables:
+                self.stderr.write(f'Skipping {table}: not in the SQLite file')
+                continue
+            if table not in target_tables:
+                raise CommandError(f'{table} does not exist in the target; run migrate first')
+            plan.append((model, alias))
+        return plan
+
+    def copy_table(self, model, source, target, batch_size):
+        fields = model._meta.concrete_fields
+        # Read through the ORM so values come back as Python objects (JSON, datetimes, booleans)
+        query = model._base_manager.using(source.alias).order_by('pk').values_list(*(f.attname for f in fields))
+        qn = target.ops.quote_name
+        insert = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            qn(model._meta.db_table),
+            ', '.join(qn(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+
+        rows = 0
+        batch = []
+        with target.cursor() as cursor:
+            for values in query.iterator(chunk_size=batch_size):
+                batch.append([field.get_db_prep_save(value, target) for field, value in zip(fields, values)])
+                if len(batch) >= batch_size:
+                    cursor.executemany(insert, batch)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(insert, batch)
+                rows += len(batch)
+        return rows
@@ -0,0 +1,39 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from projectname.routers import session_alias
+
+
+class Command(BaseCommand):
+    help = 'Copy unexpired sessions from the main database into the sessions database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Empty the old session table afterwards')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        target = session_alias()
+        if target == 'default':
+            raise CommandError('SESSION_DB_ALIAS is "default"; sessions already live in the main database')
+        if Session._meta.db_table not in connections['default'].introspection.table_names():
+            self.stdout.write('No session table in the main database, nothing to move')
+            return
+
+        # Sessions already in the target (e.g. from an earlier run) are left as they are
+        old = Session.objects.using('default').filter(expire_date__gt=timezone.now()).order_by('session_key')
+        moved = 0
+        batch = []
+        for session in old.iterator(chunk_size=options['batch_size']):
+            batch.append(session)
+            if len(batch) >= options['batch_size']:
+                Session.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+                moved += len(batch)
+                batch = []
+        Session.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+        moved += len(batch)
+
+        if options['delete']:
+            Session.objects.using('default').all().delete()
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} sessions to the "{target}" database'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from projectname.leaderboard import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild quiz leaderboards from the Results history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', dest='quiz_ids', help='Quiz id (repeatable)')
+
+    def handle(self, *args, **options):
+        written = rebuild(options['quiz_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboards with {written} entries'))
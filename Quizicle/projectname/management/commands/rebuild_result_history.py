@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from projectname.caching import bump_user_version
+from projectname.history import rebuild
+from projectname.models import ResultSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-quiz results history summaries from the Results history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help='Username (repeatable)')
+
+    def handle(self, *args, **options):
+        written = rebuild(options['usernames'])
+        # Cached history pages embed the user version
+        summaries = ResultSummary.objects.all()
+        if options['usernames']:
+            summaries = summaries.filter(user__username__in=options['usernames'])
+        for user_id in summaries.values_list('user_id', flat=True).distinct():
+            bump_user_version(user_id)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt results history with {written} summaries'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from projectname.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the answer selection counters from the QuizResultAnswer history'
+
+    def handle(self, *args, **options):
+        created = reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} answer counter rows'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from projectname.caching import bump_catalog_version
+from projectname.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Recount question_count and quiz_maximum_points of every quiz from its questions'
+
+    def handle(self, *args, **options):
+        fixed = Quiz.recount_totals()
+        for quiz_id in fixed:
+            Quiz(pk=quiz_id).touch(catalog=False)
+        if fixed:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Fixed the totals of {len(fixed)} quizzes'))
@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from projectname.backups import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Copy the main database to READ_ONLY_DATABASE, the file behind the read-only alias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep refreshing every N seconds instead of once')
+
+    def handle(self, *args, **options):
+        target = getattr(settings, 'READ_ONLY_DATABASE', None)
+        if not target:
+            raise CommandError('READ_ONLY_DATABASE is not set')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Read snapshots are SQLite files; the main database is not SQLite')
+        source = str(connections['default'].settings_dict['NAME'])
+        if os.path.abspath(source) == os.path.abspath(str(target)):
+            raise CommandError('READ_ONLY_DATABASE is the main database itself; there is no snapshot to refresh')
+
+        while True:
+            started = time.perf_counter()
+            tmp = f'{target}.refreshing'
+            snapshot(source, tmp)
+            # Readers that already opened the old file keep reading it until they reconnect
+            os.replace(tmp, target)
+            self.stdout.write(f'Refreshed {target} in {(time.perf_counter() - started) * 1000:.1f} ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,159 @@
+"""
+Concurrent stress test for quiz submissions under database lock contention.
+
+Many threads submit graded attempts through attempts.submit_attempt() at once, first with
+plain DEFERRED transactions and no retries ("before"), then through
+retries.write_transaction() ("after"). With SQLite both runs use a throwaway file so
+locking is real, and a short busy timeout makes lock errors frequent; with PostgreSQL
+(DB_ENGINE=postgres) they run in the test database. The threads share one interpreter, so
+submissions_per_second shows lock waits rather than how far separate worker processes
+scale. The command exits with an error if any submission of the "after" run was lost or
+any result row is missing.
+
+Usage:
+    python manage.py stress_writes
+    python manage.py stress_writes --threads 16 --submissions 50 --busy-timeout 0.02
+    DB_ENGINE=postgres python manage.py stress_writes --threads 8
+"""
+
+import json
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from projectname import attempts, metrics
+from projectname.management.commands.bench import isolated_caches, percentile, seed_dataset
+from projectname.models import Quiz, Results
+from projectname.snapshots import get_snapshot
+
+
+def _plain_transaction(func, name, using='default', deadline=None):
+    with transaction.atomic(using=using):
+        return func()
+
+
+def _metric_total(name):
+    return sum(value for (sample, _), value in metrics.registry.collect().items() if sample == name)
+
+
+class Command(BaseCommand):
+    help = 'Stress concurrent quiz submissions and report lost attempts, retries, lock waits and throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent submitters')
+        parser.add_argument('--submissions', type=int, default=30, help='Submissions per thread')
+        parser.add_argument('--busy-timeout', type=float, default=0.05,
+                            help='SQLite busy timeout in seconds; short values provoke lock errors (SQLite only)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        sqlite = connection.vendor == 'sqlite'
+        pool = connection.settings_dict['OPTIONS'].get('pool')
+        if isinstance(pool, dict):
+            # Every thread stands for a worker process with a pool of its own
+            pool['max_size'] = max(pool.get('max_size', 4), options['threads'])
+        with tempfile.TemporaryDirectory() as tmp, override_settings(CACHES=isolated_caches(tmp)):
+            if sqlite:
+                # In-memory test databases would not show file locking
+                connection.settings_dict['TEST']['NAME'] = str(Path(tmp) / 'stress.sqlite3')
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+            try:
+                seed_dataset(users=options['threads'], quizzes=5, questions=5, results=0, comments=0, reports=0)
+                if sqlite:
+                    connection.settings_dict['OPTIONS']['timeout'] = options['busy_timeout']
+                connections.close_all()
+                with mock.patch.object(attempts, 'write_transaction', _plain_transaction):
+                    before = self.run_scenario(options)
+                after = self.run_scenario(options)
+            finally:
+                connection.settings_dict['OPTIONS'].pop('timeout', None)
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        report = {
+            'vendor': connection.vendor,
+            'options': {key: options[key] for key in ('threads', 'submissions', 'busy_timeout')},
+            'before': before,
+            'after': after,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Stress report written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+        if after['lost'] or after['missing_rows']:
+            raise CommandError(f"{after['lost']} submissions lost, {after['missing_rows']} result rows missing")
+
+    def run_scenario(self, options):
+        quizzes = list(Quiz.objects.select_related('current_snapshot'))
+        snapshots = {quiz.id: get_snapshot(quiz) for quiz in quizzes}
+        users = list(User.objects.filter(username__startswith='bench_user_').order_by('id'))
+        rows_before = Results.objects.count()
+        retries_before = _metric_total('quizicle_db_write_retries_total')
+        wait_before = _metric_total('quizicle_db_lock_wait_seconds_sum')
+
+        latencies = []
+        stats = {'submitted': 0, 'lost': 0}
+        lock = threading.Lock()
+        start_line = threading.Barrier(options['threads'])
+
+        def worker(user):
+            rng = random.Random(user.id)
+            samples = []
+            submitted = lost = 0
+            start_line.wait()
+            for _ in range(options['submissions']):
+                quiz = rng.choice(quizzes)
+                snapshot = snapshots[quiz.id]
+                chosen = {
+                    question['id']: rng.choice(question['answers'])['id']
+                    for question in snapshot.data['questions']
+                }
+                started = time.perf_counter()
+                try:
+                    attempts.submit_attempt(quiz, user, snapshot, chosen)
+                    submitted += 1
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    lost += 1
+            connections.close_all()
+            with lock:
+                latencies.extend(samples)
+                stats['submitted'] += submitted
+                stats['lost'] += lost
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users[:options['threads']]]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            **stats,
+            'missing_rows': stats['submitted'] - (Results.objects.count() - rows_before),
+            'retries': int(_metric_total('quizicle_db_write_retries_total') - retries_before),
+            'lock_wait_seconds': round(_metric_total('quizicle_db_lock_wait_seconds_sum') - wait_before, 3),
+            'submissions_per_second': round(stats['submitted'] / elapsed, 1),
+            'submit_ms': {
+                'p50': round(percentile(latencies, 50) * 1000, 3),
+                'p99': round(percentile(latencies, 99) * 1000, 3),
+                'max': round((latencies[-1] if latencies else 0) * 1000, 3),
+            },
+        }
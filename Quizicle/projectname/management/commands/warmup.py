@@ -0,0 +1,16 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from projectname.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = 'Import views, compile templates and fill the shared cache; prints phase timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quizzes', type=int, default=None, help='Number of top quizzes to cache')
+
+    def handle(self, *args, **options):
+        report = warm_up(options['quizzes'])
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,251 @@
+"""
+In-process metrics registry exposed in Prometheus text format.
+
+Counters and fixed-bucket histograms are kept per worker. When METRICS_DIR is set
+every worker writes its samples to its own mmap-backed file in that directory and
+the /metrics/ endpoint sums all files, so numbers are correct across Gunicorn workers.
+Without METRICS_DIR samples only live in the memory of the current process.
+"""
+
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+
+_HEADER = struct.Struct('i4x')  # bytes in use, padded to 8
+_KEY_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 64 * 1024
+
+
+class MmapStore:
+    """Append-only key -> float file; values are updated in place."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._positions = {key: pos for key, _, pos in read_entries(self._map, self._used)}
+
+    def add(self, key, amount):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._append(key)
+        _VALUE.pack_into(self._map, pos, _VALUE.unpack_from(self._map, pos)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padding = b' ' * (8 - (_KEY_LENGTH.size + len(encoded)) % 8)
+        entry = _KEY_LENGTH.pack(len(encoded)) + encoded + padding + _VALUE.pack(0.0)
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._map[self._used:self._used + len(entry)] = entry
+        value_pos = self._used + len(entry) - _VALUE.size
+        # Publish the new entry to readers only once it is fully written
+        self._used += len(entry)
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_pos
+        return value_pos
+
+    def items(self):
+        return [(key, value) for key, value, _ in read_entries(self._map, self._used)]
+
+
+def read_entries(data, used=None):
+    """Yield (key, value, value_offset) from a store file's bytes."""
+    if used is None:
+        used = _HEADER.unpack_from(data, 0)[0]
+    pos = _HEADER.size
+    while pos < used:
+        length = _KEY_LENGTH.unpack_from(data, pos)[0]
+        key_end = pos + _KEY_LENGTH.size + length
+        key = bytes(data[pos + _KEY_LENGTH.size:key_end]).decode('utf-8')
+        value_pos = key_end + 8 - (_KEY_LENGTH.size + length) % 8
+        yield key, _VALUE.unpack_from(data, value_pos)[0], value_pos
+        pos = value_pos + _VALUE.size
+
+
+class MemoryStore:
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        return list(self._values.items())
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._store = None
+        self._pid = None
+        self._keys = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def store(self):
+        # Re-open after fork so preloaded Gunicorn workers do not share one file
+        if self._pid != os.getpid():
+            directory = getattr(settings, 'METRICS_DIR', None)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                self._store = MmapStore(os.path.join(directory, f'metrics_{os.getpid()}.db'))
+            else:
+                self._store = MemoryStore()
+            self._pid = os.getpid()
+        return self._store
+
+    def add(self, name, labels, amount):
+        cache_key = (name, labels)
+        key = self._keys.get(cache_key)
+        if key is None:
+            key = self._keys[cache_key] = json.dumps([name, labels])
+        with self._lock:
+            self.store().add(key, amount)
+
+    def collect(self):
+        """Sum samples from every worker file (or this process) into {(name, labels): value}."""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        samples = {}
+        if directory:
+            self.store()
+            for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+                if len(data) < _HEADER.size:
+                    continue
+                for key, value, _ in read_entries(data):
+                    samples[key] = samples.get(key, 0.0) + value
+        else:
+            for key, value in self.store().items():
+                samples[key] = value
+        collected = {}
+        for key, value in samples.items():
+            name, labels = json.loads(key)
+            collected[(name, tuple(tuple(pair) for pair in labels))] = value
+        return collected
+
+
+registry = Registry()
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join('{}="{}"'.format(key, value.replace('\\', r'\\').replace('"', r'\"')) for key, value in labels)
+    return '{' + inner + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.name, _labels(labels), amount)
+
+    def expose(self, samples):
+        for labels, value in sorted(samples.get(self.name, {}).items()):
+            yield f'{self.name}{_format_labels(labels)} {value:g}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        labels = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        registry.add(f'{self.name}_bucket', labels + (('le', str(index)),), 1)
+        registry.add(f'{self.name}_sum', labels, value)
+
+    def expose(self, samples):
+        bucket_samples = {}
+        for labels, value in samples.get(f'{self.name}_bucket', {}).items():
+            index = int(dict(labels)['le'])
+            base = tuple(pair for pair in labels if pair[0] != 'le')
+            bucket_samples.setdefault(base, [0.0] * (len(self.buckets) + 1))[index] += value
+        sums = samples.get(f'{self.name}_sum', {})
+        for labels, counts in sorted(bucket_samples.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                yield f'{self.name}_bucket{_format_labels(labels + (("le", le),))} {cumulative:g}'
+            yield f'{self.name}_sum{_format_labels(labels)} {sums.get(labels, 0.0):g}'
+            yield f'{self.name}_count{_format_labels(labels)} {cumulative:g}'
+
+
+def render_prometheus():
+    samples = {}
+    for (name, labels), value in registry.collect().items():
+        samples.setdefault(name, {})[labels] = value
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.expose(samples))
+    return '\n'.join(lines) + '\n'
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter('quizicle_requests_total', 'HTTP requests by route, method and status code.')
+WORKER_REQUESTS = Counter('quizicle_worker_requests_total', 'HTTP requests served by each worker process.')
+REQUEST_LATENCY = Histogram('quizicle_request_duration_seconds', 'Request latency by route.', LATENCY_BUCKETS)
+DB_QUERIES = Counter('quizicle_db_queries_total', 'Database queries executed by route.')
+CACHE_REQUESTS = Counter('quizicle_cache_requests_total', 'Cache lookups by cache name and result (hit/miss).')
+
+
+def record_cache_lookup(name, hit):
+    CACHE_REQUESTS.inc(cache=name, result='hit' if hit else 'miss')
+
+
+AUTOSAVES = Counter('quizicle_autosaves_total', 'Attempt autosaves by outcome (cached, flushed or deferred).')
+
+
+def record_autosave(outcome):
+    AUTOSAVES.inc(outcome=outcome)
+
+
+THROTTLED = Counter('quizicle_throttled_requests_total', 'Requests rejected with 429 by a rate limit, by route.')
+
+
+LOCK_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DB_LOCK_WAIT = Histogram(
+    'quizicle_db_lock_wait_seconds', 'Time write transactions waited for the database write lock.', LOCK_WAIT_BUCKETS,
+)
+DB_WRITE_RETRIES = Counter('quizicle_db_write_retries_total', 'Write transactions retried because the database was locked.')
+DB_WRITE_FAILURES = Counter(
+    'quizicle_db_write_failures_total', 'Write transactions that were still locked out at their retry deadline.',
+)
@@ -1,6 +1,24 @@
+import logging
+import os
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
 from django.shortcuts import redirect
+from django.template.backends.django import Template as DjangoTemplate
 from django.urls import reverse
 
+from . import metrics, pagecache, routers, throttling
+
+logger = logging.getLogger(__name__)
+
+# Timing record of the request currently being served, read by the SQL and template hooks
+_current_timing = ContextVar('request_timing', default=None)
+
 class BanMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -22,4 +40,242 @@ class BanMiddleware:
                     if request.path.startswith(path[:-2]):  # Removes the '1' and trailing slash to match any ID
                         return redirect('banned_page')
                         
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
+
+
+class RequestTiming:
+    """Per-request counters filled in by ServerTimingMiddleware."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.view_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - start
+            self.queries += 1
+
+    def header(self):
+        return ', '.join([
+            f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.2f}',
+            f'view;dur={self.view_seconds * 1000:.2f}',
+            f'total;dur={self.total_seconds * 1000:.2f}',
+        ])
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        timing = _current_timing.get()
+        if timing is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timing.template_seconds += time.perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+class ServerTimingMiddleware:
+    """
+    Opt-in (SERVER_TIMING = True) breakdown of SQL, template, view and total time,
+    sent as a Server-Timing header. Views going over their QUERY_BUDGETS entry are logged.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING', False):
+            # Removes the middleware from the chain entirely, so there is no per-request cost
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.default_budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        if not getattr(DjangoTemplate.render, 'timed', False):
+            DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        request.timing = timing
+        token = _current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        end = time.perf_counter()
+
+        timing.total_seconds = end - start
+        view_started = getattr(request, '_view_started', None)
+        if view_started is not None:
+            timing.view_seconds = end - view_started
+        response['Server-Timing'] = timing.header()
+        self.check_budget(request, timing)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def check_budget(self, request, timing):
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        budget = self.budgets.get(url_name, self.default_budget)
+        if budget is not None and timing.queries > budget:
+            logger.warning(
+                'Query budget exceeded for %s (%s): %d queries, budget %d, %.1f ms SQL',
+                url_name, request.path, timing.queries, budget, timing.sql_seconds * 1000,
+            )
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Records request count, latency and query count per URL name (METRICS_ENABLED)."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        status = 500
+        start = time.perf_counter()
+        try:
+            with connections['default'].execute_wrapper(counter):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            match = getattr(request, 'resolver_match', None)
+            route = (match.url_name if match else None) or 'unmatched'
+            metrics.REQUESTS.inc(route=route, method=request.method, status=status)
+            metrics.WORKER_REQUESTS.inc(worker=os.getpid())
+            metrics.REQUEST_LATENCY.observe(elapsed, route=route)
+            if counter.queries:
+                metrics.DB_QUERIES.inc(counter.queries, route=route)
+
+
+class PageCacheMiddleware:
+    """
+    Serves anonymous GETs to the views in PAGE_CACHE_VIEWS ({url name: timeout}) from the
+    full-page cache. Sits above SessionMiddleware so a hit skips sessions, auth and the view.
+    """
+
+    def __init__(self, get_response):
+        self.views = getattr(settings, 'PAGE_CACHE_VIEWS', {})
+        if not self.views:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = pagecache.cacheable_route(request, self.views)
+        if match is None:
+            return self.get_response(request)
+
+        encoding = pagecache.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        key = pagecache.page_key(match, request.get_full_path())
+        entry = pagecache.lookup(key, encoding)
+        metrics.record_cache_lookup('page', entry is not None)
+        if entry is not None:
+            # Lets MetricsMiddleware label the hit with its route
+            request.resolver_match = match
+            return pagecache.build_response(request, entry, encoding, hit=True)
+
+        response = self.get_response(request)
+        if not pagecache.is_storable(request, response):
+            return response
+        entries = pagecache.store(key, response, self.views[match.url_name])
+        return pagecache.build_response(request, entries[encoding], encoding, hit=False)
+
+
+class ThrottleMiddleware:
+    """
+    Rejects POSTs to the views in THROTTLES with 429 Too Many Requests once their token
+    buckets are empty (see projectname/throttling.py). Sits after AuthenticationMiddleware
+    so logged-in users are limited per user.
+    """
+
+    def __init__(self, get_response):
+        self.throttles = getattr(settings, 'THROTTLES', {})
+        if not self.throttles:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        url_name = request.resolver_match.url_name
+        rates = self.throttles.get(url_name)
+        if not rates:
+            return None
+        try:
+            wait = throttling.take(throttling.buckets(request, url_name, rates))
+        except Exception:
+            # An unreachable cache must not take the site down with it
+            logger.warning('Rate limit check failed for %s; request allowed', url_name, exc_info=True)
+            return None
+        if not wait:
+            return None
+        metrics.THROTTLED.inc(route=url_name)
+        response = HttpResponse('Too many requests, please slow down.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(throttling.retry_after(wait))
+        return response
+
+
+class ReadOnlyDatabaseMiddleware:
+    """
+    Serves GETs to the views in READ_ONLY_VIEWS (URL names, or view names such as
+    'admin:projectname_results_changelist') from the read-only database alias. Users who
+    just sent a POST are kept on the main database for READ_YOUR_WRITES_SECONDS, so they
+    always see their own writes. Does nothing unless READ_ONLY_DB_ALIAS is configured.
+    """
+
+    def __init__(self, get_response):
+        if not routers.read_only_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'READ_ONLY_VIEWS', ()))
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, '_read_only_token', None)
+            if token is not None:
+                routers._read_only.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and request.user.is_authenticated:
+            routers.pin_to_primary(request.user.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        match = request.resolver_match
+        if match.url_name not in self.views and match.view_name not in self.views:
+            return None
+        if request.user.is_authenticated and routers.is_pinned(request.user.pk):
+            return None
+        # Reset in __call__ once the response, including a lazily rendered template, is built
+        request._read_only_token = routers._read_only.set(True)
+        return None
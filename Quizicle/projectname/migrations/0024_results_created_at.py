@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projectname', '0023_remove_quizresultanswer_result_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='results',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-19 13:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    # Same as counters.reconcile_counters(), against the models as of this migration
+    AnswerSelectionCounter = apps.get_model('projectname', 'AnswerSelectionCounter')
+    QuizResultAnswer = apps.get_model('projectname', 'QuizResultAnswer')
+    rows = QuizResultAnswer.objects.values('question_id', 'answer_id').annotate(selections=Count('id')).order_by()
+    AnswerSelectionCounter.objects.bulk_create(
+        (AnswerSelectionCounter(question_id=row['question_id'], answer_id=row['answer_id'], shard=0,
+                                selections=row['selections'])
+         for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projectname', '0024_results_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerSelectionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('selections', models.PositiveIntegerField(default=0)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selection_counters', to='projectname.answer')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selection_counters', to='projectname.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('answer', 'shard'), name='unique_answer_counter_shard')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.5 on 2026-10-19 13:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+from django.utils import timezone
+
+
+def backfill_leaderboards(apps, schema_editor):
+    # Same as leaderboard.rebuild(), against the models as of this migration
+    LeaderboardEntry = apps.get_model('projectname', 'LeaderboardEntry')
+    LeaderboardScore = apps.get_model('projectname', 'LeaderboardScore')
+    Results = apps.get_model('projectname', 'Results')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    user_ids = dict(User.objects.values_list('username', 'id'))
+    first_reached = {
+        (row['quiz_id'], row['user'], row['result']): row['first']
+        for row in Results.objects.values('quiz_id', 'user', 'result').annotate(first=Min('created_at')).order_by()
+    }
+    now = timezone.now()
+    entries = []
+    counts = {}
+    for row in Results.objects.values('quiz_id', 'user').annotate(best=Max('result')).order_by().iterator():
+        user_id = user_ids.get(row['user'])
+        if user_id is None:
+            continue
+        achieved_at = first_reached.get((row['quiz_id'], row['user'], row['best']))
+        entries.append(LeaderboardEntry(
+            quiz_id=row['quiz_id'], user_id=user_id, best_score=row['best'], achieved_at=achieved_at or now,
+        ))
+        counts[(row['quiz_id'], row['best'])] = counts.get((row['quiz_id'], row['best']), 0) + 1
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+    LeaderboardScore.objects.bulk_create(
+        [LeaderboardScore(quiz_id=quiz_id, score=score, players=players) for (quiz_id, score), players in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projectname', '0025_answerselectioncounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('best_score', models.IntegerField()),
+                ('achieved_at', models.DateTimeField()),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='projectname.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quiz', '-best_score', 'achieved_at'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'user'), name='unique_leaderboard_player')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField()),
+                ('players', models.PositiveIntegerField(default=0)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_scores', to='projectname.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'score'), name='unique_leaderboard_score')],
+            },
+        ),
+        migrations.RunPython(backfill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projectname', '0027_quiz_version_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='results',
+            name='selections',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='QuizSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='projectname.quiz')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='current_snapshot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='projectname.quizsnapshot'),
+        ),
+        migrations.AddField(
+            model_name='results',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='projectname.quizsnapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizsnapshot',
+            constraint=models.UniqueConstraint(fields=('quiz', 'version'), name='unique_quiz_snapshot_version'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.5 on 2026-10-19 14:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_summaries(apps, schema_editor):
+    # Same as history.rebuild(), against the models as of this migration
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Results = apps.get_model('projectname', 'Results')
+    ResultSummary = apps.get_model('projectname', 'ResultSummary')
+    user_ids = dict(User.objects.values_list('username', 'id'))
+    totals = Results.objects.values('user', 'quiz_id').annotate(
+        attempts=Count('id'), total=Sum('result'), best=Max('result'), last_id=Max('id'),
+    ).order_by()
+
+    def write(rows):
+        last = {
+            result_id: (score, created_at)
+            for result_id, score, created_at in Results.objects.filter(
+                id__in=[row['last_id'] for row in rows]
+            ).values_list('id', 'result', 'created_at')
+        }
+        ResultSummary.objects.bulk_create([
+            ResultSummary(
+                user_id=user_ids[row['user']], quiz_id=row['quiz_id'], attempts=row['attempts'],
+                total_score=row['total'], best_score=row['best'], last_score=last[row['last_id']][0],
+                last_taken_at=last[row['last_id']][1], last_result_id=row['last_id'],
+            )
+            for row in rows
+        ])
+
+    batch = []
+    for row in totals.iterator(chunk_size=1000):
+        # Attempts of deleted users have no summary to go to
+        if row['user'] in user_ids:
+            batch.append(row)
+        if len(batch) >= 1000:
+            write(batch)
+            batch = []
+    if batch:
+        write(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projectname', '0029_quizattempt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField()),
+                ('last_score', models.IntegerField()),
+                ('last_taken_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='results',
+            index=models.Index(fields=['user', 'quiz', '-id'], name='results_user_quiz_idx'),
+        ),
+        migrations.AddField(
+            model_name='resultsummary',
+            name='last_result',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='projectname.results'),
+        ),
+        migrations.AddField(
+            model_name='resultsummary',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_summaries', to='projectname.quiz'),
+        ),
+        migrations.AddField(
+            model_name='resultsummary',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='resultsummary',
+            index=models.Index(fields=['user', '-last_result'], name='result_summary_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resultsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'quiz'), name='unique_result_summary'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
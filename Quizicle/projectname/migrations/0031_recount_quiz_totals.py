@@ -0,0 +1,50 @@
+from django.db import migrations, models, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from projectname.caching import bump_catalog_version, bump_quiz_page_version
+
+
+def recount_totals(apps, schema_editor):
+    # Same as Quiz.recount_totals() plus touch(), against the models as of this migration:
+    # the removed calculate_max_values() never stored the totals of existing quizzes
+    Quiz = apps.get_model('projectname', 'Quiz')
+    Question = apps.get_model('projectname', 'Question')
+    alias = schema_editor.connection.alias
+    questions = Question.objects.using(alias).filter(quiz=OuterRef('pk')).order_by().values('quiz')
+    actual = {
+        'question_count': Coalesce(Subquery(questions.annotate(n=Count('pk')).values('n')), 0),
+        'quiz_maximum_points': Coalesce(
+            Subquery(questions.annotate(total=Sum('points_for_question')).values('total')), 0
+        ),
+    }
+    stale = list(
+        Quiz.objects.using(alias)
+        .annotate(actual_count=actual['question_count'], actual_points=actual['quiz_maximum_points'])
+        .exclude(question_count=models.F('actual_count'), quiz_maximum_points=models.F('actual_points'))
+        .values_list('pk', flat=True)
+    )
+    if not stale:
+        return
+    Quiz.objects.using(alias).filter(pk__in=stale).update(
+        version=models.F('version') + 1, updated_at=timezone.now(), **actual
+    )
+
+    def bump_caches():
+        for quiz_id in stale:
+            bump_quiz_page_version(quiz_id)
+        bump_catalog_version()
+
+    transaction.on_commit(bump_caches, using=alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projectname', '0030_result_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_totals, migrations.RunPython.noop),
+    ]
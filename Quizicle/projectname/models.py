@@ -1,29 +1,85 @@
 import os
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models import Count, Max, Min, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import bump_catalog_version, bump_quiz_page_version, bump_user_version
 
 
 class Quiz(models.Model):
     quiz_name = models.CharField(max_length=150)
     description = models.TextField(default="Complete the quiz—get results")
-    quiz_maximum_points = models.IntegerField(default=0, editable=False)  # Auto-calculated
-    question_count = models.IntegerField(default=0, editable=False)  # Auto-calculated
+    quiz_maximum_points = models.IntegerField(default=0, editable=False)  # Kept up to date by the Question signals
+    question_count = models.IntegerField(default=0, editable=False)  # Kept up to date by the Question signals
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='questions_created')
+    version = models.PositiveIntegerField(default=1, editable=False)  # Bumped on every change
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    current_snapshot = models.ForeignKey(
+        'QuizSnapshot', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
 
     class Meta:
         app_label = 'projectname'
         ordering = ['-id']
 
+    TOTAL_FIELDS = ('question_count', 'quiz_maximum_points')
+
     def __str__(self):
         return self.quiz_name
 
-    def calculate_max_values(self):
-        """Auto-updates max points & question count"""
-        self.QuestionCount = self.questions.count()
-        self.QuizMaximumPoints = sum(q.points_for_question for q in self.questions.all())
-        self.save()
+    def save(self, *args, **kwargs):
+        # The totals change with F() updates; saving an instance loaded earlier must not undo them
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def touch(self, catalog=True):
+        """Mark the quiz as changed so cached pages and ETags are invalidated."""
+        Quiz.objects.filter(pk=self.pk).update(version=models.F('version') + 1, updated_at=timezone.now())
+        # Only once the change is visible: a page rebuilt before the commit would be cached
+        # under the new version with the old content
+        quiz_id = self.pk
+        transaction.on_commit(lambda: bump_quiz_page_version(quiz_id))
+        if catalog:
+            transaction.on_commit(bump_catalog_version)
+
+    @staticmethod
+    def add_to_totals(quiz_id, questions, points):
+        """Atomically add to a quiz's question count and maximum points (negative to subtract)."""
+        Quiz.objects.filter(pk=quiz_id).update(
+            question_count=models.F('question_count') + questions,
+            quiz_maximum_points=models.F('quiz_maximum_points') + points,
+        )
+
+    @staticmethod
+    def recount_totals(quiz_ids=None):
+        """
+        Recompute the totals of the given quizzes (all by default) from their questions.
+        Returns the ids of the quizzes whose totals were wrong.
+        """
+        questions = Question.objects.filter(quiz=models.OuterRef('pk')).order_by().values('quiz')
+        actual = {
+            'question_count': Coalesce(Subquery(questions.annotate(n=Count('pk')).values('n')), 0),
+            'quiz_maximum_points': Coalesce(
+                Subquery(questions.annotate(total=Sum('points_for_question')).values('total')), 0
+            ),
+        }
+        quizzes = Quiz.objects.all() if quiz_ids is None else Quiz.objects.filter(pk__in=quiz_ids)
+        stale = list(
+            quizzes.annotate(actual_count=actual['question_count'], actual_points=actual['quiz_maximum_points'])
+            .exclude(question_count=models.F('actual_count'), quiz_maximum_points=models.F('actual_points'))
+            .values_list('pk', flat=True)
+        )
+        if stale:
+            Quiz.objects.filter(pk__in=stale).update(**actual)
+        return stale
 
 
 class Question(models.Model):
@@ -51,18 +107,114 @@ class Answer(models.Model):
         return self.answer
 
 
+class QuizSnapshot(models.Model):
+    """Immutable copy of a published quiz: questions, answers, points, images and explanations."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='snapshots')
+    version = models.PositiveIntegerField()
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'projectname'
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'version'], name='unique_quiz_snapshot_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.quiz_id} v{self.version}"
+
+
 class Results(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="results")
     user = models.CharField(max_length=150)
     result = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    snapshot = models.ForeignKey(QuizSnapshot, on_delete=models.SET_NULL, null=True, blank=True, related_name='results')
+    selections = models.JSONField(default=dict, blank=True)  # {question_id: answer_id} as graded
 
     class Meta:
         app_label = 'projectname'
+        indexes = [
+            models.Index(fields=['user', 'quiz', '-id'], name='results_user_quiz_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.quiz.quiz_name} - {self.result}"
 
 
+class ResultSummary(models.Model):
+    """A user's attempts on one quiz, folded into one row for the results history page."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='result_summaries')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='result_summaries')
+    attempts = models.PositiveIntegerField(default=0)
+    total_score = models.IntegerField(default=0)  # for the average
+    best_score = models.IntegerField()
+    last_score = models.IntegerField()
+    last_taken_at = models.DateTimeField(null=True)
+    # Newest first by its id; only null until recount() runs for a deleted last result
+    last_result = models.ForeignKey(Results, on_delete=models.SET_NULL, null=True, related_name='+')
+
+    class Meta:
+        app_label = 'projectname'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'quiz'], name='unique_result_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_result'], name='result_summary_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.quiz} - {self.attempts} attempts"
+
+    @property
+    def average_score(self):
+        return self.total_score / self.attempts if self.attempts else 0
+
+    @staticmethod
+    def recount(username, quiz_id):
+        """Recompute the user's summary for the quiz from the attempts left, e.g. after some were deleted."""
+        # Locked first, so an attempt graded meanwhile is either counted here or folded in afterwards
+        rows = list(ResultSummary.objects.select_for_update().filter(
+            user__username=username, quiz_id=quiz_id,
+        ).values_list('id', 'user_id'))
+        if not rows:
+            return
+        ids = [summary_id for summary_id, _ in rows]
+        # Cached history pages embed the user version
+        user_id = rows[0][1]
+        transaction.on_commit(lambda: bump_user_version(user_id))
+        results = Results.objects.filter(user=username, quiz_id=quiz_id)
+        totals = results.aggregate(attempts=Count('id'), total=Sum('result'), best=Max('result'), last_id=Max('id'))
+        if not totals['attempts']:
+            ResultSummary.objects.filter(id__in=ids).delete()
+            return
+        last_score, last_taken_at = results.filter(id=totals['last_id']).values_list('result', 'created_at').get()
+        ResultSummary.objects.filter(id__in=ids).update(
+            attempts=totals['attempts'], total_score=totals['total'], best_score=totals['best'],
+            last_score=last_score, last_taken_at=last_taken_at, last_result_id=totals['last_id'],
+        )
+
+
+class QuizAttempt(models.Model):
+    """Progress of a paged attempt in progress; deleted once the attempt is graded."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    snapshot = models.ForeignKey(QuizSnapshot, on_delete=models.CASCADE, related_name='attempts')
+    answers = models.JSONField(default=dict, blank=True)  # {question_id: answer_id} so far
+    page = models.PositiveIntegerField(default=1)  # furthest page reached
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'projectname'
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'user'], name='unique_open_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.quiz} - page {self.page}"
+
+
 class QuizResultAnswer(models.Model):
     quiz_result = models.ForeignKey('Results', on_delete=models.CASCADE, related_name='quiz_result_answers')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -75,6 +227,89 @@ class QuizResultAnswer(models.Model):
         return f"{self.quiz_result} - {self.question} - {self.answer}"
 
 
+class AnswerSelectionCounter(models.Model):
+    """How often an answer was picked, split over shard rows to spread write contention."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='selection_counters')
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name='selection_counters')
+    shard = models.PositiveSmallIntegerField(default=0)
+    selections = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        app_label = 'projectname'
+        constraints = [
+            models.UniqueConstraint(fields=['answer', 'shard'], name='unique_answer_counter_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.answer} [{self.shard}] - {self.selections}"
+
+
+class LeaderboardEntry(models.Model):
+    """A player's best score on a quiz."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    best_score = models.IntegerField()
+    achieved_at = models.DateTimeField()
+
+    class Meta:
+        app_label = 'projectname'
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'user'], name='unique_leaderboard_player'),
+        ]
+        indexes = [
+            models.Index(fields=['quiz', '-best_score', 'achieved_at'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.quiz} - {self.best_score}"
+
+    @staticmethod
+    def recount(username, quiz_id):
+        """Recompute the user's best score on the quiz from the attempts left, e.g. after some were deleted."""
+        entry = LeaderboardEntry.objects.select_for_update().filter(
+            user__username=username, quiz_id=quiz_id,
+        ).only('id', 'quiz_id', 'best_score').first()
+        if entry is None:
+            return
+        results = Results.objects.filter(user=username, quiz_id=quiz_id)
+        best = results.aggregate(best=Max('result'))['best']
+        if best is None:
+            entry.delete()  # taken out of the score counts by its post_delete receiver
+            return
+        if best == entry.best_score:
+            return
+        # Attempts made before Results.created_at existed have no timestamp
+        achieved_at = results.filter(result=best).aggregate(first=Min('created_at'))['first'] or timezone.now()
+        LeaderboardEntry.objects.filter(id=entry.id).update(best_score=best, achieved_at=achieved_at)
+        LeaderboardScore.adjust(quiz_id, entry.best_score, -1)
+        LeaderboardScore.adjust(quiz_id, best, 1)
+
+
+class LeaderboardScore(models.Model):
+    """Number of players whose best score on a quiz equals `score`; used for rank lookups."""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='leaderboard_scores')
+    score = models.IntegerField()
+    players = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        app_label = 'projectname'
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'score'], name='unique_leaderboard_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.quiz} - {self.score}: {self.players}"
+
+    @staticmethod
+    def adjust(quiz_id, score, delta):
+        """Atomically add delta players to a score of the quiz (negative to remove them)."""
+        if delta > 0:
+            LeaderboardScore.objects.bulk_create(
+                [LeaderboardScore(quiz_id=quiz_id, score=score)], ignore_conflicts=True
+            )
+        LeaderboardScore.objects.filter(quiz_id=quiz_id, score=score).update(players=models.F('players') + delta)
+
+
 class Report(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="reports")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="user_reports")
@@ -122,6 +357,54 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 # Signal handlers
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_quiz_on_comment(sender, instance, **kwargs):
+    """Comments are shown on the quiz details page, so they change its version."""
+    Quiz(pk=instance.quiz_id).touch(catalog=False)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def bump_catalog_on_quiz_change(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_init, sender=Question)
+def remember_counted_question(sender, instance, **kwargs):
+    """The quiz and points this question is counted with in the quiz totals."""
+    # __dict__: reading a deferred field here would cost a query for every loaded row
+    instance._counted = (instance.__dict__.get('quiz_id'), instance.__dict__.get('points_for_question'))
+
+
+@receiver(post_save, sender=Question)
+def update_quiz_totals_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # fixtures bring their own totals
+    quiz_id, points = instance.quiz_id, instance.points_for_question
+    counted_quiz, counted_points = instance._counted
+    if created:
+        Quiz.add_to_totals(quiz_id, 1, points)
+    elif counted_quiz is None or counted_points is None:
+        # Loaded with deferred fields, so what it was counted with is unknown
+        Quiz.recount_totals({quiz_id, counted_quiz} - {None})
+    elif counted_quiz != quiz_id:
+        Quiz.add_to_totals(counted_quiz, -1, -counted_points)
+        Quiz.add_to_totals(quiz_id, 1, points)
+    elif points != counted_points:
+        Quiz.add_to_totals(quiz_id, 0, points - counted_points)
+    instance._counted = (quiz_id, points)
+
+
+@receiver(post_delete, sender=Question)
+def update_quiz_totals_on_delete(sender, instance, origin=None, **kwargs):
+    # Questions deleted along with their quiz (or its creator) leave no totals to fix
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin is not None and origin_model is not Question:
+        return
+    Quiz.add_to_totals(instance.quiz_id, -1, -instance.points_for_question)
+
+
 @receiver(post_delete, sender=Question)
 def delete_question_image(sender, instance, **kwargs):
     """Delete image file when Question instance is deleted."""
@@ -144,3 +427,27 @@ def delete_old_image_on_update(sender, instance, **kwargs):
     if old_image and old_image != instance.image:
         if os.path.isfile(old_image.path):
             os.remove(old_image.path)
+
+
+@receiver(post_delete, sender=Results)
+def update_result_summary_on_delete(sender, instance, origin=None, **kwargs):
+    # Attempts deleted along with their quiz take its summaries with them
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin is not None and origin_model is not Results:
+        return
+    ResultSummary.recount(instance.user, instance.quiz_id)
+
+
+@receiver(post_delete, sender=Results)
+def update_leaderboard_on_delete(sender, instance, origin=None, **kwargs):
+    # Attempts deleted along with their quiz take its leaderboard with them
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin is not None and origin_model is not Results:
+        return
+    LeaderboardEntry.recount(instance.user, instance.quiz_id)
+
+
+@receiver(post_delete, sender=LeaderboardEntry)
+def update_leaderboard_scores_on_delete(sender, instance, **kwargs):
+    # With the quiz deleted as well this updates nothing: decrements never create score rows
+    LeaderboardScore.adjust(instance.quiz_id, instance.best_score, -1)
@@ -0,0 +1,113 @@
+"""
+Full-page cache for anonymous visitors, used by PageCacheMiddleware.
+
+A page is stored once per content encoding (identity, gzip and, when the `brotli` package
+is installed, br), all written together on a miss. Keys contain the catalog version and,
+for quiz pages, the quiz's page version, so a changed quiz or comment is never served
+from the cache. Hits need no database access at all.
+"""
+
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from .caching import catalog_version, quiz_page_version
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip and identity variants are stored
+    brotli = None
+
+
+# Headers that are recomputed for every response served from the cache
+SKIPPED_HEADERS = {'content-length', 'content-encoding', 'vary', 'set-cookie', 'server-timing'}
+
+
+def cacheable_route(request, views):
+    """ResolverMatch of an anonymous GET to one of `views`, or None."""
+    if request.method != 'GET':
+        return None
+    # Session and flash-message cookies mean the page may be personalised
+    if settings.SESSION_COOKIE_NAME in request.COOKIES or CookieStorage.cookie_name in request.COOKIES:
+        return None
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    return match if match.url_name in views else None
+
+
+def negotiate(accept_encoding):
+    offered = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        offered.add(coding.strip().lower())
+    if brotli is not None and 'br' in offered:
+        return 'br'
+    if 'gzip' in offered:
+        return 'gzip'
+    return 'identity'
+
+
+def page_key(match, full_path):
+    quiz_id = match.kwargs.get('pk') or match.kwargs.get('quiz_id')
+    quiz_part = f'q{quiz_page_version(quiz_id)}' if quiz_id else '-'
+    digest = hashlib.md5(full_path.encode(), usedforsecurity=False).hexdigest()
+    return f'page:{match.url_name}:c{catalog_version()}:{quiz_part}:{digest}'
+
+
+def is_storable(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if response.has_header('Content-Encoding'):
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    cache_control = response.get('Cache-Control', '')
+    return 'private' not in cache_control and 'no-store' not in cache_control
+
+
+def store(key, response, timeout):
+    """Cache every encoding of the response; returns {encoding: entry}."""
+    body = response.content
+    headers = [(name, value) for name, value in response.items() if name.lower() not in SKIPPED_HEADERS]
+    bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(body, quality=9)
+    entries = {
+        encoding: {'status': response.status_code, 'headers': headers, 'body': data}
+        for encoding, data in bodies.items()
+    }
+    cache.set_many({f'{key}:{encoding}': entry for encoding, entry in entries.items()}, timeout)
+    return entries
+
+
+def lookup(key, encoding):
+    return cache.get(f'{key}:{encoding}')
+
+
+def build_response(request, entry, encoding, hit):
+    response = HttpResponse(entry['body'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(len(entry['body']))
+    response['X-Page-Cache'] = 'HIT' if hit else 'MISS'
+    patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+        response=response,
+    )
@@ -0,0 +1,96 @@
+"""
+Write transactions that survive SQLite lock contention.
+
+write_transaction() runs a function inside transaction.atomic() opened with
+BEGIN IMMEDIATE, so the write lock is taken up front: two transactions that both read
+and then try to write can no longer deadlock on the lock upgrade (SQLite answers that
+case with an immediate "database is locked" that busy_timeout does not wait out).
+When the database is still locked the whole transaction is retried after a jittered
+exponential backoff until WRITE_RETRY_DEADLINE has passed.
+
+PostgreSQL locks rows instead of the whole database, so transactions start as usual
+there; the ones it aborts to break a deadlock are retried the same way.
+
+Each operation records how long it waited for the lock, how often it was retried and
+how often it gave up, under its name in the Prometheus metrics.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+from . import metrics
+
+
+# SQLite busy errors, then PostgreSQL deadlock and serialization failures
+LOCK_ERRORS = (
+    'database is locked', 'database table is locked', 'deadlock detected', 'could not serialize access',
+)
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return any(text in message for text in LOCK_ERRORS)
+
+
+@contextmanager
+def _immediate(connection):
+    # Only this transaction starts IMMEDIATE; read-only atomic blocks elsewhere stay DEFERRED
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        yield
+    finally:
+        connection.transaction_mode = previous
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff for the given retry (1, 2, ...)."""
+    base = getattr(settings, 'WRITE_RETRY_BASE_DELAY', 0.01)
+    cap = getattr(settings, 'WRITE_RETRY_MAX_DELAY', 0.5)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def write_transaction(func, name, using='default', deadline=None):
+    """
+    Return func() run in one write transaction, retried while the database is locked.
+    Inside an outer transaction func just runs in a savepoint: only the outermost
+    transaction can be retried.
+    """
+    connection = connections[using]
+    if connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            return func()
+
+    if deadline is None:
+        deadline = getattr(settings, 'WRITE_RETRY_DEADLINE', 10.0)
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        locked = False
+        try:
+            with _immediate(connection), transaction.atomic(using=using):
+                # BEGIN IMMEDIATE has returned, so the write lock is held
+                metrics.DB_LOCK_WAIT.observe(time.perf_counter() - started, operation=name)
+                locked = True
+                return func()
+        except OperationalError as e:
+            if not locked:
+                metrics.DB_LOCK_WAIT.observe(time.perf_counter() - started, operation=name)
+            if not is_lock_error(e):
+                raise
+            attempt += 1
+            delay = backoff(attempt)
+            if time.monotonic() + delay > give_up_at:
+                metrics.DB_WRITE_FAILURES.inc(operation=name)
+                raise
+            metrics.DB_WRITE_RETRIES.inc(operation=name)
+            time.sleep(delay)
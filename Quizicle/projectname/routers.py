@@ -0,0 +1,94 @@
+"""
+Database routers.
+
+SessionRouter keeps django.contrib.sessions in its own SQLite file (SESSION_DB_ALIAS), so
+logins and session updates do not compete with quiz submissions for the main database's
+write lock. With SESSION_DB_ALIAS = 'default' it routes nothing.
+
+ReadOnlyRouter sends the reads of the views in READ_ONLY_VIEWS (flagged for the request by
+ReadOnlyDatabaseMiddleware) to the READ_ONLY_DB_ALIAS connection, a SQLite file opened
+with mode=ro and query_only: either the main database or a snapshot kept fresh by
+`manage.py refresh_read_snapshot`. Writes always go to 'default'. Without the alias in
+DATABASES the router routes nothing.
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+_read_only = ContextVar('read_only_database', default=False)
+
+
+def session_alias():
+    return getattr(settings, 'SESSION_DB_ALIAS', 'default')
+
+
+class SessionRouter:
+    app_label = 'sessions'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return session_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, **hints):
+        alias = session_alias()
+        if alias == 'default':
+            return None
+        if app_label == self.app_label:
+            return db == alias
+        if db == alias:
+            return False
+        return None
+
+
+def read_only_alias():
+    return getattr(settings, 'READ_ONLY_DB_ALIAS', 'readonly')
+
+
+def read_only_enabled():
+    return read_only_alias() in settings.DATABASES
+
+
+def _pin_key(user_id):
+    return f'readonly:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Keep the user's reads on 'default' for READ_YOUR_WRITES_SECONDS after a write."""
+    cache.set(_pin_key(user_id), 1, getattr(settings, 'READ_YOUR_WRITES_SECONDS', 60))
+
+
+def is_pinned(user_id):
+    return cache.get(_pin_key(user_id)) is not None
+
+
+class ReadOnlyRouter:
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and model._meta.app_label != SessionRouter.app_label and read_only_enabled():
+            return read_only_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects loaded through the read-only alias are saved to the main database
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == read_only_alias():
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        aliases = {'default', read_only_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == read_only_alias():
+            return False
+        return None
@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+from decouple import config
 from django.contrib.messages import constants as messages
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -57,6 +59,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'projectname.middleware.MetricsMiddleware',
+    'projectname.middleware.ServerTimingMiddleware',
+    'projectname.middleware.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,8 +69,49 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'projectname.middleware.BanMiddleware',
+    'projectname.middleware.ThrottleMiddleware',
+    'projectname.middleware.ReadOnlyDatabaseMiddleware',
 ]
 
+# Per-route request metrics served at /metrics/ in Prometheus format.
+# METRICS_DIR shares samples between worker processes; None keeps them in memory.
+METRICS_ENABLED = True
+METRICS_DIR = None
+METRICS_TOKEN = ''
+
+# Per-request SQL/template timing sent as a Server-Timing header (off by default)
+SERVER_TIMING = False
+
+# Maximum number of queries per URL name before a warning is logged
+QUERY_BUDGETS = {
+    'home': 2,
+    'quiz_public_list': 5,
+    'popular_quizzes': 5,
+    'quiz_details': 10,
+    'take_quiz': 10,
+    'quiz_result': 15,
+    'user_results': 5,
+    'user_quiz_results': 5,
+}
+QUERY_BUDGET_DEFAULT = None
+
+# Token-bucket rate limits on POSTs: {url name: {'user': 'N/period', 'ip': 'N/period'}}
+# with period s, m, h or d (see projectname/throttling.py). Empty disables throttling.
+THROTTLES = {
+    'take_quiz': {'user': '10/m', 'ip': '60/m'},
+    'take_quiz_page': {'user': '60/m', 'ip': '300/m'},
+    'quiz_submit': {'user': '10/m', 'ip': '60/m'},
+    'autosave_attempt': {'user': '60/m', 'ip': '600/m'},
+    'quiz_details': {'user': '5/m', 'ip': '30/m'},
+    'report_quiz': {'user': '3/m', 'ip': '20/m'},
+    'register': {'ip': '5/h'},
+}
+# Request header holding the client address when behind a proxy, e.g. 'HTTP_X_REAL_IP'
+THROTTLE_IP_HEADER = None
+
+# Counter rows per answer for option-selection statistics
+ANSWER_COUNTER_SHARDS = 8
+
 ROOT_URLCONF = 'projectname.urls'
 
 TEMPLATES = [
@@ -94,6 +140,110 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Sessions live in their own file so they never take the main database's write lock
+    'sessions': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'sessions.sqlite3',
+    },
+}
+
+# PostgreSQL instead of the SQLite files when DB_ENGINE=postgres (`docker compose --profile
+# postgres up -d postgres` starts one). Every process keeps a psycopg pool of at most
+# DB_POOL_MAX_SIZE connections; with DB_POOL=False one connection is reused for
+# CONN_MAX_AGE seconds instead. Health checks replace connections the server has closed.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='quizicle'),
+            'USER': config('DB_USER', default='quizicle'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'CONN_MAX_AGE': 0,  # the pool does not allow persistent connections
+            'OPTIONS': {},
+        },
+    }
+    if config('DB_POOL', default=True, cast=bool):
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=4, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = config('CONN_MAX_AGE', default=60, cast=int)
+elif DB_ENGINE != 'sqlite':
+    raise ImproperlyConfigured(f'DB_ENGINE must be "sqlite" or "postgres", not {DB_ENGINE!r}')
+
+# Read-only connection for the heavy read views in READ_ONLY_VIEWS (see projectname/routers.py).
+# Point READ_ONLY_DATABASE at the main file, or at a snapshot refreshed by
+# `manage.py refresh_read_snapshot`, to turn it on. Keep READ_YOUR_WRITES_SECONDS longer than
+# the snapshot refresh interval: that is how long a user's reads stay on 'default' after a POST.
+READ_ONLY_DATABASE = None
+READ_ONLY_DB_ALIAS = 'readonly'
+if READ_ONLY_DATABASE and DB_ENGINE == 'sqlite':
+    DATABASES[READ_ONLY_DB_ALIAS] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{READ_ONLY_DATABASE}?mode=ro',
+        'OPTIONS': {'init_command': 'PRAGMA query_only = ON'},
+        'TEST': {'MIRROR': 'default'},
+    }
+READ_ONLY_VIEWS = [
+    'popular_quizzes',
+    'user_results',
+    'user_quiz_results',
+    'quiz_analytics',
+    'admin_reports',
+    'user_handler',
+    'admin:projectname_quiz_changelist',
+    'admin:projectname_results_changelist',
+    'admin:projectname_quizresultanswer_changelist',
+]
+READ_YOUR_WRITES_SECONDS = 60
+
+DATABASE_ROUTERS = ['projectname.routers.SessionRouter', 'projectname.routers.ReadOnlyRouter']
+
+# Session reads are served from the cache; the database is only written when a session changes.
+# 'django.contrib.sessions.backends.signed_cookies' keeps them out of the server entirely.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# PostgreSQL has no single write lock, so sessions stay in the main database there
+SESSION_DB_ALIAS = 'sessions' if 'sessions' in DATABASES else 'default'
+
+
+# Start-up warm-up run from projectname/wsgi.py (see projectname/warmup.py)
+WARMUP_ON_START = False
+WARMUP_QUIZZES = 20
+WARMUP_STATUS_FILE = None
+
+# Quizzes with more questions than this are taken one page at a time. None disables paging.
+TAKE_QUIZ_PAGE_SIZE = 20
+
+# Rows per page of the results history (per-quiz summaries, and the attempts of one quiz)
+RESULTS_PAGE_SIZE = 20
+
+# Autosaved answers reach the database at most this often per attempt, and at most
+# AUTOSAVE_MAX_FLUSHES_PER_SECOND times a second overall (see projectname/attempts.py)
+AUTOSAVE_FLUSH_INTERVAL = 5
+AUTOSAVE_MAX_FLUSHES_PER_SECOND = 50
+
+# Anonymous full-page cache: {url name: timeout in seconds}. Empty disables it.
+PAGE_CACHE_VIEWS = {
+    'home': 300,
+    'quiz_public_list': 300,
+    'popular_quizzes': 60,
+    'quiz_details': 300,
+}
+
+# Cache shared by all worker processes; see projectname/caching.py for key versioning
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -15,13 +15,61 @@ SECRET_KEY = config('SECRET_KEY', default='')
 # Allowed hosts for production
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [s.strip() for s in v.split(',')])
 
-# Database configuration for production - using SQLite
-DATABASES = {
-    'default': {
+# Database configuration for production: the SQLite files in db_data, or PostgreSQL with
+# DB_ENGINE=postgres (DB_* variables, see settings.py)
+if DB_ENGINE == 'sqlite':
+    DATABASES['default']['NAME'] = '/app/db_data/db.sqlite3'
+    DATABASES['sessions']['NAME'] = '/app/db_data/sessions.sqlite3'
+
+# Heavy read views from a read-only connection: /app/db_data/db.sqlite3 itself, or a
+# snapshot kept fresh by `manage.py refresh_read_snapshot --interval 30` (SQLite only)
+READ_ONLY_DATABASE = config('READ_ONLY_DATABASE', default='')
+if READ_ONLY_DATABASE and DB_ENGINE == 'sqlite':
+    DATABASES[READ_ONLY_DB_ALIAS] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': '/app/db_data/db.sqlite3',
+        'NAME': f'file:{READ_ONLY_DATABASE}?mode=ro',
+        'OPTIONS': {'init_command': 'PRAGMA query_only = ON'},
+        'TEST': {'MIRROR': 'default'},
     }
-}
+READ_YOUR_WRITES_SECONDS = config('READ_YOUR_WRITES_SECONDS', default=60, cast=int)
+
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+# Request timing instrumentation
+SERVER_TIMING = config('SERVER_TIMING', default=False, cast=bool)
+
+# Metrics are shared between Gunicorn workers through per-worker files
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default='/tmp/quizicle-metrics')
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Shared cache: Redis when REDIS_URL is set (needs the `redis` package), otherwise files
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default='/tmp/quizicle-cache'),
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+
+# Warm-up before Gunicorn forks workers; fab verify_deployment waits for the status file
+WARMUP_ON_START = config('WARMUP_ON_START', default=True, cast=bool)
+WARMUP_QUIZZES = config('WARMUP_QUIZZES', default=20, cast=int)
+WARMUP_STATUS_FILE = config('WARMUP_STATUS_FILE', default='/tmp/quizicle-warmup.json')
+
+# nginx passes the client address in X-Real-IP (quizicle-simple.conf)
+THROTTLE_IP_HEADER = config('THROTTLE_IP_HEADER', default='HTTP_X_REAL_IP')
 
 # Static files configuration with WhiteNoise
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
@@ -0,0 +1,164 @@
+"""
+Published quiz snapshots.
+
+A snapshot is one JSON document holding everything needed to take, grade and review a
+quiz. Quiz.current_snapshot points at the newest one, so those pages read a single
+joined row instead of the Question, Answer and Description tables. Snapshots are never
+modified; each attempt keeps a reference to the one it was graded against.
+"""
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from . import metrics
+from .models import Quiz, Question, QuizSnapshot
+
+
+PAGE_TIMEOUT = 24 * 60 * 60  # snapshots never change
+
+
+def _image_url(image):
+    return image.url if image else None
+
+
+def build_snapshot_data(quiz):
+    questions = Question.objects.filter(quiz=quiz).order_by('id').select_related(
+        'answer_description'
+    ).prefetch_related('answers')
+    data = []
+    for question in questions:
+        description = getattr(question, 'answer_description', None)
+        data.append({
+            'id': question.id,
+            'description': question.description,
+            'points': question.points_for_question,
+            'image': _image_url(question.image),
+            'answers': [
+                {'id': answer.id, 'answer': answer.answer, 'correct': answer.correct}
+                for answer in sorted(question.answers.all(), key=lambda a: a.id)
+            ],
+            'explanation': {
+                'text': description.text,
+                'image': _image_url(description.image),
+            } if description else None,
+        })
+    return {
+        'quiz': {
+            'id': quiz.id,
+            'name': quiz.quiz_name,
+            'description': quiz.description,
+            'question_count': len(data),
+            'max_points': sum(question['points'] for question in data),
+        },
+        'questions': data,
+    }
+
+
+def publish_snapshot(quiz):
+    """Store a new snapshot of the quiz's current content and make it the current one."""
+    data = build_snapshot_data(quiz)
+    for _ in range(3):
+        version = (QuizSnapshot.objects.filter(quiz=quiz).aggregate(last=Max('version'))['last'] or 0) + 1
+        try:
+            with transaction.atomic():
+                snapshot = QuizSnapshot.objects.create(quiz=quiz, version=version, data=data)
+        except IntegrityError:
+            # Another request published the same version first
+            continue
+        Quiz.objects.filter(pk=quiz.pk).update(current_snapshot=snapshot)
+        quiz.current_snapshot = snapshot
+        return snapshot
+    raise IntegrityError(f'Could not publish a snapshot for quiz {quiz.pk}')
+
+
+def get_snapshot(quiz):
+    """Current snapshot, built on first use for quizzes created before snapshots existed."""
+    return quiz.current_snapshot or publish_snapshot(quiz)
+
+
+def _public_question(question):
+    return {
+        'id': question['id'],
+        'description': question['description'],
+        'points': question['points'],
+        'image': question['image'],
+        'answers': [{'id': answer['id'], 'answer': answer['answer']} for answer in question['answers']],
+    }
+
+
+def public_data(snapshot):
+    """What a quiz taker may see before submitting: no correctness flags and no explanations."""
+    return {
+        'quiz': snapshot.data['quiz'],
+        'snapshot': snapshot.id,
+        'questions': [_public_question(question) for question in snapshot.data['questions']],
+    }
+
+
+def snapshot_page(snapshot_id, number, size):
+    """
+    Page `number` (clamped to the last one) of a snapshot split into pages of `size`
+    questions: {'number', 'pages', 'question_count', 'questions'} with questions in the
+    public_data() shape. Pages are cached separately, so serving one does not load the
+    rest of a large quiz.
+    """
+    def compute():
+        questions = QuizSnapshot.objects.values_list('data', flat=True).get(id=snapshot_id)['questions']
+        pages = max(1, -(-len(questions) // size))
+        return [
+            {
+                'number': index + 1,
+                'pages': pages,
+                'question_count': len(questions),
+                'questions': [_public_question(question) for question in questions[index * size:(index + 1) * size]],
+            }
+            for index in range(pages)
+        ]
+
+    key = f'snapshot:{snapshot_id}:page:{size}:{number}'
+    page = cache.get(key)
+    if page is None:
+        # One pass over the snapshot fills every page of it
+        pages = compute()
+        cache.set_many({f'snapshot:{snapshot_id}:page:{size}:{p["number"]}': p for p in pages}, PAGE_TIMEOUT)
+        page = pages[min(max(number, 1), len(pages)) - 1]
+        metrics.record_cache_lookup('snapshot_page', False)
+    else:
+        metrics.record_cache_lookup('snapshot_page', True)
+    return page
+
+
+def grade(snapshot, chosen):
+    """
+    Grade {question_id: answer_id} against a snapshot.
+    Returns (score, selections) where selections only keeps answers valid for their question.
+    """
+    score = 0
+    selections = {}
+    for question in snapshot.data['questions']:
+        answer_id = chosen.get(question['id'])
+        answer = next((a for a in question['answers'] if a['id'] == answer_id), None)
+        if answer is None:
+            continue
+        selections[str(question['id'])] = answer['id']
+        if answer['correct']:
+            score += question['points']
+    return score, selections
+
+
+def review(snapshot, selections):
+    """Per-question rows for the result page: the chosen and the correct answer plus explanation."""
+    rows = []
+    for question in snapshot.data['questions']:
+        chosen_id = selections.get(str(question['id']))
+        if chosen_id is None:
+            continue
+        answers = {answer['id']: answer for answer in question['answers']}
+        correct = next((a for a in question['answers'] if a['correct']), None)
+        rows.append({
+            'question': question,
+            'answer': answers.get(chosen_id),
+            'correct_answer': correct,
+        })
+    return rows
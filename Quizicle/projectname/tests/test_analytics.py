@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from projectname.analytics import compute_item_analysis, item_analysis
+from projectname.attempts import submit_attempt
+from projectname.models import QuizResultAnswer
+
+from .utils import LOCMEM_CACHES, chosen_answers, make_quiz, replace_answers
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ItemAnalysisTests(TestCase):
+    databases = {'default', 'sessions'}
+
+    def setUp(self):
+        cache.clear()
+        self.quiz = make_quiz(User.objects.create_user('creator'), [(2, [('Right', True), ('Wrong', False)])])
+        snapshot = self.quiz.current_snapshot
+        for name, pick in [('ann', 'Right'), ('bob', 'Wrong')]:
+            submit_attempt(self.quiz, User.objects.create_user(name), snapshot, chosen_answers(snapshot, pick))
+
+    def test_history_survives_an_edit(self):
+        replace_answers(self.quiz, [('New', True), ('Other', False)])
+        self.assertFalse(QuizResultAnswer.objects.filter(quiz_result__quiz=self.quiz).exists())
+
+        report = compute_item_analysis(self.quiz)
+
+        self.assertEqual(report['attempts'], 2)
+        self.assertEqual(report['score_distribution'], [1, 0, 1])
+        question, = report['questions']
+        self.assertEqual((question['answered'], question['difficulty']), (2, 0.5))
+        options = {option['answer']: (option['selected'], option['retired']) for option in question['options']}
+        self.assertEqual(options, {'Right': (1, True), 'Wrong': (1, True), 'New': (0, False), 'Other': (0, False)})
+
+        self.client.force_login(self.quiz.creator)
+        response = self.client.get(reverse('quiz_analytics', args=[self.quiz.id]))
+        self.assertContains(response, '(earlier version)', count=2)
+
+    def test_cached_report_costs_one_query(self):
+        item_analysis(self.quiz)
+        with self.assertNumQueries(1):
+            item_analysis(self.quiz)
@@ -0,0 +1,165 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from projectname.attempts import pending_answers
+from projectname.models import QuizAttempt, QuizResultAnswer, Results
+
+from .utils import LOCMEM_CACHES, chosen_answers, make_quiz, replace_answers
+
+
+def modify_form(answers):
+    """ModifyQuizView POST data keeping one question and recreating its answers."""
+    return {
+        'quiz_name': 'Quiz',
+        'questions[]': ['Question 1'],
+        'points[]': ['2'],
+        'all_answers[0][]': answers,
+        'correct_answer_0': '0',
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaleSnapshotTests(TestCase):
+    databases = {'default', 'sessions'}
+
+    def setUp(self):
+        self.creator = User.objects.create_user('creator')
+        self.player = User.objects.create_user('player')
+        self.quiz = make_quiz(self.creator, [(2, [('Right', True), ('Wrong', False)])])
+
+    def modify_quiz(self):
+        self.client.force_login(self.creator)
+        response = self.client.post(reverse('modify_quiz', args=[self.quiz.id]), modify_form(['New', 'Other']))
+        self.assertEqual(response.status_code, 302)
+        self.client.logout()
+
+    def test_api_grades_against_a_snapshot_older_than_an_edit(self):
+        old_snapshot = self.quiz.current_snapshot
+        answers = chosen_answers(old_snapshot, 'Right')
+        self.modify_quiz()
+
+        self.client.force_login(self.player)
+        response = self.client.post(
+            reverse('quiz_submit', args=[self.quiz.id]),
+            json.dumps({'snapshot': old_snapshot.id, 'answers': answers}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['score'], 2)
+        result = Results.objects.get(id=response.json()['result_id'])
+        # The picks are kept; only the rows for answers that no longer exist are skipped
+        self.assertEqual(result.selections, {str(q): a for q, a in answers.items()})
+        self.assertFalse(QuizResultAnswer.objects.filter(quiz_result=result).exists())
+
+    def test_api_rejects_a_malformed_snapshot_id(self):
+        self.client.force_login(self.player)
+        for snapshot in ['abc', [1], {}]:
+            response = self.client.post(
+                reverse('quiz_submit', args=[self.quiz.id]),
+                json.dumps({'snapshot': snapshot, 'answers': {}}),
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 400, snapshot)
+        self.assertFalse(Results.objects.exists())
+
+    def test_form_is_graded_against_the_snapshot_it_was_rendered_from(self):
+        self.client.force_login(self.player)
+        response = self.client.get(reverse('take_quiz', args=[self.quiz.id]))
+        snapshot_id = response.context['snapshot_id']
+        answers = chosen_answers(self.quiz.current_snapshot, 'Right')
+        self.modify_quiz()
+
+        self.client.force_login(self.player)
+        form = {'snapshot': snapshot_id, **{f'question_{q}': a for q, a in answers.items()}}
+        response = self.client.post(reverse('take_quiz', args=[self.quiz.id]), form)
+
+        self.assertRedirects(response, reverse('quiz_result', args=[self.quiz.id, 2]), fetch_redirect_response=False)
+        result = Results.objects.get(quiz=self.quiz, user='player')
+        self.assertEqual(result.snapshot_id, snapshot_id)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, TAKE_QUIZ_PAGE_SIZE=1)
+class PagedAttemptTests(TestCase):
+    databases = {'default', 'sessions'}
+
+    def test_quiz_edited_between_pages(self):
+        creator = User.objects.create_user('creator')
+        player = User.objects.create_user('player')
+        quiz = make_quiz(creator, [(2, [('Right', True), ('Wrong', False)])] * 2)
+        answers = chosen_answers(quiz.current_snapshot, 'Right')
+        first, second = sorted(answers)
+
+        self.client.force_login(player)
+        response = self.client.get(reverse('take_quiz', args=[quiz.id]))
+        self.assertRedirects(response, reverse('take_quiz_page', args=[quiz.id, 1]))
+        self.client.post(reverse('take_quiz_page', args=[quiz.id, 1]), {f'question_{first}': answers[first]})
+
+        self.client.force_login(creator)
+        form = modify_form(['New', 'Other'])
+        form.update({'questions[]': ['Question 1', 'Question 2'], 'points[]': ['2', '2'],
+                     'all_answers[1][]': ['New', 'Other'], 'correct_answer_1': '0'})
+        self.client.post(reverse('modify_quiz', args=[quiz.id]), form)
+
+        self.client.force_login(player)
+        response = self.client.post(
+            reverse('take_quiz_page', args=[quiz.id, 2]), {f'question_{second}': answers[second], 'action': 'finish'},
+        )
+
+        # Graded against the snapshot the attempt started with
+        self.assertRedirects(response, reverse('quiz_result', args=[quiz.id, 4]), fetch_redirect_response=False)
+        result = Results.objects.get(quiz=quiz, user='player')
+        self.assertEqual(result.selections, {str(q): a for q, a in answers.items()})
+        self.assertFalse(QuizResultAnswer.objects.filter(quiz_result=result).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AUTOSAVE_FLUSH_INTERVAL=60)
+class AutosaveTests(TestCase):
+    databases = {'default', 'sessions'}
+
+    def setUp(self):
+        cache.clear()
+        self.player = User.objects.create_user('player')
+        self.quiz = make_quiz(User.objects.create_user('creator'), [(1, [('Right', True), ('Wrong', False)])] * 2)
+        self.answers = chosen_answers(self.quiz.current_snapshot, 'Right')
+        self.first, self.second = sorted(self.answers)
+        self.client.force_login(self.player)
+
+    def autosave(self, question_id, **extra):
+        return self.client.post(
+            reverse('autosave_attempt', args=[self.quiz.id]),
+            {f'question_{question_id}': self.answers[question_id], **extra},
+        ).json()
+
+    def stored_answers(self):
+        return QuizAttempt.objects.get(quiz=self.quiz, user=self.player).answers
+
+    def test_final_autosave_is_written_within_the_flush_interval(self):
+        self.assertTrue(self.autosave(self.first)['flushed'])
+        self.assertTrue(self.autosave(self.second, final='1')['flushed'])
+        self.assertEqual(self.stored_answers(), {str(q): a for q, a in self.answers.items()})
+
+    def test_autosave_starts_the_attempt_on_the_rendered_snapshot(self):
+        snapshot_id = self.quiz.current_snapshot_id
+        replace_answers(self.quiz, [('Right', True), ('Wrong', False)])
+        self.assertNotEqual(self.quiz.current_snapshot_id, snapshot_id)
+
+        self.autosave(self.first, snapshot=snapshot_id)
+
+        attempt = QuizAttempt.objects.get(quiz=self.quiz, user=self.player)
+        self.assertEqual(attempt.snapshot_id, snapshot_id)
+
+    def test_resume_writes_pending_autosaves(self):
+        self.autosave(self.first)
+        self.assertFalse(self.autosave(self.second)['flushed'])
+        self.assertNotIn(str(self.second), self.stored_answers())
+
+        response = self.client.get(reverse('take_quiz', args=[self.quiz.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stored_answers(), {str(q): a for q, a in self.answers.items()})
+        self.assertEqual(pending_answers(self.quiz.id, self.player.id), {})
@@ -0,0 +1,54 @@
+import io
+import json
+import zipfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from projectname.bundles import BUNDLE_ENTRY, import_bundle
+from projectname.models import Answer, Question, Quiz
+
+from .utils import LOCMEM_CACHES
+
+
+def make_bundle(records):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(BUNDLE_ENTRY, ''.join(json.dumps(record) + '\n' for record in records))
+    buffer.seek(0)
+    return buffer
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BundleImportTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user('creator')
+
+    def test_trailing_parents_without_children_are_written(self):
+        bundle = make_bundle([
+            {'type': 'quiz', 'id': 1, 'quiz_name': 'First'},
+            {'type': 'question', 'id': 10, 'quiz': 1, 'description': 'Q1', 'points': 2},
+            {'type': 'answer', 'question': 10, 'answer': 'A', 'correct': True},
+            {'type': 'question', 'id': 11, 'quiz': 1, 'description': 'Q2', 'points': 3},
+            {'type': 'quiz', 'id': 2, 'quiz_name': 'Empty'},
+        ])
+        counts = import_bundle(bundle, self.creator, batch_size=50)
+
+        self.assertEqual(counts, {'quiz': 2, 'question': 2, 'answer': 1, 'description': 0})
+        self.assertEqual(Quiz.objects.filter(creator=self.creator).count(), 2)
+        self.assertEqual(Question.objects.filter(quiz__creator=self.creator).count(), 2)
+        self.assertEqual(Answer.objects.filter(question__quiz__creator=self.creator).count(), 1)
+        first = Quiz.objects.get(quiz_name='First')
+        self.assertEqual((first.question_count, first.quiz_maximum_points), (2, 5))
+        self.assertTrue(Quiz.objects.filter(quiz_name='Empty', question_count=0).exists())
+
+    def test_counts_match_rows_across_batches(self):
+        records = [{'type': 'quiz', 'id': 1, 'quiz_name': 'Big'}]
+        records += [
+            {'type': 'question', 'id': 100 + i, 'quiz': 1, 'description': f'Q{i}', 'points': 1}
+            for i in range(7)
+        ]
+        counts = import_bundle(make_bundle(records), self.creator, batch_size=3)
+
+        self.assertEqual(counts['question'], 7)
+        self.assertEqual(Question.objects.filter(quiz__quiz_name='Big').count(), 7)
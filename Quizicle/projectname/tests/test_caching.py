@@ -0,0 +1,47 @@
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from projectname import caching
+
+
+class FileCacheLockTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name,
+        }})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_lock_is_exclusive_until_released(self):
+        release = caching._try_lock('page:lock')
+        self.assertIsNotNone(release)
+        self.assertIsNone(caching._try_lock('page:lock'))
+        release()
+        caching._try_lock('page:lock')()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return 'value'
+
+        values = []
+        threads = [
+            threading.Thread(target=lambda: values.append(caching.get_or_compute('page', compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(values, ['value'] * 8)
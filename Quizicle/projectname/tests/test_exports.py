@@ -0,0 +1,29 @@
+import csv
+import io
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from projectname.attempts import submit_attempt
+from projectname.exports import iter_results_csv
+
+from .utils import LOCMEM_CACHES, chosen_answers, make_quiz, replace_answers
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResultsExportTests(TestCase):
+    def test_answers_of_attempts_before_an_edit_are_kept(self):
+        creator = User.objects.create_user('creator')
+        player = User.objects.create_user('player')
+        quiz = make_quiz(creator, [(2, [('Old right', True), ('Old wrong', False)])])
+        old_snapshot = quiz.current_snapshot
+        submit_attempt(quiz, player, old_snapshot, chosen_answers(old_snapshot, 'Old right'))
+
+        quiz = replace_answers(quiz, [('New right', True), ('New wrong', False)])
+        submit_attempt(quiz, player, quiz.current_snapshot, chosen_answers(quiz.current_snapshot, 'New wrong'))
+
+        rows = list(csv.reader(io.StringIO(''.join(iter_results_csv(quiz)))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][2:4], ['2', '2'])
+        self.assertEqual(rows[1][5], 'Old right')
+        self.assertEqual(rows[2][5], 'New wrong')
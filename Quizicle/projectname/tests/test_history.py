@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from projectname import history
+from projectname.attempts import submit_attempt
+from projectname.caching import user_version
+from projectname.models import Quiz, ResultSummary, Results
+
+from .utils import LOCMEM_CACHES, chosen_answers, make_quiz
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResultSummaryTests(TestCase):
+    def setUp(self):
+        self.player = User.objects.create_user('player')
+        self.quiz = make_quiz(User.objects.create_user('creator'), [(2, [('Right', True), ('Wrong', False)])])
+        snapshot = self.quiz.snapshots.get()
+        self.results = [
+            submit_attempt(self.quiz, self.player, snapshot, chosen_answers(snapshot, pick))
+            for pick in ['Wrong', 'Right', 'Wrong']
+        ]
+
+    def summary(self):
+        return ResultSummary.objects.values_list(
+            'attempts', 'total_score', 'best_score', 'last_score', 'last_result_id'
+        ).get(user=self.player, quiz=self.quiz)
+
+    def test_deleting_the_last_attempt_recounts_the_summary(self):
+        version = user_version(self.player.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.results[2].delete()
+        self.assertEqual(self.summary(), (2, 2, 2, 2, self.results[1].id))
+        self.assertGreater(user_version(self.player.id), version)
+
+    def test_deleting_every_attempt_drops_the_summary(self):
+        Results.objects.filter(user=self.player.username).delete()
+        self.assertFalse(ResultSummary.objects.filter(user=self.player).exists())
+        self.assertEqual(history.summaries(self.player), ([], None))
+
+    def test_deleting_the_quiz_deletes_the_summary(self):
+        Quiz.objects.filter(pk=self.quiz.pk).delete()
+        self.assertFalse(ResultSummary.objects.exists())
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from projectname import leaderboard
+from projectname.attempts import submit_attempt
+from projectname.models import LeaderboardEntry, Results
+
+from .utils import LOCMEM_CACHES, chosen_answers, make_quiz
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecordScoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('player', password='pw')
+        self.quiz = make_quiz(self.user, [(1, [('yes', True), ('no', False)])])
+
+    def test_first_score_creates_entry(self):
+        leaderboard.record_score(self.quiz, self.user, 1, timezone.now())
+        self.assertEqual(LeaderboardEntry.objects.get(quiz=self.quiz, user=self.user).best_score, 1)
+        self.assertEqual(leaderboard.rank(self.quiz, self.user), (1, 1, 1))
+
+    def test_better_score_replaces_best(self):
+        leaderboard.record_score(self.quiz, self.user, 1, timezone.now())
+        leaderboard.record_score(self.quiz, self.user, 3, timezone.now())
+        self.assertEqual(leaderboard.rank(self.quiz, self.user), (1, 3, 1))
+
+    def test_lower_score_keeps_best(self):
+        leaderboard.record_score(self.quiz, self.user, 3, timezone.now())
+        leaderboard.record_score(self.quiz, self.user, 2, timezone.now())
+        self.assertEqual(LeaderboardEntry.objects.get(quiz=self.quiz, user=self.user).best_score, 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DeletionTests(TestCase):
+    def setUp(self):
+        self.quiz = make_quiz(User.objects.create_user('creator'), [(2, [('Right', True), ('Wrong', False)])])
+        snapshot = self.quiz.snapshots.get()
+        self.a = User.objects.create_user('a')
+        self.b = User.objects.create_user('b')
+        for user, pick in [(self.a, 'Right'), (self.b, 'Right'), (self.b, 'Wrong')]:
+            submit_attempt(self.quiz, user, snapshot, chosen_answers(snapshot, pick))
+
+    def test_deleting_a_user_removes_their_entry(self):
+        self.a.delete()
+        self.assertEqual(leaderboard.rank(self.quiz, self.b), (1, 2, 1))
+        self.assertEqual([entry.user for entry in leaderboard.top(self.quiz)], [self.b])
+
+    def test_deleting_the_best_result_lowers_the_best_score(self):
+        Results.objects.filter(user='b', result=2).delete()
+        self.assertEqual(leaderboard.rank(self.quiz, self.b), (2, 0, 2))
+        self.assertEqual(leaderboard.rank(self.quiz, self.a), (1, 2, 2))
+
+    def test_deleting_every_result_unranks_the_user(self):
+        Results.objects.filter(user='b').delete()
+        self.assertIsNone(leaderboard.rank(self.quiz, self.b))
+        self.assertEqual(leaderboard.rank(self.quiz, self.a), (1, 2, 1))
+        self.assertEqual([entry.user for entry in leaderboard.top(self.quiz)], [self.a])
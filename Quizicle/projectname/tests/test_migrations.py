@@ -0,0 +1,118 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MigrationTestCase(TransactionTestCase):
+    """Migrates back to `migrate_from`, lets setUpData() add rows, then migrates to `migrate_to`."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('projectname', self.migrate_from)])
+        self.setUpData(executor.loader.project_state([('projectname', self.migrate_from)]).apps)
+        executor = MigrationExecutor(connection)
+        executor.migrate([('projectname', self.migrate_to)])
+        self.apps = executor.loader.project_state([('projectname', self.migrate_to)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def setUpData(self, apps):
+        pass
+
+
+class CounterAndLeaderboardBackfillTests(MigrationTestCase):
+    migrate_from = '0024_results_created_at'
+    migrate_to = '0026_leaderboard'
+
+    def setUpData(self, apps):
+        User = apps.get_model('auth', 'User')
+        Quiz = apps.get_model('projectname', 'Quiz')
+        Question = apps.get_model('projectname', 'Question')
+        Answer = apps.get_model('projectname', 'Answer')
+        Results = apps.get_model('projectname', 'Results')
+        QuizResultAnswer = apps.get_model('projectname', 'QuizResultAnswer')
+
+        creator = User.objects.create(username='creator')
+        User.objects.create(username='ann')
+        User.objects.create(username='bob')
+        quiz = Quiz.objects.create(quiz_name='Quiz', creator=creator)
+        question = Question.objects.create(quiz=quiz, description='Q', points_for_question=1)
+        right = Answer.objects.create(question=question, answer='right', correct=True)
+        wrong = Answer.objects.create(question=question, answer='wrong')
+        now = timezone.now()
+        for user, score, answer in [('ann', 0, wrong), ('ann', 1, right), ('bob', 1, right), ('gone', 1, right)]:
+            result = Results.objects.create(quiz=quiz, user=user, result=score, created_at=now)
+            QuizResultAnswer.objects.create(quiz_result=result, question=question, answer=answer)
+        self.answers = {'right': right.id, 'wrong': wrong.id}
+
+    def test_history_is_counted(self):
+        AnswerSelectionCounter = self.apps.get_model('projectname', 'AnswerSelectionCounter')
+        LeaderboardEntry = self.apps.get_model('projectname', 'LeaderboardEntry')
+        LeaderboardScore = self.apps.get_model('projectname', 'LeaderboardScore')
+
+        counts = dict(AnswerSelectionCounter.objects.values_list('answer_id', 'selections'))
+        self.assertEqual(counts, {self.answers['right']: 3, self.answers['wrong']: 1})
+        self.assertEqual(
+            sorted(LeaderboardEntry.objects.values_list('user__username', 'best_score')),
+            [('ann', 1), ('bob', 1)],
+        )
+        self.assertEqual(list(LeaderboardScore.objects.values_list('score', 'players')), [(1, 2)])
+
+
+class QuizTotalsBackfillTests(MigrationTestCase):
+    migrate_from = '0030_result_summary'
+    migrate_to = '0031_recount_quiz_totals'
+
+    def setUpData(self, apps):
+        User = apps.get_model('auth', 'User')
+        Quiz = apps.get_model('projectname', 'Quiz')
+        Question = apps.get_model('projectname', 'Question')
+
+        creator = User.objects.create(username='creator')
+        # Historical models have no signals, so the totals stay at their defaults like
+        # quizzes saved through calculate_max_values()
+        self.quiz = Quiz.objects.create(quiz_name='Quiz', creator=creator)
+        Question.objects.create(quiz=self.quiz, description='Q1', points_for_question=2)
+        Question.objects.create(quiz=self.quiz, description='Q2', points_for_question=3)
+        self.empty = Quiz.objects.create(quiz_name='Empty', creator=creator)
+
+    def test_totals_are_recounted(self):
+        Quiz = self.apps.get_model('projectname', 'Quiz')
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.assertEqual((quiz.question_count, quiz.quiz_maximum_points), (2, 5))
+        self.assertEqual(quiz.version, self.quiz.version + 1)
+        empty = Quiz.objects.get(pk=self.empty.pk)
+        self.assertEqual((empty.question_count, empty.quiz_maximum_points, empty.version),
+                         (0, 0, self.empty.version))
+
+
+class ResultSummaryBackfillTests(MigrationTestCase):
+    migrate_from = '0029_quizattempt'
+    migrate_to = '0030_result_summary'
+
+    def setUpData(self, apps):
+        User = apps.get_model('auth', 'User')
+        Quiz = apps.get_model('projectname', 'Quiz')
+        Results = apps.get_model('projectname', 'Results')
+
+        creator = User.objects.create(username='creator')
+        User.objects.create(username='ann')
+        self.quiz = Quiz.objects.create(quiz_name='Quiz', creator=creator)
+        now = timezone.now()
+        for user, score in [('ann', 2), ('ann', 4), ('ann', 3), ('gone', 1)]:
+            Results.objects.create(quiz=self.quiz, user=user, result=score, created_at=now)
+        self.ann_last = Results.objects.filter(user='ann').order_by('-id').first()
+
+    def test_history_is_summarised(self):
+        ResultSummary = self.apps.get_model('projectname', 'ResultSummary')
+        self.assertEqual(list(ResultSummary.objects.values_list(
+            'user__username', 'quiz_id', 'attempts', 'total_score', 'best_score', 'last_score', 'last_result_id',
+        )), [('ann', self.quiz.id, 3, 9, 4, 3, self.ann_last.id)])
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from projectname import views
+from projectname.models import Answer, Question, Quiz
+
+from .utils import LOCMEM_CACHES
+
+
+def locked_once(func):
+    """Wrap func so its first call fails like a write that lost the SQLite lock."""
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('database is locked')
+        return func(*args, **kwargs)
+    return wrapper
+
+
+# write_transaction() only retries the outermost transaction, so no TestCase wrapping here
+@override_settings(CACHES=LOCMEM_CACHES)
+class RetriedWriteTests(TransactionTestCase):
+    databases = {'default', 'sessions'}
+
+    def setUp(self):
+        self.creator = User.objects.create_user('creator')
+        self.client.force_login(self.creator)
+
+    def quiz_form(self, name):
+        return {
+            'quiz_name': name,
+            'description': 'About it',
+            'questions[]': ['First', 'Second'],
+            'points[]': ['2', '3'],
+            'all_answers[0][]': ['Yes', 'No'],
+            'all_answers[1][]': ['Yes', 'No'],
+            'correct_answer_0': '0',
+            'correct_answer_1': '1',
+        }
+
+    def test_create_quiz_is_retried_after_a_lock_error(self):
+        with mock.patch.object(views, 'publish_snapshot', locked_once(views.publish_snapshot)):
+            response = self.client.post(reverse('create_quiz'), self.quiz_form('Created'))
+
+        self.assertRedirects(response, reverse('quiz_list'), fetch_redirect_response=False)
+        quiz = Quiz.objects.get(creator=self.creator)
+        self.assertEqual((quiz.question_count, quiz.quiz_maximum_points), (2, 5))
+        self.assertIsNotNone(quiz.current_snapshot_id)
+        self.assertEqual(Question.objects.count(), 2)
+        self.assertEqual(Answer.objects.count(), 4)
+
+    def test_modify_quiz_is_retried_after_a_lock_error(self):
+        self.client.post(reverse('create_quiz'), self.quiz_form('Created'))
+        quiz = Quiz.objects.get(creator=self.creator)
+        form = self.quiz_form('Renamed')
+        form.update({'questions[]': ['Only'], 'points[]': ['4']})
+
+        with mock.patch.object(views, 'publish_snapshot', locked_once(views.publish_snapshot)):
+            response = self.client.post(reverse('modify_quiz', args=[quiz.id]), form)
+
+        self.assertRedirects(response, reverse('quiz_list'), fetch_redirect_response=False)
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.quiz_name, quiz.question_count, quiz.quiz_maximum_points), ('Renamed', 1, 4))
+        self.assertEqual(quiz.current_snapshot.data['quiz']['max_points'], 4)
@@ -0,0 +1,56 @@
+from django.core.cache.backends.redis import RedisCache
+from django.test import SimpleTestCase, override_settings
+
+from projectname import throttling
+
+
+class FakeScript:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, keys, args, client):
+        self.calls.append((keys, args))
+        return '0'
+
+
+class FakeClient:
+    script = None
+
+    def get_client(self, write=False):
+        return self
+
+    def register_script(self, source):
+        FakeClient.script = FakeScript()
+        return FakeClient.script
+
+
+class FakeRedisCache(RedisCache):
+    """RedisCache whose client records script calls instead of talking to a server."""
+
+    @property
+    def _cache(self):
+        return FakeClient()
+
+    def get_many(self, keys, version=None):
+        raise AssertionError('Buckets must be taken by the Lua script')
+
+    def set_many(self, data, timeout=None, version=None):
+        raise AssertionError('Buckets must be taken by the Lua script')
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'projectname.tests.test_throttling.FakeRedisCache', 'LOCATION': 'redis://fake',
+}})
+class RedisThrottleTests(SimpleTestCase):
+    def setUp(self):
+        throttling._script = None
+        self.addCleanup(setattr, throttling, '_script', None)
+
+    def test_buckets_are_taken_by_one_script_call(self):
+        keys = [('throttle:submit:user:1', 10, 10 / 60), ('throttle:submit:ip:1.2.3.4', 30, 0.5)]
+
+        self.assertEqual(throttling.take(keys), 0.0)
+
+        (redis_keys, args), = FakeClient.script.calls
+        self.assertEqual(redis_keys, [':1:throttle:submit:user:1', ':1:throttle:submit:ip:1.2.3.4'])
+        self.assertEqual(args[1:], [10, 10 / 60, 30, 0.5])
@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from projectname.caching import catalog_version, quiz_page_version
+from projectname.models import Quiz
+
+from .utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VersionBumpTests(TestCase):
+    def test_versions_are_bumped_after_the_commit(self):
+        quiz = Quiz.objects.create(quiz_name='Quiz', creator=User.objects.create_user('creator'))
+        catalog, page = catalog_version(), quiz_page_version(quiz.pk)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            quiz.touch()
+            # A reader caching the old content now would still use the old versions
+            self.assertEqual((catalog_version(), quiz_page_version(quiz.pk)), (catalog, page))
+
+        self.assertEqual(len(callbacks), 2)
+        self.assertGreater(catalog_version(), catalog)
+        self.assertGreater(quiz_page_version(quiz.pk), page)
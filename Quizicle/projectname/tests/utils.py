@@ -0,0 +1,39 @@
+from projectname.models import Answer, Question, Quiz
+from projectname.snapshots import publish_snapshot
+
+
+# Tests must not touch the shared file cache of a development checkout
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_quiz(creator, questions, name='Quiz'):
+    """Quiz with a published snapshot; questions are [(points, [(answer text, correct), ...])]."""
+    quiz = Quiz.objects.create(quiz_name=name, creator=creator)
+    for index, (points, answers) in enumerate(questions, start=1):
+        question = Question.objects.create(quiz=quiz, description=f'Question {index}', points_for_question=points)
+        Answer.objects.bulk_create([
+            Answer(question=question, answer=text, correct=correct) for text, correct in answers
+        ])
+    publish_snapshot(quiz)
+    quiz.refresh_from_db()
+    return quiz
+
+
+def replace_answers(quiz, answers):
+    """Recreate every question's answers like ModifyQuizView does, then publish a new snapshot."""
+    for question in quiz.questions.order_by('id'):
+        question.answers.all().delete()
+        Answer.objects.bulk_create([
+            Answer(question=question, answer=text, correct=correct) for text, correct in answers
+        ])
+    publish_snapshot(quiz)
+    quiz.refresh_from_db()
+    return quiz
+
+
+def chosen_answers(snapshot, picks):
+    """{question_id: answer_id} picking the answer with the given text on every question."""
+    return {
+        question['id']: next(answer['id'] for answer in question['answers'] if answer['answer'] == picks)
+        for question in snapshot.data['questions']
+    }
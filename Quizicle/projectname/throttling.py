@@ -0,0 +1,123 @@
+"""
+Token-bucket rate limits for write-heavy views, used by ThrottleMiddleware.
+
+THROTTLES maps a URL name to rates such as {'user': '10/m', 'ip': '30/m'}: a logged-in
+user gets a bucket of 10 tokens refilled at 10 a minute, every client IP one of 30.
+A request takes one token from each of its buckets and is rejected, without touching
+any bucket, when one of them is empty.
+
+Buckets live in the shared cache. With the Redis backend all buckets of a request are
+checked and updated by one Lua script, atomically and in a single round trip; other
+backends (file-based in development) read them with get_many() and write them back
+with set_many().
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS: bucket keys; ARGV: now, then capacity and refill rate (tokens/s) for every key.
+# Returns the seconds to wait as a string (Lua numbers become integers in replies).
+TOKEN_BUCKET_LUA = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated) * rate)
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+    tokens[i] = available
+end
+if wait == 0 then
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2])
+        local rate = tonumber(ARGV[i * 2 + 1])
+        redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+end
+return tostring(wait)
+"""
+
+_script = None
+
+
+def parse_rate(rate):
+    """'10/m' -> (capacity 10, refill 10/60 tokens per second)."""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period[:1] or 's']
+
+
+def client_ip(request):
+    # Behind nginx REMOTE_ADDR is the proxy; THROTTLE_IP_HEADER names the header it sets
+    header = getattr(settings, 'THROTTLE_IP_HEADER', None)
+    forwarded = request.META.get(header, '') if header else ''
+    return forwarded.split(',')[0].strip() or request.META.get('REMOTE_ADDR', '')
+
+
+def buckets(request, url_name, rates):
+    """[(cache key, capacity, refill rate)] that apply to this request."""
+    result = []
+    if 'user' in rates and request.user.is_authenticated:
+        result.append((f'throttle:{url_name}:user:{request.user.pk}', *parse_rate(rates['user'])))
+    if 'ip' in rates:
+        result.append((f'throttle:{url_name}:ip:{client_ip(request)}', *parse_rate(rates['ip'])))
+    return result
+
+
+def _take_redis(backend, keys, now):
+    global _script
+    client = backend._cache.get_client(write=True)
+    if _script is None:
+        # EVALSHA after the first call; the script is only sent again if Redis lost it
+        _script = client.register_script(TOKEN_BUCKET_LUA)
+    args = [now]
+    for _, capacity, rate in keys:
+        args += [capacity, rate]
+    redis_keys = [backend.make_and_validate_key(key) for key, _, _ in keys]
+    return float(_script(keys=redis_keys, args=args, client=client))
+
+
+def _take_generic(keys, now):
+    states = cache.get_many([key for key, _, _ in keys])
+    tokens = {}
+    wait = 0.0
+    for key, capacity, rate in keys:
+        available, updated = states.get(key, (capacity, now))
+        available = min(capacity, available + max(0.0, now - updated) * rate)
+        if available < 1:
+            wait = max(wait, (1 - available) / rate)
+        tokens[key] = available
+    if not wait:
+        timeout = max(math.ceil(capacity / rate) + 1 for _, capacity, rate in keys)
+        cache.set_many({key: (available - 1, now) for key, available in tokens.items()}, timeout)
+    return wait
+
+
+def take(keys):
+    """Take a token from every bucket; returns 0 when allowed, else the seconds until it would be."""
+    if not keys:
+        return 0.0
+    now = time.time()
+    # `cache` is a proxy to the backend, so check the backend itself
+    backend = caches['default']
+    if isinstance(backend, RedisCache):
+        return _take_redis(backend, keys, now)
+    return _take_generic(keys, now)
+
+
+def retry_after(wait):
+    return max(1, math.ceil(wait))
@@ -42,18 +42,29 @@ urlpatterns = [
     path('well-done/', views.well_done, name='well_done'),
     path('create_quiz/', views.QuizCreateView.as_view(), name='create_quiz'),
     path('my-quizzes/', views.QuizListView.as_view(), name='quiz_list'),
+    path('my-quizzes/export/', views.export_quizzes, name='export_quizzes'),
+    path('my-quizzes/import/', views.import_quizzes, name='import_quizzes'),
     path('quizzes/', views.QuizPublicList.as_view(), name='quiz_public_list'),
     path('quiz/<int:quiz_id>/take/', views.TakeQuizView.as_view(), name='take_quiz'),
+    path('quiz/<int:quiz_id>/take/<int:page>/', views.TakeQuizPageView.as_view(), name='take_quiz_page'),
+    path('quiz/<int:quiz_id>/take/autosave/', views.autosave_attempt, name='autosave_attempt'),
+    path('api/quiz/<int:quiz_id>/', views.quiz_payload, name='quiz_payload'),
+    path('api/quiz/<int:quiz_id>/submit/', views.quiz_submit, name='quiz_submit'),
     path('quiz_result/<int:quiz_id>/<int:score>/', views.QuizResultView.as_view(), name='quiz_result'),
     path('my-results/', UserResultsView.as_view(), name='user_results'),
+    path('my-results/<int:quiz_id>/', views.user_quiz_results, name='user_quiz_results'),
     path('quiz/<int:pk>/delete/', QuizDeleteView.as_view(), name='quiz_delete'),
     path('quiz/<int:quiz_id>/modify/', ModifyQuizView.as_view(), name='modify_quiz'),
+    path('quiz/<int:quiz_id>/results.csv', views.export_quiz_results, name='export_quiz_results'),
+    path('quiz/<int:quiz_id>/analytics/', views.quiz_analytics, name='quiz_analytics'),
+    path('quiz/<int:quiz_id>/leaderboard/', views.quiz_leaderboard, name='quiz_leaderboard'),
     path('popular-quizzes/', PopularQuizView.as_view(), name='popular_quizzes'),
     path('quiz/details/<int:pk>/', QuizDetailView.as_view(), name='quiz_details'),
     path('report/<int:quiz_id>/', ReportCreateView.as_view(), name='report_quiz'),
     path('profile/', user_profile, name='user_profile'),
     path('comment/delete/<int:pk>/', DeleteCommentView.as_view(), name='delete_comment'),
     path('banned/', banned_page, name='banned_page'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,24 +1,45 @@
+import json
+
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import View, ListView, DetailView, CreateView, DeleteView, TemplateView
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_POST
 from django.db.models import Max
-from django.db import models
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.models import User
 from django.db.models import Count
-from django.http import JsonResponse
-from django.db import connection
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from django.utils import timezone
+from django.db import OperationalError
 
-from .models import Quiz, Question, Answer, Results, Report, Comment, Description, QuizResultAnswer
+from .models import Quiz, Question, Answer, Results, Report, Comment, Description, QuizResultAnswer, QuizSnapshot, QuizAttempt
 from .forms import QuizForm, CommentForm, ReportForm
+from . import metrics
+from .bundles import BundleError, import_bundle, stream_bundle
+from .exports import iter_results_csv
+from .analytics import item_analysis
+from .counters import answer_distribution
+from .conditional import quiz_etag, quiz_last_modified, catalog_etag, catalog_last_modified, popular_etag, snapshot_etag, take_etag
+from . import history, leaderboard
+from .snapshots import get_snapshot, publish_snapshot, public_data, review, snapshot_page
+from .caching import get_or_compute, catalog_key, quiz_key, user_key
+from .attempts import (
+    autosave, discard_attempt, finish_attempt, flush_pending, keep_answers, open_attempt, save_page, saved_answers,
+    submit_attempt,
+)
+from .retries import write_transaction
+
+
+BUSY_MESSAGE = 'The server is busy right now. Please try again in a moment.'
 
 
 def register(request):
@@ -51,17 +72,25 @@ class QuizCreateView(CreateView):
     success_url = reverse_lazy('quiz_list')
 
     def form_valid(self, form):
+        try:
+            write_transaction(lambda: self._create_quiz(form), 'create_quiz')
+        except OperationalError:
+            messages.error(self.request, BUSY_MESSAGE)
+            return self.form_invalid(form)
+        return redirect(self.success_url)
+
+    def _create_quiz(self, form):
         quiz = form.save(commit=False)
+        # Retried after a lock error: the rolled-back INSERT left its pk on form.instance
+        quiz.pk = None
+        quiz._state.adding = True
         quiz.creator = self.request.user
         quiz.save()
 
+        # Question signals keep question_count and quiz_maximum_points up to date
         self._save_questions_and_answers(quiz)
-
-        quiz.question_count = quiz.questions.count()
-        quiz.quiz_maximum_points = quiz.questions.aggregate(total=models.Sum('points_for_question'))['total'] or 0
-        quiz.save()
-
-        return redirect(self.success_url)
+        publish_snapshot(quiz)
+        return quiz
 
     def _save_questions_and_answers(self, quiz):
         request = self.request
@@ -120,55 +149,303 @@ class QuizListView(LoginRequiredMixin, ListView):
         return base_queryset.filter(quiz_name__icontains=query) if query else base_queryset
 
 
+@login_required
+def export_quizzes(request):
+    """Stream the user's quizzes (or the ?quiz= ids among them) as a bundle zip."""
+    quizzes = Quiz.objects.filter(creator=request.user)
+    quiz_ids = [int(pk) for pk in request.GET.getlist('quiz') if pk.isdigit()]
+    if quiz_ids:
+        quizzes = quizzes.filter(id__in=quiz_ids)
+    response = StreamingHttpResponse(stream_bundle(quizzes), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="quizicle-bundle.zip"'
+    return response
+
+
+@login_required
+def import_quizzes(request):
+    if request.method == 'POST':
+        bundle = request.FILES.get('bundle')
+        if not bundle:
+            messages.error(request, 'Choose a bundle file to import.')
+        else:
+            try:
+                counts = import_bundle(bundle, request.user)
+            except BundleError as e:
+                messages.error(request, f'Import failed: {e}')
+            else:
+                messages.success(request, f"Imported {counts['quiz']} quizzes with {counts['question']} questions.")
+                return redirect('quiz_list')
+    return render(request, 'import_quizzes.html')
+
+
+@login_required
+def export_quiz_results(request, quiz_id):
+    """Stream every attempt on the quiz as CSV; creator and superusers only."""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if quiz.creator != request.user and not request.user.is_superuser:
+        return HttpResponse('Forbidden', status=403)
+    response = StreamingHttpResponse(iter_results_csv(quiz), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="quiz-{quiz.id}-results.csv"'
+    return response
+
+
+@login_required
+def quiz_analytics(request, quiz_id):
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if quiz.creator != request.user and not request.user.is_superuser:
+        return redirect('quiz_details', pk=quiz.id)
+    return render(request, 'quiz_analytics.html', {'quiz': quiz, 'report': item_analysis(quiz)})
+
+
+def quiz_leaderboard(request, quiz_id):
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    context = {
+        'quiz': quiz,
+        'entries': leaderboard.top(quiz),
+        'my_rank': leaderboard.rank(quiz, request.user) if request.user.is_authenticated else None,
+    }
+    return render(request, 'quiz_leaderboard.html', context)
+
+
+def popular_quizzes():
+    return get_or_compute(
+        catalog_key('popular'),
+        lambda: list(Quiz.objects.annotate(result_count=Count('results')).order_by('-result_count')[:10]),
+        timeout=60, name='popular',
+    )
+
+
+@method_decorator(condition(etag_func=popular_etag), name='get')
 class PopularQuizView(ListView):
     model = Quiz
     template_name = 'popular_quizes.html'
     context_object_name = 'popular_quizes'
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        return qs.annotate(result_count=Count('results')).order_by('-result_count')[:10]
+        return popular_quizzes()
+
+
+def _rendered_snapshots(quiz, request):
+    """The quiz's snapshot named by a take form's hidden "snapshot" field, as a queryset (empty if none)."""
+    value = request.POST.get('snapshot', '')
+    if not value.isdigit():
+        return QuizSnapshot.objects.none()
+    return QuizSnapshot.objects.filter(quiz=quiz, id=int(value))
 
 
 @method_decorator(login_required, name='dispatch')
+@method_decorator(condition(etag_func=take_etag), name='get')
 class TakeQuizView(DetailView):
     model = Quiz
     template_name = 'take_quiz.html'
     context_object_name = 'quiz'
 
     def get_object(self):
-        return get_object_or_404(Quiz, id=self.kwargs['quiz_id'])
+        return get_object_or_404(Quiz.objects.select_related('current_snapshot'), id=self.kwargs['quiz_id'])
+
+    def get(self, request, *args, **kwargs):
+        page_size = getattr(settings, 'TAKE_QUIZ_PAGE_SIZE', None)
+        if page_size:
+            # Loaded without the snapshot: only its first page is needed to decide
+            quiz = get_object_or_404(Quiz, id=self.kwargs['quiz_id'])
+            snapshot_id = quiz.current_snapshot_id or get_snapshot(quiz).id
+            if snapshot_page(snapshot_id, 1, page_size)['pages'] > 1:
+                attempt = open_attempt(quiz, request.user, snapshot_id)
+                return redirect('take_quiz_page', quiz_id=quiz.id, page=attempt.page)
+        return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['questions'] = self.object.questions.all()
+        snapshot = get_snapshot(self.object)
+        questions = snapshot.data['questions']
+        # Resume: pre-select whatever was autosaved before the page was left, and keep it
+        # in the database rather than only in the cache
+        flush_pending(self.object, self.request.user, snapshot.id)
+        saved = saved_answers(self.object.id, self.request.user)
+        context['questions'] = [{**question, 'selected': saved.get(str(question['id']))} for question in questions]
+        context['resumed'] = bool(saved)
+        context['snapshot_id'] = snapshot.id
         return context
 
     def post(self, request, *args, **kwargs):
         quiz = self.get_object()
-        questions = quiz.questions.all()
-        score = 0
+        # Graded against the snapshot the form was rendered from: editing the quiz recreates
+        # its questions, so the posted ids would miss the current one
+        snapshot = _rendered_snapshots(quiz, request).first() or get_snapshot(quiz)
+        chosen = {}
+        for question in snapshot.data['questions']:
+            value = request.POST.get(f"question_{question['id']}", '')
+            if value.isdigit():
+                chosen[question['id']] = int(value)
+        try:
+            result = submit_attempt(quiz, request.user, snapshot, chosen)
+        except OperationalError:
+            # Still locked out at the retry deadline: the form is restored with these answers
+            keep_answers(quiz.id, request.user.id, chosen)
+            messages.error(request, BUSY_MESSAGE)
+            return redirect('take_quiz', quiz_id=quiz.id)
+        discard_attempt(quiz.id, request.user)
+
+        return redirect('quiz_result', quiz_id=quiz.id, score=result.result)
 
-        result = Results.objects.create(quiz=quiz, user=self.request.user.username, result=score)
 
-        for question in questions:
-            selected_answer_id = request.POST.get(f'question_{question.id}')
-            if selected_answer_id:
-                selected_answer = Answer.objects.get(id=selected_answer_id)
-                if selected_answer.correct:
-                    score += question.points_for_question
-
-            QuizResultAnswer.objects.create(
-                quiz_result=result,
-                question=question,
-                answer=selected_answer,
-            )
-
-        result.result = score
-        result.save()
+@method_decorator(login_required, name='dispatch')
+class TakeQuizPageView(View):
+    """One page of a paged attempt (see TAKE_QUIZ_PAGE_SIZE); answers are kept in a QuizAttempt."""
+    template_name = 'take_quiz_page.html'
+
+    def get_attempt(self):
+        return QuizAttempt.objects.filter(quiz_id=self.kwargs['quiz_id'], user=self.request.user).first()
+
+    def get(self, request, quiz_id, page):
+        attempt = self.get_attempt()
+        if attempt is None:
+            return redirect('take_quiz', quiz_id=quiz_id)
+        chunk = snapshot_page(attempt.snapshot_id, page, settings.TAKE_QUIZ_PAGE_SIZE)
+        if chunk['number'] != page:
+            return redirect('take_quiz_page', quiz_id=quiz_id, page=chunk['number'])
+        pending = flush_pending(Quiz(pk=quiz_id), request.user, attempt.snapshot_id)
+        answers = {**attempt.answers, **pending}
+        questions = [
+            {**question, 'selected': answers.get(str(question['id']))}
+            for question in chunk['questions']
+        ]
+        return render(request, self.template_name, {
+            'quiz_id': quiz_id,
+            'snapshot_id': attempt.snapshot_id,
+            'page': chunk,
+            'questions': questions,
+            'answered': len(answers),
+        })
 
-        return redirect('quiz_result', quiz_id=quiz.id, score=score)
+    def post(self, request, quiz_id, page):
+        attempt = self.get_attempt()
+        if attempt is None:
+            return redirect('take_quiz', quiz_id=quiz_id)
+        chunk = snapshot_page(attempt.snapshot_id, page, settings.TAKE_QUIZ_PAGE_SIZE)
+        chosen = {}
+        for question in chunk['questions']:
+            value = request.POST.get(f"question_{question['id']}", '')
+            if value.isdigit():
+                chosen[question['id']] = int(value)
+        try:
+            save_page(attempt, chunk['number'], chosen)
+        except OperationalError:
+            keep_answers(quiz_id, request.user.id, chosen)
+            messages.error(request, BUSY_MESSAGE)
+            return redirect('take_quiz_page', quiz_id=quiz_id, page=chunk['number'])
 
+        action = request.POST.get('action')
+        if action == 'previous':
+            return redirect('take_quiz_page', quiz_id=quiz_id, page=max(chunk['number'] - 1, 1))
+        if action == 'finish' and chunk['number'] == chunk['pages']:
+            try:
+                result = finish_attempt(attempt)
+            except OperationalError:
+                messages.error(request, BUSY_MESSAGE)
+                return redirect('take_quiz_page', quiz_id=quiz_id, page=chunk['number'])
+            return redirect('quiz_result', quiz_id=quiz_id, score=result.result)
+        return redirect('take_quiz_page', quiz_id=quiz_id, page=min(chunk['number'] + 1, chunk['pages']))
+
+
+def _api_login_required(view):
+    # API clients get a JSON 401 rather than a redirect to the login page
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@_api_login_required
+@condition(etag_func=snapshot_etag)
+def quiz_payload(request, quiz_id):
+    """Questions and answers of the quiz's current snapshot as one compact JSON document."""
+    quiz = get_object_or_404(Quiz.objects.select_related('current_snapshot'), id=quiz_id)
+    snapshot = get_snapshot(quiz)
+    # Snapshots never change, so neither does their payload
+    body = get_or_compute(
+        f'snapshot:{snapshot.id}:payload',
+        lambda: json.dumps(public_data(snapshot), separators=(',', ':')),
+        timeout=24 * 60 * 60, name='payload',
+    )
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = f'"quiz-{quiz.id}-{snapshot.id}"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@_api_login_required
+@require_POST
+def quiz_submit(request, quiz_id):
+    """
+    Grade {"snapshot": id, "answers": {"<question id>": <answer id>}} like TakeQuizView.post.
+    Without "snapshot" the attempt is graded against the current one.
+    """
+    quiz = get_object_or_404(Quiz.objects.select_related('current_snapshot'), id=quiz_id)
+    try:
+        data = json.loads(request.body)
+        answers = data['answers']
+        chosen = {int(question_id): int(answer_id) for question_id, answer_id in answers.items()}
+        snapshot_id = data.get('snapshot')
+        if snapshot_id is not None:
+            snapshot_id = int(snapshot_id)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse(
+            {'error': 'Expected {"snapshot": <snapshot id>, "answers": {"<question id>": <answer id>}}'}, status=400
+        )
+
+    if snapshot_id is None:
+        snapshot = get_snapshot(quiz)
+    else:
+        # The payload the client loaded may be older than the current snapshot
+        snapshot = QuizSnapshot.objects.filter(quiz=quiz, id=snapshot_id).first()
+        if snapshot is None:
+            return JsonResponse({'error': 'Unknown snapshot for this quiz'}, status=400)
+
+    try:
+        result = submit_attempt(quiz, request.user, snapshot, chosen)
+    except OperationalError:
+        response = JsonResponse({'error': BUSY_MESSAGE}, status=503)
+        response['Retry-After'] = '5'
+        return response
+    return JsonResponse({
+        'result_id': result.id,
+        'score': result.result,
+        'max_points': snapshot.data['quiz']['max_points'],
+        'result_url': reverse('quiz_result', kwargs={'quiz_id': quiz.id, 'score': result.result}),
+    }, status=201)
+
+
+@_api_login_required
+@require_POST
+def autosave_attempt(request, quiz_id):
+    """Autosave the take form's current selections (question_<id> fields); see attempts.autosave."""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    chosen = {}
+    for name, value in request.POST.items():
+        question_id = name[len('question_'):]
+        if name.startswith('question_') and question_id.isdigit() and value.isdigit():
+            chosen[int(question_id)] = int(value)
+    # An attempt started here must use the question set the page was rendered from
+    snapshot_id = (
+        _rendered_snapshots(quiz, request).values_list('id', flat=True).first()
+        or quiz.current_snapshot_id or get_snapshot(quiz).id
+    )
+    outcome = autosave(quiz, request.user, snapshot_id, chosen, final=request.POST.get('final') == '1')
+    return JsonResponse({
+        'saved': len(chosen),
+        'flushed': outcome == 'flushed',
+        'resume_url': reverse('take_quiz', kwargs={'quiz_id': quiz.id}),
+    })
+
+
+def quiz_distribution(quiz):
+    return get_or_compute(
+        quiz_key(quiz, 'distribution'),
+        lambda: answer_distribution([question['id'] for question in get_snapshot(quiz).data['questions']]),
+        timeout=30, name='distribution',
+    )
 
 
 @method_decorator(login_required, name='dispatch')
@@ -179,26 +456,53 @@ class QuizResultView(DetailView):
 
     def get_object(self):
         """ Fetch the quiz using quiz_id instead of pk """
-        return get_object_or_404(Quiz, id=self.kwargs['quiz_id'])
+        return get_object_or_404(Quiz.objects.select_related('current_snapshot'), id=self.kwargs['quiz_id'])
+
+    @staticmethod
+    def review_rows(quiz, result):
+        # Attempts graded before snapshots existed are reviewed against the current one
+        snapshot = result.snapshot or get_snapshot(quiz)
+        selections = result.selections or {
+            str(question_id): answer_id
+            for question_id, answer_id in QuizResultAnswer.objects.filter(
+                quiz_result=result
+            ).values_list('question_id', 'answer_id')
+        }
+        return review(snapshot, selections)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        quiz = self.get_object()
+        quiz = self.object
         score = self.kwargs['score']
 
         latest_result = Results.objects.filter(
             quiz=quiz,
             user=self.request.user.username
         ).order_by('-id').first()
-        answers = QuizResultAnswer.objects.filter(quiz_result=latest_result)
 
-        for answer in answers:
-            answer.correct_answer = answer.question.answers.filter(correct=True).first()
+        answers = []
+        if latest_result is not None:
+            # A graded attempt never changes, so its review rows are cached by result id
+            answers = get_or_compute(
+                f'result:{latest_result.id}:review', lambda: self.review_rows(quiz, latest_result), name='result'
+            )
+
+        distribution = quiz_distribution(quiz)
+        for row in answers:
+            counts = distribution.get(row['question']['id'], {'total': 0, 'answers': {}})
+            row['distribution'] = [
+                {
+                    'answer': option,
+                    'selections': counts['answers'].get(option['id'], 0),
+                    'percent': round(100 * counts['answers'].get(option['id'], 0) / counts['total']) if counts['total'] else 0,
+                }
+                for option in row['question']['answers']
+            ]
 
         previous_result = Results.objects.filter(
             quiz=quiz,
             user=self.request.user.username
-        ).exclude(id=latest_result.id).aggregate(Max('result'))['result__max']
+        ).exclude(id=latest_result.id if latest_result else None).aggregate(Max('result'))['result__max']
 
         if previous_result is None or score > previous_result:
             message = f"New High Score! You scored {score}."
@@ -223,22 +527,60 @@ class QuizDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return quiz.creator == self.request.user
 
 
+def public_quizzes():
+    return get_or_compute(
+        catalog_key('public_list'),
+        lambda: list(Quiz.objects.only('id', 'quiz_name', 'creator_id')),
+        name='catalog',
+    )
+
+
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='get')
 class QuizPublicList(TemplateView):
     template_name = 'quiz_public_list.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['quizzes'] = Quiz.objects.all()
+        context['quizzes'] = public_quizzes()
         return context
 
 
-class UserResultsView(ListView):
-    model = Results
+def _before(request):
+    """The keyset cursor of a history page: the id to continue below, or None for the newest."""
+    value = request.GET.get('before', '')
+    return int(value) if value.isdigit() else None
+
+
+class UserResultsView(TemplateView):
+    """The user's results grouped per quiz, a page at a time (see history.py)."""
     template_name = 'user_results.html'
-    context_object_name = 'results'
 
-    def get_queryset(self):
-        return Results.objects.filter(user=self.request.user.username).select_related('quiz')
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        if user.is_authenticated:
+            before = _before(self.request)
+            context['summaries'], context['next_before'] = get_or_compute(
+                user_key(user.id, f'results:{before}'),
+                lambda: history.summaries(user, before, settings.RESULTS_PAGE_SIZE),
+                name='user_results',
+            )
+            context['before'] = before
+        return context
+
+
+@login_required
+def user_quiz_results(request, quiz_id):
+    """Every attempt of the user on one quiz, newest first, a page at a time."""
+    quiz = get_object_or_404(Quiz.objects.only('id', 'quiz_name', 'quiz_maximum_points'), id=quiz_id)
+    before = _before(request)
+    attempts, next_before = history.attempts(request.user, quiz, before, settings.RESULTS_PAGE_SIZE)
+    return render(request, 'user_quiz_results.html', {
+        'quiz': quiz,
+        'attempts': attempts,
+        'before': before,
+        'next_before': next_before,
+    })
 
 
 @method_decorator(login_required, name='dispatch')
@@ -251,7 +593,14 @@ class ModifyQuizView(View):
 
     def post(self, request, quiz_id):
         quiz = get_object_or_404(Quiz, id=quiz_id, creator=request.user)
+        try:
+            write_transaction(lambda: self._update_quiz(request, quiz), 'modify_quiz')
+        except OperationalError:
+            messages.error(request, BUSY_MESSAGE)
+            return redirect('modify_quiz', quiz_id=quiz.id)
+        return redirect('quiz_list')
 
+    def _update_quiz(self, request, quiz):
         # Update quiz name
         quiz.quiz_name = request.POST.get('quiz_name')
         quiz.save()
@@ -319,17 +668,25 @@ class ModifyQuizView(View):
             for extra_question in existing_questions[len(new_questions):]:
                 extra_question.delete()
 
-        quiz.calculate_max_values()
+        quiz.touch()
+        publish_snapshot(quiz)
 
-        return redirect('quiz_list')
+
+def quiz_comments(quiz):
+    return get_or_compute(
+        quiz_key(quiz, 'comments'),
+        lambda: list(Comment.objects.filter(quiz=quiz).select_related('user').order_by('-created_at')),
+        name='details',
+    )
 
 
 class QuizDetailView(View):
     template_name = 'quiz_details.html'
 
+    @method_decorator(condition(etag_func=quiz_etag, last_modified_func=quiz_last_modified))
     def get(self, request, pk, *args, **kwargs):
-        quiz = get_object_or_404(Quiz, id=pk)
-        comments = Comment.objects.filter(quiz=quiz).order_by('-created_at')
+        quiz = get_object_or_404(Quiz.objects.select_related('creator'), id=pk)
+        comments = quiz_comments(quiz)
         form = CommentForm()
         return render(request, self.template_name, {
             'quiz': quiz,
@@ -475,3 +832,15 @@ def user_handler(request):
 
 def banned_page(request):
     return render(request, 'banned.html')
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; superusers or a `Bearer METRICS_TOKEN` header only."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = request.user.is_superuser or (
+        token and constant_time_compare(header, f'Bearer {token}')
+    )
+    if not authorized:
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
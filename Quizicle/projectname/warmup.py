@@ -0,0 +1,130 @@
+"""
+Start-up warm-up.
+
+Run once in the Gunicorn master when preload_app is on (see gunicorn.conf.py), so every
+forked worker starts with views imported, templates compiled, the URL resolver populated
+and the shared cache holding the catalog and the most played quizzes.
+"""
+
+import json
+import logging
+import os
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver, reverse
+
+
+logger = logging.getLogger(__name__)
+
+
+def _template_names():
+    engine = engines['django'].engine
+    dirs = list(engine.dirs) + list(get_app_template_dirs('templates'))
+    names = set()
+    for directory in dirs:
+        for path in Path(directory).rglob('*.html'):
+            names.add(path.relative_to(directory).as_posix())
+    return sorted(names)
+
+
+def import_views():
+    import_module('projectname.views')
+    return import_module(settings.ROOT_URLCONF).__name__
+
+
+def compile_templates():
+    """Load every template through the cached loader; returns the number compiled."""
+    engine = engines['django']
+    compiled = 0
+    for name in _template_names():
+        try:
+            engine.get_template(name)
+            compiled += 1
+        except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+            logger.warning('Warm-up could not compile %s: %s', name, e)
+    return compiled
+
+
+def prime_url_resolver():
+    resolver = get_resolver()
+    # reverse() fills the resolver's reverse_dict for every named pattern in one pass
+    reverse('home')
+    return len(resolver.reverse_dict)
+
+
+def fill_caches(limit):
+    """Cache the catalog pages and the snapshot, comments and distribution of the top quizzes."""
+    from .models import Quiz
+    from .snapshots import get_snapshot
+    from .views import popular_quizzes, public_quizzes, quiz_comments, quiz_distribution
+
+    public_quizzes()
+    top = popular_quizzes()
+    ids = [quiz.id for quiz in top][:limit]
+    warmed = 0
+    for quiz in Quiz.objects.filter(id__in=ids).select_related('current_snapshot'):
+        get_snapshot(quiz)
+        quiz_comments(quiz)
+        quiz_distribution(quiz)
+        warmed += 1
+    return warmed
+
+
+def write_status(report):
+    path = getattr(settings, 'WARMUP_STATUS_FILE', None)
+    if not path:
+        return
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(report, f)
+    os.replace(tmp, path)
+
+
+def warm_up(limit=None):
+    """
+    Run every warm-up phase and return {'phases': {name: ms}, 'total_ms': ..., ...}.
+    A failing cache phase is logged and skipped: the schema may not be migrated yet.
+    """
+    if limit is None:
+        limit = getattr(settings, 'WARMUP_QUIZZES', 20)
+    path = getattr(settings, 'WARMUP_STATUS_FILE', None)
+    if path and os.path.exists(path):
+        os.remove(path)
+
+    report = {'pid': os.getpid(), 'phases': {}}
+    started = time.perf_counter()
+
+    def phase(name, func, *args):
+        phase_started = time.perf_counter()
+        try:
+            report[name] = func(*args)
+        except DatabaseError as e:
+            logger.warning('Warm-up phase %s failed: %s', name, e)
+            report[name] = None
+        report['phases'][name] = round((time.perf_counter() - phase_started) * 1000, 1)
+
+    phase('imports', import_views)
+    phase('templates', compile_templates)
+    phase('urls', prime_url_resolver)
+    phase('caches', fill_caches, limit)
+
+    # Workers are forked from this process and must not share its sockets
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        # A psycopg pool also keeps idle connections and worker threads of its own
+        if connection.alias in getattr(connection, '_connection_pools', {}):
+            connection.close_pool()
+    caches.close_all()
+
+    report['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    report['finished_at'] = time.time()
+    logger.info('Warm-up finished in %.1f ms: %s', report['total_ms'], report['phases'])
+    write_status(report)
+    return report